@@ -1,15 +1,47 @@
 """
 Defines the compression profiles.
+
+`est_speed` is a rough encode speed (x realtime at 1080p) per engine. It only
+seeds job ordering until measured throughput from past runs is available.
+
+`passthrough` lists what a source must already satisfy to be stream-copied
+instead of re-encoded (see core/passthrough.py).
+
+`max_size_ratio` caps output size relative to the input. Encodes projected to
+exceed it are aborted and the original is kept (see core/sizeguard.py).
+
+`hw_pipeline` asks for decoding and scaling on the GPU as well when a GPU
+encoder is used and the machine supports it; jobs fall back to CPU decoding
+and software filters automatically (see core/hardware.py).
+
+`slide_detection` analyses each file for static slides first; mostly static
+recordings are encoded with duplicate frames dropped (variable frame rate) and
+keyframes at slide changes (see core/slides.py). Multi-rendition jobs skip it.
+
+`suffix` names the output of a preset in multi-rendition jobs, where several
+presets are encoded from one decode (see core/renditions.py).
+
+`video_params` applies to every video encode (CPU and GPU), on top of the
+engine-specific `cpu_fallback` / `gpu_quality_flags`. Presets are validated and
+compiled at import time (see core/preset_schema.py). Extra presets can be
+loaded from a TOML/JSON file with load_user_presets().
 """
 
+import os
+
+from config.settings import USER_PRESETS_FILE
+from core.preset_schema import load_preset_file, validate_presets
+
 PRESETS = {
     "1": {
         "name": "Lecture Mode (Slides + Voice)",
+        "suffix": "lecture",
         "description": "High CPU compression, readable text, clear mono voice.",
         "use_gpu": False,
+        "slide_detection": True,
+        "est_speed": {"cpu": 2.0},
+        "max_size_ratio": 1.0,
         "video_params": [
-            "-threads",
-            "4",
             "-c:v",
             "libx264",
             "-preset",
@@ -23,12 +55,24 @@ PRESETS = {
             "-pix_fmt",
             "yuv420p",
         ],
+        "passthrough": {
+            "video_codecs": ["h264"],
+            "pix_fmts": ["yuv420p"],
+            "max_video_kbps": 300,
+            "audio_codecs": ["aac"],
+            "max_audio_kbps": 64,
+            "max_channels": 1,
+        },
         "audio_params": ["-c:a", "aac", "-b:a", "64k", "-ac", "1"],
     },
     "2": {
         "name": "High Quality / Music",
+        "suffix": "hq",
         "description": "GPU accelerated, near lossless video, low-mid audio.",
         "use_gpu": True,
+        "hw_pipeline": True,
+        "est_speed": {"gpu": 8.0, "cpu": 1.5},
+        "max_size_ratio": 1.0,
         "gpu_quality_flags": {
             "h264_nvenc": ["-rc", "constqp", "-qp", "20", "-preset", "p7"],
             "h264_amf": [
@@ -49,8 +93,6 @@ PRESETS = {
             "h264_videotoolbox": ["-q", "80"],
         },
         "cpu_fallback": [
-            "-threads",
-            "4",
             "-c:v",
             "libx264",
             "-preset",
@@ -58,12 +100,24 @@ PRESETS = {
             "-crf",
             "18",
         ],
+        "passthrough": {
+            "video_codecs": ["h264"],
+            "pix_fmts": ["yuv420p"],
+            "max_video_kbps": 8000,
+            "audio_codecs": ["aac"],
+            "max_audio_kbps": 128,
+            "max_channels": 2,
+        },
         "audio_params": ["-c:a", "aac", "-b:a", "128k", "-ac", "2"],
     },
     "3": {
         "name": "Social Media (720p limit)",
+        "suffix": "social",
         "description": "Downscales to 720p with bitrate caps. Fits most chat app limits.",
         "use_gpu": True,
+        "hw_pipeline": True,
+        "est_speed": {"gpu": 10.0, "cpu": 4.0},
+        "max_size_ratio": 1.0,
         "gpu_quality_flags": {
             # NVIDIA: Enforce max bitrate of 1Mbps
             "h264_nvenc": ["-rc", "vbr", "-b:v", "1M", "-maxrate", "1.5M", "-bufsize", "2M"],
@@ -80,8 +134,6 @@ PRESETS = {
             ],
         },
         "cpu_fallback": [
-            "-threads",
-            "4",
             "-c:v",
             "libx264",
             "-preset",
@@ -94,19 +146,29 @@ PRESETS = {
             "-vf",
             "scale=-2:720",
         ],
+        "passthrough": {
+            "video_codecs": ["h264"],
+            "pix_fmts": ["yuv420p"],
+            "max_height": 720,
+            "max_video_kbps": 1500,
+            "audio_codecs": ["aac"],
+            "max_audio_kbps": 128,
+            "max_channels": 2,
+        },
         "audio_params": ["-c:a", "aac", "-b:a", "128k", "-ac", "2"],
     },
     "4": {
         "name": "Editing Proxy (Ultrafast)",
+        "suffix": "proxy",
         "description": "Low quality, high speed. Optimized for smooth timeline scrubbing.",
         "use_gpu": True,
+        "hw_pipeline": True,
+        "est_speed": {"gpu": 20.0, "cpu": 12.0},
         "gpu_quality_flags": {
             # NVIDIA: Ultrafast preset, very frequent keyframes
             "h264_nvenc": ["-preset", "p1", "-g", "15"],
         },
         "cpu_fallback": [
-            "-threads",
-            "4",
             "-c:v",
             "libx264",
             "-preset",
@@ -127,8 +189,11 @@ PRESETS = {
     },
     "5": {
         "name": "Archive Master (No Compromises)",
+        "suffix": "archive",
         "description": "H.265/HEVC at max quality. Visually lossless preservation.",
         "use_gpu": True,
+        "est_speed": {"gpu": 3.0, "cpu": 0.1},
+        "max_size_ratio": 1.0,
         "gpu_quality_flags": {
             # NVIDIA: p7 is the absolute slowest/best preset. QP 16 is near-lossless.
             "hevc_nvenc": ["-rc", "constqp", "-qp", "16", "-preset", "p7", "-tier", "high"],
@@ -153,8 +218,6 @@ PRESETS = {
             "hevc_videotoolbox": ["-q", "90"],
         },
         "cpu_fallback": [
-            "-threads",
-            "4",
             "-c:v",
             "libx265",
             "-preset",
@@ -162,6 +225,31 @@ PRESETS = {
             "-crf",
             "16",  # Visually Lossless
         ],
+        # Already HEVC: re-encoding can only lose quality
+        "passthrough": {
+            "video_codecs": ["hevc"],
+            "audio_codecs": ["aac"],
+            "max_channels": 2,
+        },
         "audio_params": ["-c:a", "aac", "-b:a", "320k", "-ac", "2"],
     },
 }
+
+PRESETS = validate_presets(PRESETS)
+
+
+def load_user_presets(path=None):
+    """
+    Adds (or overrides) presets from a user file, by default USER_PRESETS_FILE
+    if it exists. Returns the ids that were loaded.
+
+    Raises:
+        PresetError: If the file is invalid.
+    """
+    if path is None:
+        path = USER_PRESETS_FILE
+        if not os.path.exists(path):
+            return []
+    loaded = load_preset_file(path)
+    PRESETS.update(loaded)
+    return sorted(loaded)
@@ -3,7 +3,14 @@ Configuration settings for the Mass Video Compressor.
 
 Handles:
 - FFmpeg binary detection via imageio-ffmpeg.
-- Automatic worker thread calculation based on CPU core count.
+- Separate CPU-thread and GPU-session budgets for the job scheduler.
+- Retry limits for failed GPU encodes.
+- Location of the on-disk cache (hardware probe results, etc.).
+- Location of the optional user preset file.
+- Timings for watch-folder mode and the distributed job queue.
+- Targets of the adaptive worker autoscaler.
+- The time limit of one ffmpeg run.
+- Local scratch staging for inputs and outputs on network shares.
 """
 
 import os
@@ -14,36 +21,113 @@ import imageio_ffmpeg
 FFMPEG_EXE = imageio_ffmpeg.get_ffmpeg_exe()
 
 
-def _get_optimal_workers():
+def _get_cache_dir():
     """
-    Calculate the optimal number of concurrent worker processes.
-
-    Logic:
-    1. Get total logical CPU cores.
-    2. Divide by 4.
-       Note: We force '-threads 4' in presets to limit encoder threads.
-       However, this is an approximation for scaling, as demuxing, filtering,
-       and muxing spawn additional threads (often 8-12 total OS threads per worker).
-       It does not represent a hard guarantee of core usage.
-    3. Clamp between 1 and 5 to respect GPU encoding session limits and reduce overhead.
-
-    Returns:
-        int: The number of workers to use (1-5).
+    Returns the per-user cache folder for MVC.
+
+    Can be overridden with the MVC_CACHE_DIR environment variable.
     """
+    override = os.environ.get("MVC_CACHE_DIR")
+    if override:
+        return override
+
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+    return os.path.join(base, "mvc")
+
+
+CACHE_DIR = _get_cache_dir()
+
+
+def _get_user_presets_file():
+    """
+    Returns the path of the optional user preset file.
+
+    Can be overridden with the MVC_PRESETS environment variable.
+    """
+    override = os.environ.get("MVC_PRESETS")
+    if override:
+        return override
+
+    if os.name == "nt":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+
+    return os.path.join(base, "mvc", "presets.toml")
+
+
+USER_PRESETS_FILE = _get_user_presets_file()
+
+
+def _env_int(name, default, minimum=1):
+    """Reads an integer override (at least `minimum`) from the environment."""
     try:
-        # Returns number of logical CPUs (threads)
-        cores = os.cpu_count()
-        if not cores:
-            return 2  # Fallback
+        value = int(os.environ.get(name, ""))
+    except ValueError:
+        return default
+    return value if value >= minimum else default
+
+
+# Total CPU threads the scheduler may hand out to ffmpeg encoders.
+CPU_THREAD_BUDGET = _env_int("MVC_CPU_THREADS", os.cpu_count() or 2)
+
+# Encoder threads given to one CPU (libx264/libx265) job when the budget allows it.
+# `main.py --benchmark` measures the best value for a host.
+THREADS_PER_JOB = _env_int("MVC_THREADS_PER_JOB", 4)
+
+# CPU threads reserved for decoding/muxing alongside each GPU encode.
+GPU_JOB_THREADS = 2
+
+# Concurrent hardware encode sessions. Consumer NVIDIA drivers cap NVENC sessions,
+# so keep this conservative unless the card is known to allow more.
+GPU_SESSION_LIMIT = _env_int("MVC_GPU_SESSIONS", 3)
+
+# A GPU encode that fails because every hardware session is busy is retried on the
+# GPU this many times, waiting GPU_RETRY_BACKOFF_SECONDS (doubling each time) in
+# between, before the file moves to the CPU encoder.
+GPU_RETRY_LIMIT = _env_int("MVC_GPU_RETRIES", 3)
+GPU_RETRY_BACKOFF_SECONDS = _env_int("MVC_GPU_RETRY_BACKOFF", 15)
+
+# Inputs at least this long (seconds) are split into segments that are encoded
+# in parallel. 0 disables segment-parallel encoding.
+CHUNK_THRESHOLD_SECONDS = _env_int("MVC_CHUNK_THRESHOLD", 1800, minimum=0)
+
+# Target length of each segment (cuts happen on the next keyframe).
+CHUNK_SEGMENT_SECONDS = 300
+
+# Watch mode: a new file must keep the same size and mtime for this many seconds
+# before it is queued, so files that are still being copied are left alone.
+WATCH_SETTLE_SECONDS = _env_int("MVC_WATCH_SETTLE", 10)
+
+# Watch mode: rescan interval (seconds). With inotify, rescans also happen on events.
+WATCH_POLL_SECONDS = _env_int("MVC_WATCH_POLL", 5)
 
-        # Calculate optimal workers (1 worker per ~4 logical cores)
-        workers = cores // 4
+# Distributed mode: how often the coordinator and workers look at the shared queue folder.
+QUEUE_POLL_SECONDS = _env_int("MVC_QUEUE_POLL", 2)
 
-        # Clamp between 1 and 5
-        return max(1, min(workers, 5))
+# Distributed mode: a worker whose heartbeat stops for this long is presumed dead
+# and the files it had claimed are queued again.
+WORKER_TIMEOUT_SECONDS = _env_int("MVC_WORKER_TIMEOUT", 120)
 
-    except Exception:
-        return 2
+# Autoscaling (--autoscale): the number of running jobs is adjusted every
+# AUTOSCALE_INTERVAL_SECONDS to keep system CPU use near AUTOSCALE_TARGET_CPU
+# percent, and reduced whenever less than AUTOSCALE_MIN_FREE_MEMORY percent of
+# RAM is available.
+AUTOSCALE_TARGET_CPU = _env_int("MVC_AUTOSCALE_TARGET", 85)
+AUTOSCALE_INTERVAL_SECONDS = _env_int("MVC_AUTOSCALE_INTERVAL", 10)
+AUTOSCALE_MIN_FREE_MEMORY = _env_int("MVC_AUTOSCALE_MIN_FREE_MEMORY", 10)
 
+# Wall-clock limit (seconds) of one ffmpeg encode; a run still going after this
+# long is stopped and the file counts as failed. 0 = no limit.
+JOB_TIMEOUT_SECONDS = _env_int("MVC_JOB_TIMEOUT", 0)
 
-DEFAULT_WORKERS = _get_optimal_workers()
+# Local scratch staging (--stage-dir): folder for staged inputs and outputs,
+# the most GB of prefetched inputs kept there at once, and the bandwidth limit
+# (MB/s) of the copies to and from the share. 0 = unlimited.
+STAGE_DIR = os.environ.get("MVC_STAGE_DIR") or None
+STAGE_BUDGET_GB = _env_int("MVC_STAGE_BUDGET_GB", 20)
+STAGE_BANDWIDTH_MBPS = _env_int("MVC_STAGE_BANDWIDTH", 0)
@@ -0,0 +1,116 @@
+"""
+Crash-safe output files.
+
+ffmpeg never writes to a final output name. It writes to a hidden partial
+next to it (same folder, so same filesystem), which is flushed to disk and
+renamed over the final name only once the encode succeeded. An interrupted
+run, a killed process or a power cut therefore leaves at most a partial
+behind, never a truncated file under the real name that looks finished.
+
+Partials and segment folders that outlive their run are removed by
+clean_orphans() when the next run starts; the manifest then re-queues exactly
+the outputs that never got published.
+"""
+
+import os
+import shutil
+import time
+
+PARTIAL_PREFIX = ".mvc-partial."
+# Scratch folders of segment-parallel encodes (see core.processor.encode_chunked).
+WORKDIR_PREFIX = ".mvc_chunks_"
+
+# Leftovers younger than this may belong to a run that is still going (another
+# process writing into the same output folder), so they are left alone.
+ORPHAN_MIN_AGE_SECONDS = 600
+
+
+def partial_path(output_path, owner=None):
+    """
+    'out/talk.mp4' -> 'out/.mvc-partial.talk.mp4' (the extension still picks the muxer).
+
+    With an `owner` (a queue worker, see core.jobqueue.Claims) the name is
+    'out/.mvc-partial.<owner>.talk.mp4', so two workers encoding the same
+    file never write to the same partial.
+    """
+    folder, name = os.path.split(output_path)
+    if owner:
+        name = f"{owner}.{name}"
+    return os.path.join(folder, PARTIAL_PREFIX + name)
+
+
+def _fsync_dir(folder):
+    # Makes the rename itself durable. Not possible (or needed) on Windows.
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(folder or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def publish(partial, output_path):
+    """Flushes `partial` to disk and atomically renames it to `output_path`."""
+    with open(partial, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(partial, output_path)
+    _fsync_dir(os.path.dirname(os.path.abspath(output_path)))
+
+
+def discard(path):
+    """Removes a partial if it exists."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _newest_mtime(path):
+    newest = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+                except OSError:
+                    pass
+    return newest
+
+
+def find_orphans(folder, min_age=ORPHAN_MIN_AGE_SECONDS, now=None):
+    """Returns partial files and segment folders under `folder` untouched for `min_age` s."""
+    now = time.time() if now is None else now
+    found = []
+    for root, dirs, files in os.walk(folder):
+        for name in list(dirs):
+            if name.startswith(WORKDIR_PREFIX):
+                dirs.remove(name)
+                found.append(os.path.join(root, name))
+        found.extend(os.path.join(root, n) for n in files if n.startswith(PARTIAL_PREFIX))
+
+    orphans = []
+    for path in found:
+        try:
+            if now - _newest_mtime(path) >= min_age:
+                orphans.append(path)
+        except OSError:
+            pass
+    return sorted(orphans)
+
+
+def clean_orphans(folder, min_age=ORPHAN_MIN_AGE_SECONDS):
+    """Removes what find_orphans() reports. Returns the number of leftovers removed."""
+    removed = 0
+    for path in find_orphans(folder, min_age):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            discard(path)
+        removed += 1
+    return removed
@@ -0,0 +1,315 @@
+"""
+Adaptive worker autoscaling.
+
+Instead of fixing the number of concurrent ffmpeg jobs at startup, an
+Autoscaler thread samples the machine every few seconds and moves the
+scheduler's job caps (see ResourceScheduler.set_limits()) one step at a time:
+
+- fewer CPU jobs when other processes push CPU use above the target, memory
+  runs low, or the storage is saturated (high I/O wait, e.g. a slow NAS);
+- more CPU jobs when CPU use is below the target, files are waiting for a
+  slot and the run queue is not already longer than the machine has cores,
+  up to what the CPU thread budget can hold;
+- fewer or more GPU jobs from the encoder utilisation reported by
+  nvidia-smi, when it is available.
+
+CPU used by MVC's own ffmpeg children is measured separately: encoders that
+keep the machine busy on their own are the point of a batch run, so only CPU
+taken by other processes makes the controller back off. Readings that a
+platform can't provide are None and simply don't vote. Each change is printed
+and written to the telemetry log with the reading behind it.
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from tqdm import tqdm
+
+from config.settings import (
+    AUTOSCALE_INTERVAL_SECONDS,
+    AUTOSCALE_MIN_FREE_MEMORY,
+    AUTOSCALE_TARGET_CPU,
+)
+from core.runner import child_pids
+
+# CPU use within this many percentage points of the target is left alone.
+CPU_BAND = 10
+# More runnable threads per core than this means the CPU is oversubscribed.
+LOAD_PER_CORE_HIGH = 1.5
+# Share of CPU time spent waiting on I/O above which more jobs only add contention.
+IOWAIT_HIGH = 30
+# Memory pressure (share of time tasks stalled on memory, Linux PSI) that counts as low memory.
+MEMORY_PRESSURE_HIGH = 20
+# GPU encoder utilisation bounds (percent).
+GPU_TARGET = 80
+GPU_HIGH = 95
+
+SECTOR_BYTES = 512
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class SystemSampler:
+    """
+    Reads load indicators. CPU, I/O wait and disk figures are averages since
+    the previous sample, so the first sample only has the instant readings.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._cpu = None
+        self._own = None
+        self._disk = None
+        self._nvidia_smi = shutil.which("nvidia-smi")
+
+    def _cpu_times(self):
+        text = _read("/proc/stat")
+        if not text:
+            return None
+        fields = [int(v) for v in text.splitlines()[0].split()[1:9]]
+        idle, iowait = fields[3], fields[4]
+        return sum(fields), idle, iowait
+
+    def _own_cpu_seconds(self):
+        # Running children from /proc, finished ones from os.times(), so a job
+        # ending between two samples isn't lost.
+        if not os.path.exists("/proc/self/stat"):
+            return None
+        ticks = os.sysconf("SC_CLK_TCK")
+        seconds = 0.0
+        for pid in child_pids():
+            text = _read(f"/proc/{pid}/stat")
+            if text:
+                fields = text.rsplit(")", 1)[1].split()
+                seconds += (int(fields[11]) + int(fields[12])) / ticks
+        times = os.times()
+        return self.clock(), seconds + times.children_user + times.children_system
+
+    def _disk_bytes(self):
+        text = _read("/proc/diskstats")
+        if not text:
+            return None
+        total = 0
+        for line in text.splitlines():
+            parts = line.split()
+            # Whole disks only, so partitions aren't counted twice.
+            if len(parts) < 10 or parts[2].startswith(("loop", "ram", "zram")):
+                continue
+            if not os.path.exists(os.path.join("/sys/block", parts[2])):
+                continue
+            total += (int(parts[5]) + int(parts[9])) * SECTOR_BYTES
+        return self.clock(), total
+
+    def _memory(self):
+        text = _read("/proc/meminfo")
+        if not text:
+            return None
+        info = {}
+        for line in text.splitlines():
+            key, _, value = line.partition(":")
+            info[key] = int(value.split()[0]) if value.split() else 0
+        if not info.get("MemTotal") or "MemAvailable" not in info:
+            return None
+        return round(100.0 * info["MemAvailable"] / info["MemTotal"], 1)
+
+    def _memory_pressure(self):
+        text = _read("/proc/pressure/memory")
+        if not text:
+            return None
+        for part in text.splitlines()[0].split():
+            if part.startswith("avg10="):
+                return float(part[len("avg10=") :])
+        return None
+
+    def _gpu_encoder(self):
+        if not self._nvidia_smi:
+            return None
+        try:
+            result = subprocess.run(
+                [
+                    self._nvidia_smi,
+                    "--query-gpu=utilization.encoder",
+                    "--format=csv,noheader,nounits",
+                ],
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                timeout=5,
+            )
+            values = [float(v) for v in result.stdout.decode().split() if v.strip()]
+        except (OSError, subprocess.SubprocessError, ValueError):
+            return None
+        return max(values) if values else None
+
+    def sample(self):
+        """
+        Returns:
+            dict: cpu_percent (whole machine), mvc_cpu_percent (ffmpeg
+            children of this process), iowait_percent, load_per_core,
+            memory_available_percent, memory_pressure, disk_bytes_per_s and
+            gpu_encoder_percent (each None when unknown).
+        """
+        reading = dict.fromkeys(
+            (
+                "cpu_percent",
+                "mvc_cpu_percent",
+                "iowait_percent",
+                "load_per_core",
+                "memory_available_percent",
+                "memory_pressure",
+                "disk_bytes_per_s",
+                "gpu_encoder_percent",
+            )
+        )
+
+        cpu = self._cpu_times()
+        if cpu and self._cpu:
+            total = cpu[0] - self._cpu[0]
+            if total > 0:
+                idle = cpu[1] - self._cpu[1]
+                iowait = cpu[2] - self._cpu[2]
+                reading["cpu_percent"] = round(100.0 * (total - idle - iowait) / total, 1)
+                reading["iowait_percent"] = round(100.0 * iowait / total, 1)
+        self._cpu = cpu
+
+        own = self._own_cpu_seconds()
+        if own and self._own and own[0] > self._own[0]:
+            cores = os.cpu_count() or 1
+            used = (own[1] - self._own[1]) / ((own[0] - self._own[0]) * cores)
+            reading["mvc_cpu_percent"] = round(min(100.0, max(0.0, 100.0 * used)), 1)
+        self._own = own
+
+        disk = self._disk_bytes()
+        if disk and self._disk and disk[0] > self._disk[0]:
+            reading["disk_bytes_per_s"] = int((disk[1] - self._disk[1]) / (disk[0] - self._disk[0]))
+        self._disk = disk
+
+        if hasattr(os, "getloadavg"):
+            reading["load_per_core"] = round(os.getloadavg()[0] / (os.cpu_count() or 1), 2)
+        reading["memory_available_percent"] = self._memory()
+        reading["memory_pressure"] = self._memory_pressure()
+        reading["gpu_encoder_percent"] = self._gpu_encoder()
+        return reading
+
+
+def _above(value, limit):
+    return value is not None and value > limit
+
+
+def decide_cpu(reading, jobs, waiting, low, high, target=AUTOSCALE_TARGET_CPU):
+    """
+    Returns (new CPU job cap, reason) for one reading; reason is None when
+    the cap stays.
+    """
+    memory = reading.get("memory_available_percent")
+    if jobs > low:
+        if memory is not None and memory < AUTOSCALE_MIN_FREE_MEMORY:
+            return jobs - 1, f"only {memory:.0f}% memory available"
+        if _above(reading.get("memory_pressure"), MEMORY_PRESSURE_HIGH):
+            return jobs - 1, f"memory pressure {reading['memory_pressure']:.0f}%"
+        cpu = reading.get("cpu_percent")
+        others = cpu - (reading.get("mvc_cpu_percent") or 0) if cpu is not None else None
+        if _above(cpu, target + CPU_BAND) and _above(others, 100 - target):
+            return jobs - 1, f"CPU {cpu:.0f}% > {target}%, {others:.0f}% used by other processes"
+        if _above(reading.get("iowait_percent"), IOWAIT_HIGH):
+            return jobs - 1, f"I/O wait {reading['iowait_percent']:.0f}%, storage saturated"
+
+    cpu = reading.get("cpu_percent")
+    if jobs < high and waiting and cpu is not None and cpu < target - CPU_BAND:
+        if _above(reading.get("iowait_percent"), IOWAIT_HIGH):
+            return jobs, None
+        if _above(reading.get("load_per_core"), LOAD_PER_CORE_HIGH):
+            return jobs, None
+        if memory is not None and memory < 2 * AUTOSCALE_MIN_FREE_MEMORY:
+            return jobs, None
+        return jobs + 1, f"CPU {cpu:.0f}% < {target}% with files waiting"
+    return jobs, None
+
+
+def decide_gpu(reading, jobs, waiting, low, high):
+    """Like decide_cpu() for GPU jobs, from the encoder utilisation."""
+    busy = reading.get("gpu_encoder_percent")
+    if busy is None:
+        return jobs, None
+    if busy > GPU_HIGH and jobs > low:
+        return jobs - 1, f"GPU encoder {busy:.0f}% busy"
+    if busy < GPU_TARGET and waiting and jobs < high:
+        return jobs + 1, f"GPU encoder {busy:.0f}% < {GPU_TARGET}% with files waiting"
+    return jobs, None
+
+
+class Autoscaler(threading.Thread):
+    """
+    Background controller for a ResourceScheduler's job caps.
+
+    Parameters:
+        scheduler (ResourceScheduler): The scheduler to steer.
+        max_jobs (int): Upper bound on concurrent CPU jobs (default: what the
+            thread budget can hold).
+        log (callable): `log(event, **fields)`, e.g. BatchProgress.log.
+        sampler (SystemSampler): Source of readings.
+    """
+
+    def __init__(
+        self,
+        scheduler,
+        max_jobs=None,
+        log=None,
+        sampler=None,
+        interval=AUTOSCALE_INTERVAL_SECONDS,
+        target=AUTOSCALE_TARGET_CPU,
+    ):
+        super().__init__(daemon=True)
+        self.scheduler = scheduler
+        self.interval = interval
+        self.target = target
+        self.log = log
+        self.sampler = sampler or SystemSampler()
+        self.cpu_range = (1, min(max_jobs or scheduler.max_cpu_jobs(), scheduler.max_cpu_jobs()))
+        self.gpu_range = (1, max(1, scheduler.gpu_sessions))
+        self.cpu_jobs = min(scheduler.max_jobs(gpu=False), self.cpu_range[1])
+        self.gpu_jobs = self.gpu_range[1]
+        self._stop_event = threading.Event()
+        scheduler.set_limits(self.cpu_jobs, self.gpu_jobs)
+
+    def step(self):
+        """Takes one reading and applies the resulting caps. Returns the reading."""
+        reading = self.sampler.sample()
+        cpu_jobs, cpu_reason = decide_cpu(
+            reading, self.cpu_jobs, self.scheduler.waiting[False], *self.cpu_range, self.target
+        )
+        gpu_jobs, gpu_reason = decide_gpu(
+            reading, self.gpu_jobs, self.scheduler.waiting[True], *self.gpu_range
+        )
+        for kind, old, new, reason in (
+            ("CPU", self.cpu_jobs, cpu_jobs, cpu_reason),
+            ("GPU", self.gpu_jobs, gpu_jobs, gpu_reason),
+        ):
+            if new != old:
+                tqdm.write(f"⚖ AUTOSCALE: {kind} jobs {old} → {new} ({reason})")
+                if self.log:
+                    self.log(
+                        "autoscale", kind=kind.lower(), old=old, new=new, reason=reason, **reading
+                    )
+        self.cpu_jobs, self.gpu_jobs = cpu_jobs, gpu_jobs
+        self.scheduler.set_limits(cpu_jobs, gpu_jobs)
+        return reading
+
+    def run(self):
+        self.sampler.sample()  # baseline for the interval averages
+        while not self._stop_event.wait(self.interval):
+            self.step()
+
+    def stop(self):
+        """Stops the controller and lifts the caps so queued work can drain."""
+        self._stop_event.set()
+        self.scheduler.set_limits(None, None)
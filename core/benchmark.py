@@ -0,0 +1,430 @@
+"""
+Benchmark and calibration suite.
+
+Encodes deterministic synthetic clips (generated with ffmpeg's lavfi sources,
+so every machine tests the same content) with each preset under several
+worker/thread layouts and records, per run:
+
+    fps          frames encoded per second, summed over the parallel encodes
+    speed        x realtime per encode
+    wall         seconds for the whole layout
+    cpu_percent  CPU time of the ffmpeg children / (wall * logical cores)
+    peak_rss_kb  largest resident set of one ffmpeg child
+    output_size  bytes of one output
+
+The numbers come from ffmpeg's own `-benchmark` report, so no extra
+dependency is needed and Windows works too. The report is plain JSON: keep
+one as a baseline and compare() later runs against it to catch regressions.
+recommend() turns the results into the worker/thread layout with the best
+throughput on this host and measured `est_speed` hints for the presets.
+Presets with slide detection are measured with and without it, and
+slide_gains() reports the speed and size difference.
+"""
+
+import concurrent.futures
+import os
+import platform
+import re
+import shutil
+import statistics
+import tempfile
+import time
+
+from config.settings import CACHE_DIR, FFMPEG_EXE, GPU_JOB_THREADS, GPU_SESSION_LIMIT
+from core import slides
+from core.atomic import discard, partial_path, publish
+from core.hardware import ffmpeg_identity
+from core.probe import probe_media
+from core.processor import build_command, resolve_encoder
+from core.runner import run_ffmpeg
+
+BENCH_DIR = os.path.join(CACHE_DIR, "bench")
+CLIP_FPS = 30
+DEFAULT_CLIP_SECONDS = 10
+
+# name -> (lavfi video source, description). All clips run at CLIP_FPS.
+CLIPS = {
+    "slides": (
+        "testsrc=size=1920x1080:rate=0.2",
+        "1080p slides: a new still image every 5 seconds",
+    ),
+    "motion": (
+        "testsrc2=size=1920x1080:rate=30,noise=alls=24:allf=t",
+        "1080p high motion with temporal noise",
+    ),
+    "4k": ("testsrc2=size=3840x2160:rate=30", "2160p moving test pattern"),
+}
+
+# Clips at the resolution the presets' est_speed hints refer to.
+CALIBRATION_CLIPS = ("slides", "motion")
+
+# A run this much slower (or this much larger) than the baseline is a regression.
+REGRESSION_TOLERANCE = 0.10
+
+_BENCH_TIMES = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s rtime=([\d.]+)s")
+_BENCH_RSS = re.compile(r"bench: maxrss=(\d+)\s*[kK]i?B")
+
+
+def clip_command(name, output_path, seconds=DEFAULT_CLIP_SECONDS):
+    """Builds the ffmpeg command that renders clip `name` (see CLIPS)."""
+    source, _ = CLIPS[name]
+    return [
+        FFMPEG_EXE,
+        "-y",
+        "-v",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        source,
+        "-f",
+        "lavfi",
+        "-i",
+        "sine=frequency=440:sample_rate=48000",
+        "-t",
+        str(seconds),
+        "-r",
+        str(CLIP_FPS),
+        # Single-threaded and bit-exact, so the clip is identical on every run.
+        "-threads",
+        "1",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "ultrafast",
+        "-crf",
+        "16",
+        "-pix_fmt",
+        "yuv420p",
+        "-c:a",
+        "aac",
+        "-b:a",
+        "128k",
+        "-fflags",
+        "+bitexact",
+        "-flags",
+        "+bitexact",
+        output_path,
+    ]
+
+
+def make_clip(name, seconds=DEFAULT_CLIP_SECONDS, folder=None):
+    """Returns the path of clip `name`, rendering it on first use (cached in BENCH_DIR)."""
+    folder = folder or BENCH_DIR
+    path = os.path.join(folder, f"{name}_{seconds}s.mp4")
+    if os.path.exists(path):
+        return path
+    os.makedirs(folder, exist_ok=True)
+    partial = partial_path(path)
+    try:
+        returncode, err = run_ffmpeg(clip_command(name, partial, seconds))
+        if returncode != 0:
+            raise RuntimeError(f"Could not render benchmark clip '{name}': {err}")
+        publish(partial, path)
+    finally:
+        discard(partial)
+    return path
+
+
+def benchmark_command(cmd):
+    """Turns an encode command into one that ends with ffmpeg's -benchmark report."""
+    cmd = list(cmd)
+    if "-v" in cmd:
+        # The report is logged at info level.
+        cmd[cmd.index("-v") + 1] = "info"
+    cmd.insert(1, "-benchmark")
+    return cmd
+
+
+def parse_benchmark(stderr):
+    """
+    Reads ffmpeg's -benchmark lines.
+
+    Returns:
+        dict: cpu_seconds, rtime and maxrss_kb (None when missing).
+    """
+    stats = {"cpu_seconds": None, "rtime": None, "maxrss_kb": None}
+    times = _BENCH_TIMES.findall(stderr)
+    if times:
+        utime, stime, rtime = (float(v) for v in times[-1])
+        stats["cpu_seconds"] = utime + stime
+        stats["rtime"] = rtime
+    rss = _BENCH_RSS.findall(stderr)
+    if rss:
+        stats["maxrss_kb"] = int(rss[-1])
+    return stats
+
+
+def candidate_layouts(cores, gpu=False, gpu_sessions=GPU_SESSION_LIMIT):
+    """
+    Returns the (workers, threads) layouts worth measuring on a host.
+
+    CPU encodes try 1, 2, 4, ... threads per job, each with a single job and
+    with as many jobs as fill the cores. GPU encodes try 1..gpu_sessions jobs.
+    """
+    if gpu:
+        return [(w, GPU_JOB_THREADS) for w in range(1, max(1, gpu_sessions) + 1)]
+    layouts = set()
+    threads = 1
+    while threads <= max(1, cores):
+        layouts.add((1, threads))
+        layouts.add((max(1, cores // threads), threads))
+        threads *= 2
+    return sorted(layouts)
+
+
+def run_layout(clip_path, seconds, preset, gpu_codec, workers, threads, out_dir):
+    """
+    Runs `workers` identical encodes of a clip side by side.
+
+    Returns:
+        dict: The measurements listed in the module docstring, plus `ok`.
+    """
+    cores = os.cpu_count() or 1
+    outputs = [os.path.join(out_dir, f"run{i}.mp4") for i in range(workers)]
+
+    def encode(output):
+        cmd = build_command(clip_path, output, preset, gpu_codec, threads=threads)
+        return run_ffmpeg(benchmark_command(cmd))
+
+    started = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        runs = list(pool.map(encode, outputs))
+    wall = time.monotonic() - started
+
+    ok = all(returncode == 0 for returncode, _ in runs)
+    stats = [parse_benchmark(err) for _, err in runs]
+    cpu = [s["cpu_seconds"] for s in stats if s["cpu_seconds"] is not None]
+    rss = [s["maxrss_kb"] for s in stats if s["maxrss_kb"] is not None]
+    result = {
+        "ok": ok,
+        "wall": round(wall, 3),
+        "fps": round(seconds * CLIP_FPS * workers / wall, 2) if ok else None,
+        "speed": round(seconds / wall, 3) if ok else None,
+        "cpu_percent": round(100.0 * sum(cpu) / (wall * cores), 1) if cpu else None,
+        "peak_rss_kb": max(rss) if rss else None,
+        "output_size": os.path.getsize(outputs[0]) if ok else None,
+    }
+    if not ok:
+        result["error"] = next(err for returncode, err in runs if returncode != 0)
+    for output in outputs:
+        discard(output)
+    return result
+
+
+def run_benchmark(
+    presets,
+    clips=tuple(CLIPS),
+    seconds=DEFAULT_CLIP_SECONDS,
+    gpu_codecs=None,
+    layouts=None,
+    on_result=None,
+):
+    """
+    Measures every preset on every clip under every candidate layout.
+
+    Parameters:
+        presets (dict): preset id -> preset.
+        gpu_codecs (dict): preset id -> GPU encoder for GPU presets on this host.
+            GPU presets are measured on the CPU encoder as well.
+        layouts (list): (workers, threads) layouts for CPU encodes
+            (default: candidate_layouts() for this host).
+        on_result (callable): Called with each result as it is measured.
+
+    Returns:
+        dict: The JSON report (host, settings, results, recommendation).
+    """
+    cores = os.cpu_count() or 1
+    gpu_codecs = gpu_codecs or {}
+    cpu_layouts = layouts or candidate_layouts(cores)
+    report = {
+        "started": time.time(),
+        "host": {
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu_count": cores,
+            "ffmpeg": ffmpeg_identity().split("|")[1],
+        },
+        "clip_seconds": seconds,
+        "results": [],
+    }
+
+    out_dir = tempfile.mkdtemp(prefix="mvc_bench_")
+    try:
+        for clip in clips:
+            clip_path = make_clip(clip, seconds)
+            for preset_id, preset in presets.items():
+                engines = [(None, cpu_layouts)]
+                if preset["use_gpu"] and gpu_codecs.get(preset_id):
+                    engines.append((gpu_codecs[preset_id], candidate_layouts(cores, gpu=True)))
+                for variant, variant_preset in preset_variants(clip_path, preset):
+                    for gpu_codec, engine_layouts in engines:
+                        for workers, threads in engine_layouts:
+                            result = {
+                                "preset": preset_id,
+                                "variant": variant,
+                                "clip": clip,
+                                "encoder": resolve_encoder(preset, gpu_codec),
+                                "gpu": bool(gpu_codec),
+                                "workers": workers,
+                                "threads": threads,
+                                **run_layout(
+                                    clip_path,
+                                    seconds,
+                                    variant_preset,
+                                    gpu_codec,
+                                    workers,
+                                    threads,
+                                    out_dir,
+                                ),
+                            }
+                            report["results"].append(result)
+                            if on_result:
+                                on_result(result)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    report["elapsed_seconds"] = round(time.time() - report["started"], 3)
+    report["recommendation"] = recommend(report["results"])
+    report["slide_gains"] = slide_gains(report["results"])
+    return report
+
+
+def preset_variants(clip_path, preset):
+    """
+    Returns [(variant, preset)] to measure: the plain preset (variant None)
+    and, for presets with slide detection, the decimated encode as "slides"
+    when the clip is static enough to get one.
+    """
+    if not preset.get("slide_detection"):
+        return [(None, preset)]
+    variants = [(None, {**preset, "slide_detection": False})]
+    tuned = slides.tune_preset(clip_path, probe_media(clip_path), preset)
+    if tuned.get("slides"):
+        variants.append(("slides", tuned))
+    return variants
+
+
+def slide_gains(results):
+    """
+    Compares each slide-detection run with the plain encode of the same preset,
+    clip and layout.
+
+    Returns:
+        list: dicts with preset, clip, workers, threads, `speedup` (x faster)
+        and `size_ratio` (decimated output size / plain output size).
+    """
+    plain = {}
+    for r in results:
+        if r["ok"] and r.get("variant") is None:
+            plain[(r["preset"], r["clip"], r["encoder"], r["workers"], r["threads"])] = r
+    gains = []
+    for r in results:
+        key = (r["preset"], r["clip"], r["encoder"], r["workers"], r["threads"])
+        base = plain.get(key)
+        if r.get("variant") != "slides" or not r["ok"] or not base:
+            continue
+        gains.append(
+            {
+                "preset": r["preset"],
+                "clip": r["clip"],
+                "workers": r["workers"],
+                "threads": r["threads"],
+                "speedup": round(r["fps"] / base["fps"], 2),
+                "size_ratio": round(r["output_size"] / base["output_size"], 3),
+            }
+        )
+    return gains
+
+
+def _key(r, *fields):
+    # Reports written before variants existed have no "variant" field.
+    return (r["preset"], r.get("variant"), r["clip"], r["encoder"], *(r[f] for f in fields))
+
+
+def _best_layout(results):
+    # Each (preset, clip, encoder) counts equally: a layout scores the mean of its
+    # throughput relative to the best layout for that combination.
+    best = {}
+    for r in results:
+        best[_key(r)] = max(best.get(_key(r), 0.0), r["fps"])
+    scores = {}
+    for r in results:
+        ratio = r["fps"] / best[_key(r)]
+        scores.setdefault((r["workers"], r["threads"]), []).append(ratio)
+    # Ties go to the layout with fewer workers (less memory, fewer GPU sessions).
+    layout, ratios = max(scores.items(), key=lambda item: (statistics.mean(item[1]), -item[0][0]))
+    return layout, statistics.mean(ratios)
+
+
+def recommend(results):
+    """
+    Proposes the worker/thread configuration for this host.
+
+    Returns:
+        dict|None: workers, threads_per_job and cpu_threads for CPU encodes,
+        gpu_sessions if GPU encodes were measured, a `score` (1.0 = the best
+        layout for every preset and clip), the matching environment variables
+        and measured `est_speed` hints per preset. None if nothing succeeded.
+    """
+    measured = [r for r in results if r["ok"] and r["fps"]]
+    cpu = [r for r in measured if not r["gpu"]]
+    gpu = [r for r in measured if r["gpu"]]
+    if not cpu and not gpu:
+        return None
+
+    recommendation = {"est_speed": {}}
+    if cpu:
+        (workers, threads), score = _best_layout(cpu)
+        recommendation.update(
+            workers=workers,
+            threads_per_job=threads,
+            cpu_threads=workers * threads,
+            score=round(score, 3),
+            env={"MVC_THREADS_PER_JOB": threads, "MVC_CPU_THREADS": workers * threads},
+        )
+    if gpu:
+        (sessions, _), _ = _best_layout(gpu)
+        recommendation["gpu_sessions"] = sessions
+        recommendation.setdefault("env", {})["MVC_GPU_SESSIONS"] = sessions
+
+    # est_speed is x realtime for one job at 1080p, on an otherwise idle machine,
+    # without content-dependent shortcuts like slide detection.
+    for r in measured:
+        if r["workers"] != 1 or r["clip"] not in CALIBRATION_CLIPS or r.get("variant"):
+            continue
+        engine = "gpu" if r["gpu"] else "cpu"
+        speeds = recommendation["est_speed"].setdefault(r["preset"], {})
+        speeds[engine] = max(speeds.get(engine, 0.0), r["speed"])
+    return recommendation
+
+
+def compare(baseline, report, tolerance=REGRESSION_TOLERANCE):
+    """
+    Compares a report with a baseline report of the same host.
+
+    Returns:
+        list: One message per run that got slower or produced larger output
+        than the baseline by more than `tolerance`.
+    """
+    previous = {}
+    for r in baseline.get("results", []):
+        previous[_key(r, "workers", "threads")] = r
+
+    regressions = []
+    for r in report["results"]:
+        old = previous.get(_key(r, "workers", "threads"))
+        if not old or not old["ok"]:
+            continue
+        layout = f"{r['workers']}x{r['threads']}"
+        label = f"preset {r['preset']} / {r['clip']} / {r['encoder']} ({layout})"
+        if not r["ok"]:
+            regressions.append(f"{label}: failed, baseline succeeded")
+            continue
+        if r["fps"] < old["fps"] * (1 - tolerance):
+            regressions.append(f"{label}: {r['fps']} fps, baseline {old['fps']} fps")
+        if r["output_size"] > old["output_size"] * (1 + tolerance):
+            regressions.append(
+                f"{label}: {r['output_size']} bytes, baseline {old['output_size']} bytes"
+            )
+    return regressions
@@ -0,0 +1,154 @@
+"""
+Helpers for segment-parallel encoding of very long files.
+
+A long input is split at keyframes into time segments with a stream copy
+(lossless), the segments are encoded concurrently with the preset's video
+settings, and the results are joined with the concat demuxer. Audio is encoded
+once from the full input as a separate stream, so segment boundaries can't
+introduce audio gaps or clicks.
+"""
+
+import os
+import threading
+import time
+
+from config.settings import FFMPEG_EXE
+
+SEGMENT_PATTERN = "seg_%05d.mkv"
+
+
+def should_chunk(info, threshold):
+    """Returns True if the input is long enough to be split (threshold in seconds, 0 = off)."""
+    if not threshold or not info or not info.get("video"):
+        return False
+    return (info.get("duration") or 0) >= threshold
+
+
+def split_command(input_path, workdir, segment_seconds):
+    """
+    Copies the first video stream into ~`segment_seconds` long segments.
+
+    The segment muxer only cuts on keyframes, so every segment starts with one
+    and can be encoded independently.
+    """
+    return [
+        FFMPEG_EXE,
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        input_path,
+        "-map",
+        "0:v:0",
+        "-c",
+        "copy",
+        "-f",
+        "segment",
+        "-segment_time",
+        str(segment_seconds),
+        "-reset_timestamps",
+        "1",
+        os.path.join(workdir, SEGMENT_PATTERN),
+    ]
+
+
+def audio_command(input_path, audio_path, preset):
+    """Encodes the first audio stream of the whole input once (it must have one)."""
+    return [
+        FFMPEG_EXE,
+        "-y",
+        "-v",
+        "error",
+        "-i",
+        input_path,
+        "-vn",
+        "-map",
+        "0:a:0?",
+        *preset["audio_params"],
+        audio_path,
+    ]
+
+
+def list_segments(workdir):
+    """Returns the split segments in timeline order."""
+    names = sorted(n for n in os.listdir(workdir) if n.startswith("seg_") and n.endswith(".mkv"))
+    return [os.path.join(workdir, n) for n in names]
+
+
+def write_concat_list(paths, list_path):
+    """Writes a concat demuxer list file."""
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_path
+
+
+def concat_command(list_path, audio_path, output_path):
+    """Joins the encoded segments and the separately encoded audio without re-encoding."""
+    cmd = [
+        FFMPEG_EXE,
+        "-y",
+        "-v",
+        "error",
+        "-nostats",
+        "-progress",
+        "pipe:1",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        list_path,
+    ]
+    if audio_path:
+        cmd.extend(["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0?"])
+    cmd.extend(["-c", "copy", output_path])
+    return cmd
+
+
+class SegmentProgress:
+    """
+    Merges progress from concurrently encoded segments into one stream of
+    raw progress blocks for the file as a whole.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.started = time.monotonic()
+        self._segments = {}
+        self._lock = threading.Lock()
+
+    def for_segment(self, index):
+        """Returns an on_progress callback for segment `index`."""
+
+        def update(raw):
+            with self._lock:
+                self._segments[index] = raw
+                merged = self._merged()
+            if self.callback:
+                self.callback(merged)
+
+        return update
+
+    def _merged(self):
+        def total(key):
+            values = []
+            for raw in self._segments.values():
+                try:
+                    values.append(float(raw.get(key, "")))
+                except ValueError:
+                    pass
+            return sum(values)
+
+        out_time_us = total("out_time_us")
+        elapsed = time.monotonic() - self.started
+        speed = out_time_us / 1_000_000 / elapsed if elapsed > 0 else 0.0
+        return {
+            "frame": str(int(total("frame"))),
+            "fps": f"{total('fps'):.2f}",
+            "total_size": str(int(total("total_size"))),
+            "out_time_us": str(int(out_time_us)),
+            "speed": f"{speed:.3f}x",
+            "progress": "continue",
+        }
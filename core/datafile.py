@@ -0,0 +1,30 @@
+"""
+Reading TOML/JSON configuration files (job files, user presets).
+"""
+
+import json
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+def read_data_file(path):
+    """
+    Decodes a .json file, or any other file as TOML.
+
+    Raises:
+        OSError: If the file can't be read.
+        ValueError: If it can't be parsed (or TOML support is missing).
+    """
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if tomllib is None:
+        raise ValueError("TOML files need Python 3.11+ or the 'tomli' package")
+    with open(path, "rb") as f:
+        return tomllib.load(f)
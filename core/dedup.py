@@ -0,0 +1,271 @@
+"""
+Content-hash deduplication of source files.
+
+Ingest folders often hold the same recording several times, under other
+names or in other folders. With deduplication, each distinct content is
+encoded once per job, and its output is then linked to the output names of
+the duplicates: a hardlink where the filesystem allows it, else a reflink
+(copy-on-write clone), else a plain copy.
+
+Finding duplicates costs as little I/O as possible: files are grouped by
+size first (from os.stat), only files sharing a size are fingerprinted
+(core.manifest.fingerprint(): the first and last MiB), and only fingerprint
+collisions are confirmed with a hash of the whole file. Hashes are kept in a
+HashIndex in the cache folder, so an unchanged file is never hashed twice.
+Files whose size collides are checked off the discovery thread (see
+Deduper.collides()); the index is written once the batch is done with it.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from config.settings import CACHE_DIR
+from core.atomic import discard, partial_path, publish
+from core.manifest import fingerprint
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+INDEX_FILE = "hashes.json"
+HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+# ioctl that clones a file's extents (btrfs, XFS, bcachefs, ...).
+FICLONE = 0x40049409
+
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+COPY = "copy"
+
+
+def full_hash(path, chunk=HASH_CHUNK_BYTES):
+    """Hash of the whole file."""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class HashIndex:
+    """
+    Partial (fingerprint) and full hashes per path, persisted in the cache
+    folder by save(). An entry is reused while the file's size and mtime are
+    unchanged.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def partial(self, path):
+        return self._hash(path, "partial", fingerprint)
+
+    def full(self, path):
+        return self._hash(path, "full", full_hash)
+
+    def _hash(self, path, kind, compute):
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry and entry["stamp"] == stamp and kind in entry:
+                return entry[kind]
+        value = compute(path)
+        with self._lock:
+            entry = self.entries.get(key)
+            if not entry or entry["stamp"] != stamp:
+                entry = self.entries[key] = {"stamp": stamp}
+            entry[kind] = value
+            self._dirty = True
+        return value
+
+    def save(self):
+        """Writes the index if hashes were added since it was loaded or saved."""
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = json.dumps(self.entries)
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(entries)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        return False
+    try:
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        return True
+    except OSError:
+        discard(dst)
+        return False
+
+
+def link_file(src, dst):
+    """
+    Puts the content of `src` at `dst` without re-encoding: a hardlink if
+    possible, else a reflink, else a copy. Written under a partial name and
+    published atomically (see core.atomic).
+
+    Returns:
+        str: HARDLINK, REFLINK or COPY.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    partial = partial_path(dst)
+    discard(partial)
+    try:
+        try:
+            os.link(src, partial)
+            method = HARDLINK
+        except OSError:
+            # Other filesystem, or one without hardlinks (FAT, some shares).
+            method = REFLINK if _reflink(src, partial) else COPY
+            if method == COPY:
+                shutil.copyfile(src, partial)
+        publish(partial, dst)
+        return method
+    finally:
+        discard(partial)
+
+
+class _Content:
+    """One distinct content: the file encoded for it and the duplicates waiting on it."""
+
+    def __init__(self, path, outputs, encoded):
+        self.path = path
+        self.outputs = outputs
+        # None while encoding, then whether the encode succeeded.
+        self.ok = True if encoded else None
+        self.waiting = []
+
+
+class Deduper:
+    """
+    Tracks the distinct contents offered so far.
+
+    Files are compared within a `scope` (e.g. one job): the same content
+    under different presets still has to be encoded for each.
+    """
+
+    def __init__(self, index=None):
+        self.index = index or HashIndex()
+        self._sizes = {}  # (scope, size) -> [_Content]
+        self._originals = {}  # (scope, path) -> _Content
+        self._group_locks = {}  # (scope, size) -> Lock, held while a file is matched
+        self._lock = threading.Lock()
+
+    def collides(self, scope, path):
+        """
+        Whether a file of the same size was offered in `scope`, so offer()
+        has to hash files to compare them (worth running off the discovery
+        thread; see main.Batch).
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        with self._lock:
+            return bool(self._sizes.get((scope, size)))
+
+    def _same(self, a, b):
+        return self.index.partial(a) == self.index.partial(b) and (
+            self.index.full(a) == self.index.full(b)
+        )
+
+    def _match(self, candidates, path):
+        # A failed original doesn't count: the next copy gets its own encode.
+        # Neither does an earlier version of the same path (watch mode).
+        for content in candidates:
+            if content.ok is False or content.path == path:
+                continue
+            if self._same(content.path, path):
+                return content
+        return None
+
+    def offer(self, scope, path, outputs, done=None, encoded=False):
+        """
+        Registers a source file with its output paths (several for a
+        multi-rendition task, in the same order for every file in a scope).
+
+        If the file has the same content as one offered before, its outputs
+        are linked from that one's once it is encoded, and
+        done(original_path, method, error) is called with the link method
+        (see link_file()) or, if the original failed, None and an error.
+
+        `encoded` registers a file whose outputs are already up to date, as
+        the original for duplicates found later.
+
+        Returns:
+            bool: True for a duplicate (handled here), False for a file the
+            caller has to encode and report with finished().
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False  # the encode reports the unreadable file
+        with self._lock:
+            group_lock = self._group_locks.setdefault((scope, size), threading.Lock())
+        # Files of one size are matched one at a time, so two copies offered
+        # concurrently can't both become originals.
+        with group_lock:
+            with self._lock:
+                candidates = list(self._sizes.get((scope, size), ()))
+            try:
+                original = self._match(candidates, path) if candidates else None
+            except OSError:
+                return False
+
+            if original and encoded:
+                return False
+            with self._lock:
+                if original is None:
+                    content = _Content(path, outputs, encoded)
+                    self._sizes.setdefault((scope, size), []).append(content)
+                    self._originals[(scope, path)] = content
+                    return False
+                if original.ok is None:
+                    original.waiting.append((outputs, done))
+                    return True
+        self._link(original, outputs, done)
+        return True
+
+    def finished(self, scope, path, ok):
+        """Reports the encode of an original; links the duplicates waiting on it."""
+        with self._lock:
+            content = self._originals.get((scope, path))
+            if content is None or content.ok is not None:
+                return
+            content.ok = ok
+            waiting, content.waiting = content.waiting, []
+        for outputs, done in waiting:
+            self._link(content, outputs, done)
+
+    def _link(self, original, outputs, done):
+        if not original.ok:
+            done(original.path, None, "The file with the same content failed to encode")
+            return
+        try:
+            methods = {link_file(src, dst) for src, dst in zip(original.outputs, outputs)}
+        except OSError as e:
+            done(original.path, None, f"Linking failed: {e}")
+            return
+        done(original.path, "/".join(sorted(methods)), None)
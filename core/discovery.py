@@ -0,0 +1,158 @@
+"""
+Streaming discovery of source videos.
+
+Walks the source tree with `os.scandir` and yields files as they are found,
+so encoding can start while a large tree is still being listed.
+"""
+
+import os
+
+# Container extensions picked up by default (case-insensitive).
+VIDEO_EXTENSIONS = (
+    ".mp4",
+    ".m4v",
+    ".mov",
+    ".mkv",
+    ".webm",
+    ".avi",
+    ".mts",
+    ".m2ts",
+    ".ts",
+    ".mpg",
+    ".mpeg",
+    ".wmv",
+    ".flv",
+    ".3gp",
+)
+
+# Output containers that can hold every preset's streams; anything else becomes .mp4.
+KEEP_CONTAINERS = (".mp4", ".mov", ".mkv")
+
+_SNIFF_BYTES = 200
+
+
+def sniff_video(path):
+    """
+    Returns True if the file starts with the signature of a common video container.
+
+    Used for files without an extension (e.g. camera dumps or renamed uploads).
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(_SNIFF_BYTES)
+    except OSError:
+        return False
+
+    if len(head) < 12:
+        return False
+    # ISO BMFF (MP4/MOV/3GP): box type at offset 4
+    if head[4:8] in (b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip"):
+        return True
+    # Matroska / WebM (EBML header)
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return True
+    # AVI
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return True
+    # MPEG program stream
+    if head.startswith(b"\x00\x00\x01\xba"):
+        return True
+    # FLV
+    if head.startswith(b"FLV"):
+        return True
+    # MPEG-TS (188-byte packets) and M2TS/MTS (192-byte packets, 4-byte prefix)
+    if head[0] == 0x47 and len(head) > 188 and head[188] == 0x47:
+        return True
+    if len(head) > 196 and head[4] == 0x47 and head[196] == 0x47:
+        return True
+    # Windows Media (ASF header GUID)
+    if head.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"):
+        return True
+
+    return False
+
+
+def _is_video(entry, extensions, sniff):
+    name = entry.name
+    ext = os.path.splitext(name)[1].lower()
+    if ext:
+        return ext in extensions
+    return sniff and sniff_video(entry.path)
+
+
+def discover(source_folder, extensions=VIDEO_EXTENSIONS, recursive=True, sniff=True, exclude=()):
+    """
+    Yields (path, relative_path) for every video under `source_folder`.
+
+    Parameters:
+        extensions (tuple): Lower-case extensions to accept, including the dot.
+        recursive (bool): Descend into sub-folders.
+        sniff (bool): Inspect the header of files that have no extension.
+        exclude (tuple): Folders to skip (e.g. an output folder inside the source).
+    """
+    extensions = tuple(e.lower() for e in extensions)
+    excluded = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+    root = os.path.abspath(source_folder)
+    stack = [root]
+
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                subfolders = []
+                for entry in it:
+                    # Hidden files include our own manifest/telemetry files.
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                subfolders.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+
+                    if _is_video(entry, extensions, sniff):
+                        yield entry.path, os.path.relpath(entry.path, root)
+        except OSError:
+            continue
+
+        for sub in sorted(subfolders, reverse=True):
+            if os.path.normcase(os.path.abspath(sub)) not in excluded:
+                stack.append(sub)
+
+
+def _has_namesake(input_path, extensions):
+    """Whether another source discovery picks up shares the name of `input_path`."""
+    source_stem, ext = os.path.splitext(input_path)
+    for other in extensions:
+        for path in {source_stem + other, source_stem + other.upper()}:
+            try:
+                if os.path.exists(path) and not os.path.samefile(path, input_path):
+                    return True
+            except OSError:
+                continue
+    # An extensionless file (see sniff_video()) named like the stem.
+    return bool(ext) and os.path.isfile(source_stem) and sniff_video(source_stem)
+
+
+def output_path_for(input_path, relative_path, dest_folder, extensions=VIDEO_EXTENSIONS):
+    """
+    Mirrors `relative_path` into `dest_folder`.
+
+    Sources in containers not listed in KEEP_CONTAINERS are written as .mp4. If
+    that would clash with a sibling source of the same name (e.g. 'a.avi' next
+    to 'a.mp4' or 'a.mts'), the original extension is kept in the name
+    ('a_avi.mp4'). `extensions` are those given to discover().
+    """
+    stem, ext = os.path.splitext(relative_path)
+    if ext.lower() in KEEP_CONTAINERS:
+        return os.path.join(dest_folder, relative_path)
+
+    extensions = tuple(e.lower() for e in extensions)
+    if _has_namesake(input_path, extensions):
+        stem = f"{stem}_{ext.lstrip('.').lower()}" if ext else f"{stem}_noext"
+
+    return os.path.join(dest_folder, stem + ".mp4")
@@ -0,0 +1,127 @@
+"""
+Classifies failed ffmpeg runs from their stderr.
+
+A GPU encode can die for reasons that say nothing about the file: every
+hardware session is taken, the encoder can't handle the source (e.g. 10-bit
+input on an 8-bit-only NVENC), or the driver resets. Those jobs are worth
+another attempt, on the GPU after a pause or straight away on the CPU. A file
+that ffmpeg cannot read fails the same way on any encoder, so it isn't retried.
+"""
+
+import re
+
+from config.settings import GPU_RETRY_BACKOFF_SECONDS
+
+# Every hardware session is in use (ours or another program's): wait, then retry on the GPU.
+GPU_BUSY = "gpu_busy"
+# The hardware encoder/decoder can't handle this input or setting: retry on the CPU.
+GPU_UNSUPPORTED = "gpu_unsupported"
+# Driver or device error mid-encode: retry on the CPU.
+GPU_FAULT = "gpu_fault"
+# Unreadable input or an unwritable output: retrying won't help.
+BAD_INPUT = "bad_input"
+UNKNOWN = "unknown"
+
+# Checked in order; the first category with a matching pattern wins.
+FAILURE_PATTERNS = (
+    (
+        BAD_INPUT,
+        (
+            r"Invalid data found when processing input",
+            r"moov atom not found",
+            r"No such file or directory",
+            r"Permission denied",
+            r"No space left on device",
+            r"does not contain any stream",
+            r"could not find codec parameters",
+        ),
+    ),
+    (
+        GPU_BUSY,
+        (
+            r"OpenEncodeSessionEx failed: out of memory",
+            r"incompatible client key",
+            r"CUDA_ERROR_OUT_OF_MEMORY",
+            r"MFX_ERR_MEMORY_ALLOC",
+            r"Device or resource busy",
+            r"No capable devices found",
+        ),
+    ),
+    (
+        GPU_FAULT,
+        (
+            r"CUDA_ERROR_\w+",
+            r"NV_ENC_ERR_\w+",
+            r"EncodePicture failed",
+            r"MFX_ERR_DEVICE_\w+",
+            r"device (?:was )?lost",
+            r"fallen off the bus",
+        ),
+    ),
+    (
+        GPU_UNSUPPORTED,
+        (
+            r"10 bit encode not supported",
+            r"doesn't support required NVENC features",
+            r"No NVENC capable devices found",
+            r"Driver does not support",
+            r"InitializeEncoder failed",
+            r"MFX_ERR_UNSUPPORTED",
+            r"Error creating a MFX session",
+            r"vaCreateConfig|VAProfile\w* not supported",
+            r"pixel format .* not supported|Unsupported pixel format",
+            r"Failed setup for format",
+            r"hwaccel initialisation returned error",
+            r"Error while opening encoder",
+            r"Could not open encoder",
+            r"Error initializing output stream",
+            r"Cannot load (?:libcuda|libnvidia-encode|nvcuda|nvEncodeAPI)",
+        ),
+    ),
+)
+
+_COMPILED = tuple(
+    (kind, re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE))
+    for kind, patterns in FAILURE_PATTERNS
+)
+
+# Longest pause between retries on a busy GPU.
+MAX_BACKOFF_SECONDS = 300
+
+
+class GpuFailure(RuntimeError):
+    """
+    Raised by process_file() when a GPU encode failed in a way another
+    attempt might fix. `kind` is one of the GPU_* / UNKNOWN constants.
+    """
+
+    def __init__(self, kind, stderr=""):
+        lines = [line for line in (stderr or "").splitlines() if line.strip()]
+        super().__init__(lines[-1] if lines else "Unknown Error")
+        self.kind = kind
+        self.stderr = stderr
+
+
+def classify_failure(stderr):
+    """Returns the failure category for an ffmpeg stderr tail."""
+    for kind, pattern in _COMPILED:
+        if pattern.search(stderr or ""):
+            return kind
+    return UNKNOWN
+
+
+def gpu_failure(stderr):
+    """
+    Returns a GpuFailure for a failed GPU encode, or None if the input itself
+    is at fault. Unrecognised errors are retried too: the CPU encoder is the
+    documented fallback, and one extra attempt is cheap next to a lost file.
+    """
+    kind = classify_failure(stderr)
+    if kind == BAD_INPUT:
+        return None
+    return GpuFailure(kind, stderr)
+
+
+def backoff_delay(attempt, base=GPU_RETRY_BACKOFF_SECONDS):
+    """Seconds to wait before GPU retry number `attempt` (0-based): base, 2x, 4x..."""
+    return min(base * 2**attempt, MAX_BACKOFF_SECONDS)
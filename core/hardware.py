@@ -1,11 +1,38 @@
+import concurrent.futures
+import json
+import os
 import subprocess
 
-from config.settings import FFMPEG_EXE
+from config.settings import CACHE_DIR, FFMPEG_EXE
+
+# Candidate hardware encoders per codec family, in priority order.
+GPU_ENCODERS = {
+    "h264": ["h264_nvenc", "h264_amf", "h264_qsv", "h264_videotoolbox"],
+    "hevc": ["hevc_nvenc", "hevc_amf", "hevc_qsv", "hevc_videotoolbox"],
+}
+
+CACHE_FILE = "encoders.json"
+
+# End-to-end hardware paths (decode -> scale -> encode without leaving the GPU),
+# keyed by hwaccel name. `suffix` matches the encoders that can take its frames.
+HW_BACKENDS = {
+    "cuda": {"suffix": "_nvenc", "scale": "scale_cuda", "output_format": "cuda"},
+    "qsv": {"suffix": "_qsv", "scale": "scale_qsv", "output_format": "qsv"},
+    "vaapi": {"suffix": "_vaapi", "scale": "scale_vaapi", "output_format": "vaapi"},
+    "videotoolbox": {
+        "suffix": "_videotoolbox",
+        "scale": "scale_vt",
+        "output_format": "videotoolbox_vld",
+    },
+}
+
+# Software filters that have a drop-in hardware equivalent (same option syntax).
+HW_FILTERS = ("scale",)
 
 
 def check_encoder(encoder_name):
     """
-    Tests if a specific encoder is available by trying to encode 1 second of black video.
+    Tests if a specific encoder is available by encoding a few tiny black frames.
     """
     try:
         cmd = [
@@ -16,11 +43,11 @@ def check_encoder(encoder_name):
             "-f",
             "lavfi",
             "-i",
-            "color=c=black:s=1280x720:r=30",
+            "color=c=black:s=256x144:r=30",
             "-c:v",
             encoder_name,
-            "-t",
-            "1",
+            "-frames:v",
+            "3",
             "-f",
             "null",
             "-",
@@ -31,18 +58,211 @@ def check_encoder(encoder_name):
         return False
 
 
-def detect_gpu_codec():
+def ffmpeg_identity(exe=FFMPEG_EXE):
+    """
+    Returns a string identifying the ffmpeg binary (path, version and mtime).
+
+    Used as the cache key, so upgrading or swapping ffmpeg invalidates the probe.
+    """
+    try:
+        st = os.stat(exe)
+        mtime = st.st_mtime_ns
+    except OSError:
+        mtime = 0
+
+    try:
+        result = subprocess.run(
+            [exe, "-version"], check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        version = result.stdout.decode(errors="replace").splitlines()[0].strip()
+    except (subprocess.CalledProcessError, FileNotFoundError, IndexError):
+        version = "unknown"
+
+    return f"{os.path.abspath(exe)}|{version}|{mtime}"
+
+
+def _load_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path, data):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except OSError:
+        # A read-only home folder only costs us the cache, not the run.
+        pass
+
+
+def probe_encoders(refresh=False):
+    """
+    Returns a dict mapping every candidate GPU encoder to True/False.
+
+    Results are cached on disk per ffmpeg binary. On a cache miss (or when
+    `refresh` is True) all candidates are probed in parallel.
+    """
+    cache_path = os.path.join(CACHE_DIR, CACHE_FILE)
+    key = ffmpeg_identity()
+    cache = _load_cache(cache_path)
+
+    if not refresh and key in cache:
+        return cache[key]
+
+    candidates = [enc for family in GPU_ENCODERS.values() for enc in family]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(candidates)) as executor:
+        results = dict(zip(candidates, executor.map(check_encoder, candidates)))
+
+    cache[key] = results
+    _save_cache(cache_path, cache)
+    return results
+
+
+def detect_gpu_codec(family="h264", refresh=False):
     """
-    Returns the best available GPU codec name, or None if no GPU found.
+    Returns the best available GPU codec name for `family`, or None if no GPU found.
     """
-    # Priority Order
-    if check_encoder("h264_nvenc"):
-        return "h264_nvenc"  # NVIDIA
-    if check_encoder("h264_amf"):
-        return "h264_amf"  # AMD
-    if check_encoder("h264_qsv"):
-        return "h264_qsv"  # Intel QuickSync
-    if check_encoder("h264_videotoolbox"):
-        return "h264_videotoolbox"  # Mac
+    available = probe_encoders(refresh=refresh)
+
+    # Priority Order: NVIDIA -> AMD -> Intel QuickSync -> Mac
+    for encoder in GPU_ENCODERS[family]:
+        if available.get(encoder):
+            return encoder
 
     return None
+
+
+def preset_codec_family(preset):
+    """
+    Returns the codec family ('h264' or 'hevc') a GPU preset expects.
+    """
+    for encoder in preset.get("gpu_quality_flags", {}):
+        return encoder.split("_")[0]
+    return "h264"
+
+
+def backend_for(encoder):
+    """Returns the HW_BACKENDS name whose frames `encoder` accepts, or None."""
+    for name, backend in HW_BACKENDS.items():
+        if encoder and encoder.endswith(backend["suffix"]):
+            return name
+    return None
+
+
+def list_hwaccels(exe=FFMPEG_EXE):
+    """Returns the hwaccel names compiled into ffmpeg."""
+    try:
+        result = subprocess.run(
+            [exe, "-hide_banner", "-hwaccels"],
+            check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return set()
+    lines = result.stdout.decode(errors="replace").splitlines()
+    return {line.strip() for line in lines[1:] if line.strip()}
+
+
+def check_hw_pipeline(encoder):
+    """
+    Tests a full GPU path for `encoder`: frames are uploaded to the device,
+    scaled with the backend's scale filter and encoded, without touching the CPU.
+    """
+    name = backend_for(encoder)
+    if not name:
+        return False
+    backend = HW_BACKENDS[name]
+    cmd = [
+        FFMPEG_EXE,
+        "-y",
+        "-v",
+        "error",
+        "-init_hw_device",
+        f"{name}=hw",
+        "-filter_hw_device",
+        "hw",
+        "-f",
+        "lavfi",
+        "-i",
+        "color=c=black:s=256x144:r=30",
+        "-vf",
+        f"format=nv12,hwupload,{backend['scale']}=128:72",
+        "-c:v",
+        encoder,
+        "-frames:v",
+        "3",
+        "-f",
+        "null",
+        "-",
+    ]
+    try:
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return True
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return False
+
+
+def detect_hw_pipeline(encoder, refresh=False):
+    """
+    Returns the hwaccel name to use for an end-to-end GPU path with
+    `encoder`, or None if this machine/ffmpeg can't do it. Cached like
+    probe_encoders().
+    """
+    name = backend_for(encoder)
+    if not name:
+        return None
+
+    cache_path = os.path.join(CACHE_DIR, CACHE_FILE)
+    key = f"{ffmpeg_identity()}|hw"
+    cache = _load_cache(cache_path)
+    results = cache.get(key, {})
+
+    if refresh or encoder not in results:
+        results[encoder] = name in list_hwaccels() and check_hw_pipeline(encoder)
+        cache[key] = results
+        _save_cache(cache_path, cache)
+
+    return name if results[encoder] else None
+
+
+def hw_input_args(backend):
+    """Decoder options that keep decoded frames in GPU memory."""
+    return ["-hwaccel", backend, "-hwaccel_output_format", HW_BACKENDS[backend]["output_format"]]
+
+
+def hw_video_args(video_args, backend):
+    """
+    Rewrites encoder arguments for a hardware pipeline: filters in `-vf` are
+    swapped for the backend's GPU versions (scale -> scale_cuda, ...).
+
+    Returns:
+        list|None: The new arguments, or None if some option can't run on
+        GPU frames (e.g. another filter, or a forced -pix_fmt).
+    """
+    args = []
+    i = 0
+    while i < len(video_args):
+        flag = video_args[i]
+        if flag == "-pix_fmt":
+            return None
+        if flag in ("-vf", "-filter:v") and i + 1 < len(video_args):
+            chain = []
+            for item in video_args[i + 1].split(","):
+                filter_name, sep, options = item.partition("=")
+                if filter_name not in HW_FILTERS:
+                    return None
+                hw_name = HW_BACKENDS[backend][filter_name]
+                chain.append(f"{hw_name}{sep}{options}")
+            args.extend([flag, ",".join(chain)])
+            i += 2
+            continue
+        args.append(flag)
+        i += 1
+    return args
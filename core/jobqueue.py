@@ -0,0 +1,283 @@
+"""
+File-based job queue for running one batch on several machines.
+
+The queue is a folder on storage every node can reach (e.g. the NAS that holds
+the videos). A coordinator writes one JSON ticket per file; workers claim
+tickets by renaming them, which succeeds for exactly one of them, and write a
+result when the encode finishes. No server or lock daemon is involved:
+
+    pending/<id>.json            waiting to be claimed
+    claimed/<id>@<worker>.json   being encoded by <worker>
+    done/<id>.json               finished (ticket + result), read by the coordinator
+    workers/<worker>.json        heartbeat: encoders, capacity, last update
+    metrics/<worker>.jsonl       per-job metrics of <worker> (see core.metrics)
+    closed                       the coordinator has queued everything
+
+Paths inside tickets are absolute, so every node must mount the shared
+storage at the same path.
+
+A worker that is alive but misses heartbeats (a stalled mount, a paused VM)
+can have its tickets re-queued while it still encodes them. Each worker
+therefore writes its own partials and publishes an output only while it still
+holds the claim (see Claims); a late result is dropped.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import time
+
+from core.atomic import partial_path
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+WORKERS = "workers"
+METRICS = "metrics"
+CLOSED_MARKER = "closed"
+
+CLAIM_LOST = "Re-queued by the coordinator meanwhile; left to another worker"
+
+
+def worker_name():
+    """A queue-wide unique name for this process, e.g. 'node3-41822'."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def ticket_id(output_path):
+    """Tickets are keyed by output, so re-queuing a file replaces its old ticket."""
+    return hashlib.sha1(os.path.abspath(output_path).encode()).hexdigest()[:16]
+
+
+def _write_json(path, data):
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _json_files(folder):
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    return sorted(n for n in names if n.endswith(".json") and not n.startswith("."))
+
+
+class JobQueue:
+    """
+    One queue folder, shared by a coordinator and any number of workers.
+
+    Parameters:
+        root (str): The queue folder (created if missing).
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for folder in (PENDING, CLAIMED, DONE, WORKERS, METRICS):
+            os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def metrics_path(self, worker):
+        return self._path(METRICS, f"{worker}.jsonl")
+
+    def reset(self):
+        """Clears tickets left over from an earlier batch (coordinator startup)."""
+        for folder in (PENDING, CLAIMED, DONE):
+            for name in _json_files(self._path(folder)):
+                try:
+                    os.remove(self._path(folder, name))
+                except OSError:
+                    pass
+        try:
+            os.remove(self._path(CLOSED_MARKER))
+        except FileNotFoundError:
+            pass
+
+    # --- coordinator side -------------------------------------------------
+
+    def put(self, ticket):
+        """Queues a ticket (a JSON-serialisable dict with at least an 'id')."""
+        _write_json(self._path(PENDING, f"{ticket['id']}.json"), ticket)
+
+    def close(self):
+        """Tells workers that no more tickets will be queued."""
+        with open(self._path(CLOSED_MARKER), "w", encoding="utf-8"):
+            pass
+
+    def results(self):
+        """Returns (and removes) every finished ticket."""
+        finished = []
+        for name in _json_files(self._path(DONE)):
+            path = self._path(DONE, name)
+            result = _read_json(path)
+            if result is None:
+                continue
+            finished.append(result)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return finished
+
+    def claims(self):
+        """Returns {ticket_id: worker} for tickets being encoded."""
+        claims = {}
+        for name in _json_files(self._path(CLAIMED)):
+            tid, _, worker = name[: -len(".json")].partition("@")
+            claims[tid] = worker
+        return claims
+
+    def release(self, tid, worker):
+        """Puts a claimed ticket back in the queue (e.g. its worker died)."""
+        try:
+            os.rename(
+                self._path(CLAIMED, f"{tid}@{worker}.json"), self._path(PENDING, f"{tid}.json")
+            )
+            return True
+        except OSError:
+            return False
+
+    # --- worker side ------------------------------------------------------
+
+    @property
+    def closed(self):
+        return os.path.exists(self._path(CLOSED_MARKER))
+
+    def pending(self):
+        """Returns the waiting tickets, most expensive first."""
+        tickets = []
+        for name in _json_files(self._path(PENDING)):
+            ticket = _read_json(self._path(PENDING, name))
+            if ticket:
+                tickets.append(ticket)
+        tickets.sort(key=lambda t: t.get("cost", 0), reverse=True)
+        return tickets
+
+    def claim(self, worker, accept=None):
+        """
+        Claims the most expensive pending ticket that `accept(ticket)` allows.
+
+        Returns:
+            dict|None: The ticket, or None if nothing suitable is waiting.
+        """
+        for ticket in self.pending():
+            if accept and not accept(ticket):
+                continue
+            try:
+                os.rename(
+                    self._path(PENDING, f"{ticket['id']}.json"),
+                    self._path(CLAIMED, f"{ticket['id']}@{worker}.json"),
+                )
+            except OSError:
+                continue  # another worker was faster
+            return ticket
+        return None
+
+    def holds(self, tid, worker):
+        """Whether `worker` still has the ticket claimed (it wasn't re-queued)."""
+        return os.path.exists(self._path(CLAIMED, f"{tid}@{worker}.json"))
+
+    def complete(self, ticket, worker, result):
+        """
+        Publishes the result of a claimed ticket.
+
+        Returns:
+            bool: False if the claim was lost (the ticket was re-queued); the
+            result is then dropped.
+        """
+        if not self.holds(ticket["id"], worker):
+            return False
+        _write_json(
+            self._path(DONE, f"{ticket['id']}.json"), {**ticket, **result, "worker": worker}
+        )
+        try:
+            os.remove(self._path(CLAIMED, f"{ticket['id']}@{worker}.json"))
+        except OSError:
+            pass
+        return True
+
+    def heartbeat(self, worker, info):
+        """Advertises a worker and proves it is alive; call every few seconds."""
+        path = self._path(WORKERS, f"{worker}.json")
+        previous = _read_json(path) or {}
+        beat = previous.get("beat", 0) + 1
+        _write_json(path, {**info, "name": worker, "beat": beat, "updated": time.time()})
+
+    def leave(self, worker):
+        try:
+            os.remove(self._path(WORKERS, f"{worker}.json"))
+        except OSError:
+            pass
+
+    def workers(self):
+        """Returns the advertised workers (see LivenessTracker for which are alive)."""
+        found = []
+        for name in _json_files(self._path(WORKERS)):
+            info = _read_json(self._path(WORKERS, name))
+            if info:
+                found.append(info)
+        return found
+
+
+class Claims:
+    """
+    The claims of one worker, as seen by its encodes (see core.processor):
+    outputs go to partials named after the worker, and are published only
+    while the worker still holds the ticket.
+    """
+
+    def __init__(self, queue, worker):
+        self.queue = queue
+        self.worker = worker
+
+    def partial_path(self, output_path):
+        return partial_path(output_path, owner=self.worker)
+
+    def holds(self, output_path):
+        """Whether the ticket of the task writing `output_path` is still ours."""
+        return self.queue.holds(ticket_id(output_path), self.worker)
+
+
+class LivenessTracker:
+    """
+    Decides which workers are gone, from the observer's own clock (the
+    coordinator's, or a worker's looking at its peers).
+
+    A worker counts as alive while its heartbeat counter keeps changing, so
+    clock differences between machines don't matter.
+    """
+
+    def __init__(self, timeout, clock=time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self._seen = {}  # worker -> (beat, first seen at this beat)
+
+    def _stale(self, worker, beat, now):
+        seen = self._seen.get(worker)
+        if seen is None or seen[0] != beat:
+            self._seen[worker] = (beat, now)
+            return False
+        return now - seen[1] > self.timeout
+
+    def dead(self, workers, claimed_by):
+        """Returns the workers in `claimed_by` that missed heartbeats for `timeout` seconds."""
+        now = self.clock()
+        beats = {w["name"]: w.get("beat") for w in workers}
+        return {worker for worker in set(claimed_by) if self._stale(worker, beats.get(worker), now)}
+
+    def alive(self, workers):
+        """Returns the advertised `workers` whose heartbeat changed within `timeout` seconds."""
+        now = self.clock()
+        return [w for w in workers if not self._stale(w["name"], w.get("beat"), now)]
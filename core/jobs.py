@@ -0,0 +1,236 @@
+"""
+Declarative batch specs for headless runs.
+
+A job file (TOML or JSON) lists one or more preset/folder pairs that are run
+through a single shared worker pool:
+
+    workers = 6                      # optional, defaults to the scheduler's budget
+    summary = "mvc-summary.json"     # optional machine-readable report
+
+    [defaults]                       # optional, applied to every job
+    extensions = ["mp4", "mov"]
+
+    [[jobs]]
+    preset = "1"
+    source = "/srv/lectures/*/raw"   # glob; may match several folders
+    dest = "/srv/lectures/compressed"
+    include = ["**/week*.mp4"]       # optional relative-path patterns
+    exclude = ["**/drafts/*"]
+
+`preset` may also list several ids (`preset = ["5", "4", "3"]`): each file is
+then decoded once and written once per preset, named by the preset's suffix
+(see core/renditions.py).
+
+Relative paths are resolved against the job file's folder. Besides the keys
+above, a job accepts `recursive`, `passthrough`, `hw_pipeline`, `slide_detection`,
+`chunk_threshold`, `quality_target` and `quality_metric`, with the same meaning
+as the CLI flags.
+"""
+
+import fnmatch
+import glob
+import os
+
+from config.presets import PRESETS
+from core.datafile import read_data_file
+from core.discovery import VIDEO_EXTENSIONS
+from core.renditions import rendition_suffix
+
+JOB_KEYS = {
+    "name",
+    "preset",
+    "source",
+    "dest",
+    "include",
+    "exclude",
+    "extensions",
+    "recursive",
+    "passthrough",
+    "hw_pipeline",
+    "slide_detection",
+    "chunk_threshold",
+    "quality_target",
+    "quality_metric",
+}
+TOP_LEVEL_KEYS = {"workers", "summary", "defaults", "jobs"}
+# The normalized job keys job_preset() reads (what a distributed worker needs).
+PRESET_OPTION_KEYS = (
+    "presets",
+    "passthrough",
+    "hw_pipeline",
+    "slide_detection",
+    "chunk_threshold",
+    "quality_target",
+    "quality_metric",
+)
+QUALITY_METRICS = ("ssim", "psnr", "vmaf")
+
+
+class JobFileError(ValueError):
+    """Raised for unreadable or invalid job files."""
+
+
+def _normalize_extensions(values):
+    exts = [str(e).strip().lower() for e in values if str(e).strip()]
+    return tuple(e if e.startswith(".") else "." + e for e in exts)
+
+
+def _resolve(path, base_dir):
+    path = os.path.expanduser(str(path))
+    return os.path.normpath(path if os.path.isabs(path) else os.path.join(base_dir, path))
+
+
+def expand_sources(pattern):
+    """Returns the existing folders matched by a path or glob pattern."""
+    if glob.has_magic(pattern):
+        return sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isdir(p))
+    return [pattern] if os.path.isdir(pattern) else []
+
+
+def path_selected(rel_path, include=(), exclude=()):
+    """
+    Applies a job's include/exclude patterns to a source-relative path.
+    '**/' also matches files at the top level.
+    """
+    rel_path = rel_path.replace(os.sep, "/")
+
+    def match(pattern):
+        if fnmatch.fnmatch(rel_path, pattern):
+            return True
+        return pattern.startswith("**/") and fnmatch.fnmatch(rel_path, pattern[3:])
+
+    if include and not any(match(p) for p in include):
+        return False
+    return not any(match(p) for p in exclude)
+
+
+def parse_preset_ids(value):
+    """Accepts '3', 3, '5,4,3' or ['5', '4', '3'] and returns a list of id strings."""
+    if isinstance(value, (list, tuple)):
+        ids = [str(v).strip() for v in value]
+    else:
+        ids = [v.strip() for v in str(value).split(",")]
+    ids = [v for v in ids if v]
+    if not ids:
+        raise JobFileError("no preset given")
+    return ids
+
+
+def make_job(raw, base_dir=".", index=0):
+    """
+    Validates one job entry and fills in defaults.
+
+    Raises:
+        JobFileError: For unknown keys, unknown presets or missing folders.
+    """
+    label = raw.get("name") or f"job {index + 1}"
+    unknown = set(raw) - JOB_KEYS
+    if unknown:
+        raise JobFileError(f"{label}: unknown keys {', '.join(sorted(unknown))}")
+    for key in ("preset", "source", "dest"):
+        if key not in raw:
+            raise JobFileError(f"{label}: missing '{key}'")
+
+    preset_ids = parse_preset_ids(raw["preset"])
+    for preset_id in preset_ids:
+        if preset_id not in PRESETS:
+            raise JobFileError(f"{label}: unknown preset '{preset_id}'")
+    suffixes = [rendition_suffix(pid, PRESETS[pid]) for pid in preset_ids]
+    if len(set(suffixes)) != len(suffixes):
+        raise JobFileError(f"{label}: two presets would write the same output name")
+    if len(preset_ids) > 1 and raw.get("quality_target") is not None:
+        raise JobFileError(f"{label}: quality_target needs a single preset")
+
+    source = _resolve(raw["source"], base_dir)
+    sources = expand_sources(source)
+    if not sources:
+        raise JobFileError(f"{label}: source not found: {source}")
+
+    metric = raw.get("quality_metric", "ssim")
+    if metric not in QUALITY_METRICS:
+        raise JobFileError(f"{label}: unknown quality_metric '{metric}'")
+
+    include = raw.get("include", [])
+    exclude = raw.get("exclude", [])
+    return {
+        "name": label,
+        "preset": ",".join(preset_ids),
+        "presets": preset_ids,
+        "sources": sources,
+        "dest": _resolve(raw["dest"], base_dir),
+        "include": [include] if isinstance(include, str) else list(include),
+        "exclude": [exclude] if isinstance(exclude, str) else list(exclude),
+        "extensions": _normalize_extensions(raw.get("extensions", VIDEO_EXTENSIONS)),
+        "recursive": bool(raw.get("recursive", True)),
+        "passthrough": bool(raw.get("passthrough", True)),
+        "hw_pipeline": bool(raw.get("hw_pipeline", True)),
+        "slide_detection": bool(raw.get("slide_detection", True)),
+        "chunk_threshold": raw.get("chunk_threshold"),
+        "quality_target": raw.get("quality_target"),
+        "quality_metric": metric,
+    }
+
+
+def parse_spec(data, base_dir="."):
+    """
+    Validates a decoded job file.
+
+    Returns:
+        dict: {"workers": int|None, "summary": str|None, "jobs": [job, ...]}
+    """
+    if not isinstance(data, dict):
+        raise JobFileError("job file must contain a table/object at the top level")
+    unknown = set(data) - TOP_LEVEL_KEYS
+    if unknown:
+        raise JobFileError(f"unknown top-level keys {', '.join(sorted(unknown))}")
+
+    entries = data.get("jobs") or []
+    if not entries:
+        raise JobFileError("job file lists no jobs")
+    defaults = data.get("defaults", {})
+
+    workers = data.get("workers")
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        raise JobFileError("'workers' must be a positive integer")
+
+    summary = data.get("summary")
+    return {
+        "workers": workers,
+        "summary": _resolve(summary, base_dir) if summary and summary != "-" else summary,
+        "jobs": [make_job({**defaults, **raw}, base_dir, i) for i, raw in enumerate(entries)],
+    }
+
+
+def load_job_file(path):
+    """Reads a .toml or .json job file (see module docstring)."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    try:
+        data = read_data_file(path)
+    except OSError as e:
+        raise JobFileError(f"cannot read job file: {e}") from e
+    except ValueError as e:
+        # json.JSONDecodeError and tomllib.TOMLDecodeError are both ValueErrors.
+        raise JobFileError(f"cannot parse job file: {e}") from e
+    return parse_spec(data, base_dir)
+
+
+def job_preset(job, preset_id=None):
+    """
+    Returns a copy of the job's preset (or of `preset_id`, one of its
+    renditions) with its per-job overrides applied.
+    """
+    preset = PRESETS[preset_id or job["presets"][0]]
+    if not job["passthrough"]:
+        preset = {**preset, "passthrough": None}
+    if not job["hw_pipeline"]:
+        preset = {**preset, "hw_pipeline": False}
+    if not job.get("slide_detection", True):
+        preset = {**preset, "slide_detection": False}
+    if job["chunk_threshold"] is not None:
+        preset = {**preset, "chunk_threshold": job["chunk_threshold"]}
+    if job["quality_target"] is not None:
+        preset = {
+            **preset,
+            "quality_search": {"target": job["quality_target"], "metric": job["quality_metric"]},
+        }
+    return preset
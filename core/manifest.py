@@ -0,0 +1,139 @@
+"""
+Persistent job manifest used to skip files that were already compressed.
+
+The manifest is an append-only JSONL file stored in the output folder. Each
+line describes one finished output: the source size, mtime and content
+fingerprint, plus the preset and encoder that produced it. The last line for
+a given output wins, so a resumed or repeated run only re-encodes files whose
+source or settings changed.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+MANIFEST_NAME = ".mvc_manifest.jsonl"
+
+# Bytes hashed from the start and the end of a file for the fingerprint.
+FINGERPRINT_BLOCK = 1024 * 1024
+
+
+def fingerprint(path, block_size=FINGERPRINT_BLOCK):
+    """
+    Returns a fast content fingerprint of a file.
+
+    Hashes the file size together with the first and last `block_size` bytes,
+    which is enough to notice re-recorded or replaced sources without reading
+    multi-GB files end to end.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+
+    with open(path, "rb") as f:
+        digest.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            digest.update(f.read(block_size))
+
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    In-memory view of the manifest file, keyed by output path.
+
+    Lookups are dictionary hits, so deciding whether a file can be skipped
+    costs one `stat` of the source and never starts ffmpeg.
+    """
+
+    def __init__(self, folder, name=MANIFEST_NAME):
+        self.path = os.path.join(folder, name)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _key(self, output_path):
+        return os.path.normcase(os.path.abspath(output_path))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        lines = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash; the job simply reruns.
+                    continue
+                lines += 1
+                self.entries[self._key(entry["output"])] = entry
+
+        if lines > 2 * max(len(self.entries), 1):
+            self.compact()
+
+    def compact(self):
+        """Rewrites the manifest keeping only the latest entry per output."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for entry in self.entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, self.path)
+
+    def is_current(self, input_path, output_path, preset_id, encoder):
+        """
+        Returns True if `output_path` was produced from the unchanged
+        `input_path` with the same preset and encoder. `encoder=None` accepts
+        any encoder (the distributed coordinator doesn't know which one a
+        worker will use).
+
+        Size and mtime are compared first. The fingerprint is only computed
+        when the size matches but the mtime moved (e.g. a copy or `touch`).
+        """
+        entry = self.entries.get(self._key(output_path))
+        if not entry:
+            return False
+        if entry["preset"] != preset_id or encoder not in (None, entry["encoder"]):
+            return False
+        if not os.path.exists(output_path):
+            return False
+
+        try:
+            st = os.stat(input_path)
+        except OSError:
+            return False
+
+        if st.st_size != entry["size"]:
+            return False
+        if st.st_mtime_ns == entry["mtime_ns"]:
+            return True
+
+        return fingerprint(input_path) == entry["fingerprint"]
+
+    def record(self, input_path, output_path, preset_id, encoder):
+        """Appends a finished output to the manifest and flushes it to disk."""
+        st = os.stat(input_path)
+        entry = {
+            "output": os.path.abspath(output_path),
+            "source": os.path.abspath(input_path),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "fingerprint": fingerprint(input_path),
+            "preset": preset_id,
+            "encoder": encoder,
+        }
+
+        with self._lock:
+            self.entries[self._key(output_path)] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        return entry
@@ -0,0 +1,310 @@
+"""
+Per-job metrics and their export.
+
+Every task the pipeline runs gets a JobMetrics record that the worker
+function fills in: time spent waiting for a worker and a CPU/GPU slot,
+probing, analysis (slide detection, quality search) and encoding, CPU
+user/system time and peak RSS of the ffmpeg children (from os.wait4), input
+and output bytes, the encoder and the exit status.
+
+A MetricsRecorder appends the finished records to a JSONL file and keeps
+per-preset and per-encoder totals. The totals can be exported in the
+Prometheus text format, either rewritten as a file after every job (for
+node_exporter's textfile collector) or served over HTTP at /metrics, and
+summary() turns them into throughput (MB/s) and realtime factors.
+"""
+
+import http.server
+import json
+import os
+import sys
+import threading
+import time
+
+METRICS_NAME = ".mvc_metrics.jsonl"
+
+# Default bind address of the /metrics endpoint.
+LOCALHOST = "127.0.0.1"
+
+# Statuses a record can end with.
+OK = "ok"
+KEPT_ORIGINAL = "kept_original"
+FAILED = "failed"
+RETRY = "retry"
+ERROR = "error"
+
+# Totals kept per (preset, encoder): record field -> Prometheus metric.
+COUNTERS = {
+    "input_bytes": ("mvc_input_bytes_total", "Input bytes of finished jobs."),
+    "output_bytes": ("mvc_output_bytes_total", "Output bytes of finished jobs."),
+    "duration": ("mvc_media_seconds_total", "Media duration of finished jobs."),
+    "encode_seconds": ("mvc_encode_seconds_total", "Wall time spent encoding."),
+    "queue_wait": ("mvc_queue_wait_seconds_total", "Time jobs waited for a worker and slot."),
+    "probe_seconds": ("mvc_probe_seconds_total", "Time spent probing inputs."),
+    "analysis_seconds": ("mvc_analysis_seconds_total", "Time spent in per-file analysis."),
+    "cpu_user": ("mvc_cpu_user_seconds_total", "User CPU time of the ffmpeg children."),
+    "cpu_system": ("mvc_cpu_system_seconds_total", "System CPU time of the ffmpeg children."),
+}
+
+
+def usage_fields(rusage):
+    """CPU time and peak RSS (KiB) of a reaped child, from os.wait4()."""
+    rss = rusage.ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024  # bytes there, KiB everywhere else
+    return {"cpu_user": rusage.ru_utime, "cpu_system": rusage.ru_stime, "peak_rss_kb": rss}
+
+
+class JobMetrics:
+    """
+    Measurements of one task. Created when a worker picks the task up;
+    `queued_at` (time.monotonic()) is when it entered the pipeline queue.
+    """
+
+    def __init__(self, task, queued_at=None):
+        input_path, _, filename, preset, _ = task
+        now = time.monotonic()
+        self.record = {
+            "file": filename,
+            "input": input_path,
+            "preset": preset["name"],
+            "encoder": None,
+            "mode": None,
+            "status": None,
+            "exit_code": None,
+            "queue_wait": now - queued_at if queued_at is not None else 0.0,
+            "probe_seconds": 0.0,
+            "analysis_seconds": 0.0,
+            "encode_seconds": 0.0,
+            "cpu_user": 0.0,
+            "cpu_system": 0.0,
+            "peak_rss_kb": None,
+            "input_bytes": None,
+            "output_bytes": None,
+            "duration": None,
+        }
+        self._lock = threading.Lock()
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def add(self, key, seconds):
+        with self._lock:
+            self.record[key] += seconds
+
+    def timed(self, key):
+        """Context manager adding the time spent inside it to `key`."""
+        return _Timed(self, key)
+
+    def add_usage(self, usage):
+        """Folds in one ffmpeg child's usage (see usage_fields()); chunks run several."""
+        with self._lock:
+            self.record["cpu_user"] += usage["cpu_user"]
+            self.record["cpu_system"] += usage["cpu_system"]
+            peak = self.record["peak_rss_kb"] or 0
+            self.record["peak_rss_kb"] = max(peak, usage["peak_rss_kb"])
+
+
+class _Timed:
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add(self.key, time.monotonic() - self.started)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class MetricsRecorder:
+    """
+    Collects finished JobMetrics.
+
+    Parameters:
+        path (str): JSONL file the records are appended to (None: not written).
+        prometheus (str): Optional Prometheus export: a port number (or
+            "host:port"; without a host only 127.0.0.1 is bound) to serve
+            /metrics on, or a file path rewritten after every job.
+    """
+
+    def __init__(self, path=None, prometheus=None):
+        self.path = path
+        self.textfile = None
+        self.server = None
+        self.totals = {}
+        self.jobs = {}
+        self.peak_rss = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if prometheus:
+            host, _, port = prometheus.rpartition(":")
+            if port.isdigit():
+                self.server = serve(self, int(port), host or LOCALHOST)
+            else:
+                self.textfile = prometheus
+
+    def record(self, job):
+        """Stores one finished job. A record without a status ended in an exception."""
+        record = dict(job.record)
+        record["status"] = record["status"] or ERROR
+        for key in COUNTERS:
+            if isinstance(record[key], float):
+                record[key] = round(record[key], 3)
+        encoder = record["encoder"] or "none"
+
+        with self._lock:
+            status_key = (record["preset"], encoder, record["status"])
+            self.jobs[status_key] = self.jobs.get(status_key, 0) + 1
+            if record["status"] in (OK, KEPT_ORIGINAL):
+                totals = self.totals.setdefault(
+                    (record["preset"], encoder), dict.fromkeys(COUNTERS, 0.0)
+                )
+                for key in COUNTERS:
+                    totals[key] += record[key] or 0
+            if record["peak_rss_kb"]:
+                key = (record["preset"], encoder)
+                self.peak_rss[key] = max(self.peak_rss.get(key, 0), record["peak_rss_kb"])
+            if self.path:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps({"ts": round(time.time(), 3), **record}) + "\n")
+                except OSError:
+                    pass
+        if self.textfile:
+            self._write_textfile()
+        return record
+
+    def prometheus_text(self):
+        """All totals in the Prometheus text exposition format."""
+        with self._lock:
+            lines = [
+                "# HELP mvc_jobs_total Jobs finished, by status.",
+                "# TYPE mvc_jobs_total counter",
+            ]
+            for (preset, encoder, status), count in sorted(self.jobs.items()):
+                labels = _labels(preset=preset, encoder=encoder, status=status)
+                lines.append(f"mvc_jobs_total{labels} {count}")
+            for key, (name, help_text) in COUNTERS.items():
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (preset, encoder), totals in sorted(self.totals.items()):
+                    labels = _labels(preset=preset, encoder=encoder)
+                    lines.append(f"{name}{labels} {totals[key]:.6g}")
+            lines += [
+                "# HELP mvc_peak_rss_bytes Largest peak RSS of one ffmpeg child.",
+                "# TYPE mvc_peak_rss_bytes gauge",
+            ]
+            for (preset, encoder), kb in sorted(self.peak_rss.items()):
+                labels = _labels(preset=preset, encoder=encoder)
+                lines.append(f"mvc_peak_rss_bytes{labels} {kb * 1024}")
+        return "\n".join(lines) + "\n"
+
+    def _write_textfile(self):
+        # Written whole and renamed, so a collector never reads half a file.
+        with self._write_lock:
+            try:
+                tmp_path = self.textfile + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(self.prometheus_text())
+                os.replace(tmp_path, self.textfile)
+            except OSError:
+                pass
+
+    def summary(self):
+        """
+        Throughput of the successful jobs.
+
+        Returns:
+            dict: {"presets": {...}, "encoders": {...}}, each entry with jobs,
+            input_bytes, output_bytes, encode_seconds, cpu_seconds,
+            mb_per_s (input MB per encode second) and realtime (media
+            seconds per encode second).
+        """
+        with self._lock:
+            totals = {k: dict(v) for k, v in self.totals.items()}
+            jobs = dict(self.jobs)
+        groups = {"presets": {}, "encoders": {}}
+        for (preset, encoder), values in totals.items():
+            count = sum(jobs.get((preset, encoder, s), 0) for s in (OK, KEPT_ORIGINAL))
+            for group, name in (("presets", preset), ("encoders", encoder)):
+                entry = groups[group].setdefault(name, {"jobs": 0, **dict.fromkeys(COUNTERS, 0.0)})
+                entry["jobs"] += count
+                for key in COUNTERS:
+                    entry[key] += values[key]
+
+        summary = {}
+        for group, entries in groups.items():
+            summary[group] = {}
+            for name, entry in sorted(entries.items()):
+                seconds = entry["encode_seconds"]
+                summary[group][name] = {
+                    "jobs": entry["jobs"],
+                    "input_bytes": int(entry["input_bytes"]),
+                    "output_bytes": int(entry["output_bytes"]),
+                    "encode_seconds": round(seconds, 3),
+                    "cpu_seconds": round(entry["cpu_user"] + entry["cpu_system"], 3),
+                    "mb_per_s": round(entry["input_bytes"] / 1e6 / seconds, 3) if seconds else None,
+                    "realtime": round(entry["duration"] / seconds, 3) if seconds else None,
+                }
+        return summary
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+def serve(recorder, port, host=LOCALHOST):
+    """
+    Serves `recorder.prometheus_text()` at http://host:port/metrics from a daemon thread.
+
+    The default host keeps file names and host stats off the network; pass
+    "0.0.0.0" (or an interface address) to let other machines scrape.
+    """
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = recorder.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # keeps scrapes out of the progress display
+
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def format_summary(summary):
+    """Lines for the end-of-run report, one per preset and per encoder."""
+    lines = []
+    for group, label in (("presets", "Preset"), ("encoders", "Encoder")):
+        for name, entry in summary[group].items():
+            speed = []
+            if entry["mb_per_s"] is not None:
+                speed.append(f"{entry['mb_per_s']:.2f} MB/s")
+            if entry["realtime"] is not None:
+                speed.append(f"{entry['realtime']:.2f}x realtime")
+            lines.append(
+                f"📊 {label} {name}: {entry['jobs']} job(s), "
+                f"{', '.join(speed) or 'no encode time'}, CPU {entry['cpu_seconds']:.0f}s"
+            )
+    return lines
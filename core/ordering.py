@@ -0,0 +1,159 @@
+"""
+Job ordering to cut batch makespan.
+
+Jobs are submitted longest-processing-time (LPT) first: a 4-hour lecture that
+lands last in `os.listdir` order would otherwise keep one worker busy long
+after the others went idle. Costs are estimated from each file's duration and
+resolution, scaled by the preset's encode speed. Once a preset/encoder pair
+has been measured on this machine, the measured speed replaces the estimate.
+"""
+
+import heapq
+import json
+import os
+import threading
+
+from config.settings import CACHE_DIR
+from core.passthrough import passthrough_mode
+from core.probe import probe_media
+from core.processor import resolve_encoder
+
+HISTORY_FILE = "throughput.json"
+
+# Costs are normalised to 1080p; a 4K file costs ~4x, a 720p file ~0.44x.
+REFERENCE_PIXELS = 1920 * 1080
+
+# Assumed source bitrate when a file could not be probed (5 Mbit/s).
+FALLBACK_BYTES_PER_SECOND = 5_000_000 / 8
+
+# Rough throughput of a stream copy (remux), which is bound by disk I/O.
+COPY_BYTES_PER_SECOND = 100 * 1024 * 1024
+
+# Weight of the newest measurement in the moving average.
+HISTORY_ALPHA = 0.3
+
+
+def pixel_ratio(info):
+    """Returns the frame area of a probed file relative to 1080p (1.0 if unknown)."""
+    video = info.get("video") if info else None
+    if not video or not video.get("width") or not video.get("height"):
+        return 1.0
+    return video["width"] * video["height"] / REFERENCE_PIXELS
+
+
+def media_duration(info, size):
+    """Returns the probed duration, or a guess from the file size."""
+    if info and info.get("duration"):
+        return info["duration"]
+    return size / FALLBACK_BYTES_PER_SECOND
+
+
+class ThroughputHistory:
+    """
+    Measured encode speeds per (preset, encoder), persisted in the cache folder.
+
+    Speeds are stored as "x realtime at 1080p", so files of any resolution
+    contribute to the same average.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, HISTORY_FILE)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.speeds = json.load(f)
+        except (OSError, ValueError):
+            self.speeds = {}
+
+    @staticmethod
+    def _key(preset, encoder):
+        return f"{preset['name']}|{encoder}"
+
+    def speed(self, preset, encoder):
+        entry = self.speeds.get(self._key(preset, encoder))
+        return entry["speed"] if entry else None
+
+    def record(self, preset, encoder, info, size, wall):
+        """Folds one finished job into the moving average and saves the history."""
+        if wall <= 0:
+            return
+        measured = media_duration(info, size) * pixel_ratio(info) / wall
+        key = self._key(preset, encoder)
+
+        with self._lock:
+            entry = self.speeds.get(key)
+            if entry:
+                speed = (1 - HISTORY_ALPHA) * entry["speed"] + HISTORY_ALPHA * measured
+                self.speeds[key] = {"speed": speed, "samples": entry["samples"] + 1}
+            else:
+                self.speeds[key] = {"speed": measured, "samples": 1}
+            self._save()
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.speeds, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+def estimate_cost(info, size, preset, encoder, use_gpu, history=None):
+    """
+    Estimates the wall time (seconds) to encode one file.
+
+    Uses the measured speed for (preset, encoder) if known, otherwise the
+    preset's `est_speed` hint for the engine in use.
+    """
+    speed = history.speed(preset, encoder) if history else None
+    if not speed:
+        hints = preset.get("est_speed", {})
+        speed = hints.get("gpu" if use_gpu else "cpu") or hints.get("cpu") or 1.0
+
+    return media_duration(info, size) * pixel_ratio(info) / speed
+
+
+def task_cost(task, history=None):
+    """Probes a process_file() task's input (cached) and returns its estimated cost."""
+    input_path, _, _, preset, gpu_codec = task
+    use_gpu = bool(preset["use_gpu"] and gpu_codec)
+    encoder = resolve_encoder(preset, gpu_codec)
+    info = probe_media(input_path)
+    size = os.path.getsize(input_path)
+    if passthrough_mode(info, preset):
+        return size / COPY_BYTES_PER_SECOND
+    return estimate_cost(info, size, preset, encoder, use_gpu, history)
+
+
+class PriorityFeed:
+    """
+    Thread-safe queue that always hands out the most expensive pending task.
+
+    Used when tasks arrive over time (streaming discovery, watch folders): each
+    worker picks the largest job discovered so far instead of the oldest one.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def push(self, item, cost):
+        with self._lock:
+            # The counter keeps equal costs in arrival order and avoids comparing items.
+            heapq.heappush(self._heap, (-cost, self._counter, item))
+            self._counter += 1
+
+    def pop(self):
+        with self._lock:
+            return heapq.heappop(self._heap)[2]
+
+    def peek(self, n):
+        """The next `n` items pop() would hand out, without removing them."""
+        with self._lock:
+            return [entry[2] for entry in heapq.nsmallest(n, self._heap)]
+
+    def __len__(self):
+        return len(self._heap)
@@ -0,0 +1,108 @@
+"""
+Stream-copy fast path for inputs that already meet a preset's target.
+
+Each preset may define a `passthrough` dict of acceptance criteria. If the
+probed source satisfies the video criteria, the video stream is copied
+instead of decoded and re-encoded; if the audio also satisfies its criteria,
+the whole file is remuxed with `-c copy`.
+
+Supported criteria keys:
+    video_codecs, pix_fmts, max_width, max_height, max_video_kbps,
+    audio_codecs, max_audio_kbps, max_channels
+"""
+
+CRITERIA_KEYS = (
+    "video_codecs",
+    "pix_fmts",
+    "max_width",
+    "max_height",
+    "max_video_kbps",
+    "audio_codecs",
+    "max_audio_kbps",
+    "max_channels",
+)
+
+COPY_ALL = "copy"
+COPY_VIDEO = "video"
+
+_CHANNELS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "5.0": 5, "5.1": 6, "7.1": 8}
+
+
+def _within(value, limit):
+    """A missing limit always passes; a missing value never passes a limit."""
+    if limit is None:
+        return True
+    return value is not None and value <= limit
+
+
+def channel_count(layout):
+    """Converts an ffmpeg channel layout ('mono', '5.1(side)', '2 channels') to a count."""
+    if not layout:
+        return None
+    layout = layout.split("(")[0].strip()
+    if layout in _CHANNELS:
+        return _CHANNELS[layout]
+    first = layout.split()[0]
+    return int(first) if first.isdigit() else None
+
+
+def video_bitrate(info):
+    """
+    Returns the video bitrate in kb/s.
+
+    Some containers (e.g. Matroska) only report the overall bitrate, in which
+    case the audio bitrate (if known) is subtracted from it.
+    """
+    video = info.get("video") or {}
+    if video.get("bitrate_kbps"):
+        return video["bitrate_kbps"]
+    if not info.get("bitrate_kbps"):
+        return None
+    audio = info.get("audio") or {}
+    return info["bitrate_kbps"] - (audio.get("bitrate_kbps") or 0)
+
+
+def video_compliant(info, criteria):
+    video = info.get("video")
+    if not video:
+        return False
+    if video.get("codec") not in criteria.get("video_codecs", ()):
+        return False
+    if "pix_fmts" in criteria and video.get("pix_fmt") not in criteria["pix_fmts"]:
+        return False
+
+    return (
+        _within(video.get("width"), criteria.get("max_width"))
+        and _within(video.get("height"), criteria.get("max_height"))
+        and _within(video_bitrate(info), criteria.get("max_video_kbps"))
+    )
+
+
+def audio_compliant(audio, criteria):
+    if not audio:
+        # Nothing to transcode.
+        return True
+    if audio.get("codec") not in criteria.get("audio_codecs", ()):
+        return False
+
+    return _within(audio.get("bitrate_kbps"), criteria.get("max_audio_kbps")) and _within(
+        channel_count(audio.get("channels")), criteria.get("max_channels")
+    )
+
+
+def passthrough_mode(info, preset):
+    """
+    Decides how much of a source can be stream-copied under `preset`.
+
+    Returns:
+        str|None: COPY_ALL (remux everything), COPY_VIDEO (copy video,
+                  transcode audio) or None (full re-encode).
+    """
+    criteria = preset.get("passthrough")
+    if not criteria or not info:
+        return None
+    if not video_compliant(info, criteria):
+        return None
+    if audio_compliant(info.get("audio"), criteria):
+        return COPY_ALL
+    return COPY_VIDEO
@@ -0,0 +1,201 @@
+"""
+Streaming job pipeline: probe -> prioritise -> encode.
+
+Tasks can be submitted while discovery is still running. Each one is probed
+on a small probe pool, pushed into a PriorityFeed by estimated cost, and a
+worker slot is queued for it on the encode pool. When a worker starts it takes
+the most expensive task pending at that moment, so large files still go first
+without waiting for the whole tree to be listed.
+
+A GPU encode that fails for a hardware reason (see core.failures) is queued
+again: after a backoff on the GPU if every session was busy, otherwise (or
+once the GPU retries run out) on the CPU encoder.
+
+With a Stager (see core.staging), the inputs of the next few tasks in the
+feed are prefetched to local scratch while the current ones encode, and a
+task counts as done once its output has been uploaded.
+"""
+
+import concurrent.futures
+import os
+import threading
+import time
+
+from tqdm import tqdm
+
+from config.settings import GPU_RETRY_LIMIT
+from core.failures import GPU_BUSY, GpuFailure, backoff_delay
+from core.metrics import JobMetrics
+from core.ordering import PriorityFeed, task_cost
+from core.processor import process_file
+from core.renditions import process_renditions
+from core.runner import cancelled
+
+PROBE_WORKERS = 8
+
+# Tasks beyond the running ones whose inputs are prefetched.
+PREFETCH_AHEAD = 4
+
+
+class Pipeline:
+    """
+    Runs process_file() tasks (process_renditions() for multi-rendition
+    tasks) on a shared worker pool as they are submitted.
+
+    Parameters:
+        workers (int): Size of the encode pool.
+        scheduler (ResourceScheduler): CPU/GPU budget shared by all jobs.
+        progress (BatchProgress): Optional live progress display.
+        history (ThroughputHistory): Optional measured speeds for ordering.
+        metrics (MetricsRecorder): Optional collector for per-job metrics;
+            every attempt of a task is recorded, retries included.
+        stager (Stager): Optional local scratch staging for inputs and outputs.
+        claims (Claims): The claims of a queue worker (see core.jobqueue).
+    """
+
+    def __init__(
+        self,
+        workers,
+        scheduler=None,
+        progress=None,
+        history=None,
+        metrics=None,
+        stager=None,
+        claims=None,
+    ):
+        self.scheduler = scheduler
+        self.progress = progress
+        self.history = history
+        self.metrics = metrics
+        self.stager = stager
+        self.claims = claims
+        self.feed = PriorityFeed()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._outstanding = 0
+        self._gpu_attempts = {}
+        self._probe_pool = concurrent.futures.ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, task, on_done=None):
+        """
+        Queues a task. `on_done(task, ok)` is called from the worker thread
+        once it finishes, successfully or not (e.g. to record it in the manifest).
+        """
+        with self._lock:
+            self.submitted += 1
+            self._outstanding += 1
+        if self.progress:
+            self.progress.add_total(os.path.getsize(task[0]))
+        self._probe_pool.submit(self._enqueue, task, on_done)
+
+    def _enqueue(self, task, on_done):
+        try:
+            cost = task_cost(task, self.history)
+        except Exception:
+            # Still queue it: process_file() reports the actual problem, and
+            # close() waits for every submitted task to come through here.
+            cost = 0.0
+        self.feed.push((task, on_done, time.monotonic()), cost)
+        self._prefetch()
+        self._pool.submit(self._run_next)
+
+    def _prefetch(self):
+        if self.stager:
+            for task, _, _ in self.feed.peek(PREFETCH_AHEAD):
+                self.stager.prefetch(task[0])
+
+    def _run_next(self):
+        task, on_done, queued_at = self.feed.pop()
+        self._prefetch()
+        if cancelled():
+            # Interrupted: leave the file for the next run instead of recording a failure.
+            if self.stager:
+                self.stager.release(task[0])
+            with self._lock:
+                self._outstanding -= 1
+                self._idle.notify_all()
+            return None
+        ok = False
+        job = JobMetrics(task, queued_at) if self.metrics else None
+        try:
+            worker = process_renditions if task[3].get("renditions") else process_file
+            ok = worker(
+                task, self.scheduler, self.progress, self.history, job, self.stager, self.claims
+            )
+        except GpuFailure as e:
+            if not cancelled():
+                if job:
+                    self.metrics.record(job)
+                self._retry(task, on_done, e)
+                return None
+            tqdm.write(f"✘ FAILED: {task[2]} -> {e}")
+        except Exception as e:
+            tqdm.write(f"✘ FAILED: {task[2]} -> {e}")
+        if isinstance(ok, concurrent.futures.Future):
+            # Still uploading: the worker is free for the next encode meanwhile.
+            ok.add_done_callback(lambda upload: self._finish(task, on_done, upload, job))
+            return None
+        return self._finish(task, on_done, ok, job)
+
+    def _finish(self, task, on_done, ok, job):
+        if isinstance(ok, concurrent.futures.Future):
+            try:
+                ok = ok.result()
+            except Exception as e:
+                tqdm.write(f"✘ FAILED: {task[2]} -> {e}")
+                ok = False
+        if job:
+            self.metrics.record(job)
+        if on_done:
+            try:
+                on_done(task, ok)
+            except Exception as e:
+                tqdm.write(f"✘ FAILED: {task[2]} -> {e}")
+                ok = False
+
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            self._outstanding -= 1
+            self._idle.notify_all()
+        return ok
+
+    def _retry(self, task, on_done, failure):
+        """Queues a failed GPU task again, on the GPU after a backoff or on the CPU."""
+        with self._lock:
+            attempt = self._gpu_attempts.get(task[1], 0)
+            self._gpu_attempts[task[1]] = attempt + 1
+
+        if failure.kind == GPU_BUSY and attempt < GPU_RETRY_LIMIT:
+            delay = backoff_delay(attempt)
+            tqdm.write(
+                f"⏳ GPU BUSY: {task[2]} -> retrying in {delay:.0f}s "
+                f"({attempt + 1}/{GPU_RETRY_LIMIT})"
+            )
+            timer = threading.Timer(delay, self._enqueue, (task, on_done))
+            timer.daemon = True
+            timer.start()
+            return
+
+        tqdm.write(f"↻ RETRYING ON CPU: {task[2]} -> {failure}")
+        self._enqueue((*task[:4], None), on_done)
+
+    def close(self):
+        """Waits for every submitted task to finish and shuts the pools down."""
+        with self._idle:
+            # Retries re-enter the pools, so they must stay open until all tasks are done.
+            self._idle.wait_for(lambda: self._outstanding == 0)
+        self._probe_pool.shutdown(wait=True)
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
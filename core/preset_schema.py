@@ -0,0 +1,289 @@
+"""
+Preset schema, validation and compilation.
+
+A preset is a dict. Encoder arguments can be given either as raw ffmpeg argv
+fragments or as structured fields that compile to the same fragments:
+
+    video_params       argv applied to every video encode (filters, pixel
+                       format), or the whole encoder setup of a CPU-only preset
+    cpu_fallback       argv for the CPU encoder (libx264/libx265)
+    gpu_quality_flags  {encoder: argv} for each hardware encoder
+    audio_params       argv for the audio stream
+
+    video   {codec, preset, tune, profile, rc, crf, qp, global_quality, q,
+             bitrate, maxrate, bufsize, gop, pix_fmt, extra}  -> cpu_fallback
+    gpu     {encoder: same fields as video, without codec}    -> gpu_quality_flags
+    scale   {width, height}  and/or  filters [str, ...]       -> video_params
+    audio   {codec, bitrate, channels, sample_rate, extra}    -> audio_params
+
+    suffix       output name suffix in multi-rendition jobs (see core.renditions)
+    slide_detection  true to analyse sources for static slides (see
+                 core.slides); skipped in multi-rendition jobs
+    hw_pipeline  true to decode, filter and encode on the GPU when the machine
+                 supports it (see core.hardware.HW_BACKENDS)
+
+validate_preset() checks types and required keys and stores the merged video
+argv for each encoder under `compiled`, so jobs don't re-merge lists.
+"""
+
+import os
+
+from core.datafile import read_data_file
+from core.hardware import hw_video_args
+from core.passthrough import CRITERIA_KEYS
+
+
+class PresetError(ValueError):
+    """Raised for presets that don't match the schema."""
+
+
+ARGV_KEYS = ("video_params", "cpu_fallback", "audio_params")
+STRUCTURED_KEYS = ("video", "gpu", "scale", "filters", "audio")
+SCALAR_KEYS = {
+    "name": str,
+    "description": str,
+    "use_gpu": bool,
+    "max_size_ratio": (int, float),
+    "chunk_threshold": int,
+    "hw_pipeline": bool,
+    "slide_detection": bool,
+    "suffix": str,
+}
+OTHER_KEYS = (
+    "gpu_quality_flags",
+    "est_speed",
+    "passthrough",
+    "quality_search",
+    "hw_backend",
+    "slides",
+    "compiled",
+)
+KNOWN_KEYS = set(SCALAR_KEYS) | set(ARGV_KEYS) | set(STRUCTURED_KEYS) | set(OTHER_KEYS)
+
+# Structured field -> ffmpeg option, in output order.
+VIDEO_FIELDS = (
+    ("codec", "-c:v"),
+    ("preset", "-preset"),
+    ("tune", "-tune"),
+    ("profile", "-profile:v"),
+    ("rc", "-rc"),
+    ("crf", "-crf"),
+    ("qp", "-qp"),
+    ("global_quality", "-global_quality"),
+    ("q", "-q"),
+    ("bitrate", "-b:v"),
+    ("maxrate", "-maxrate"),
+    ("bufsize", "-bufsize"),
+    ("gop", "-g"),
+    ("pix_fmt", "-pix_fmt"),
+)
+AUDIO_FIELDS = (
+    ("codec", "-c:a"),
+    ("bitrate", "-b:a"),
+    ("channels", "-ac"),
+    ("sample_rate", "-ar"),
+)
+
+CPU = "cpu"
+
+
+def _compile_fields(fields, spec, where, allow=None):
+    allowed = {name for name, _ in fields} | {"extra"}
+    if allow is not None:
+        allowed &= allow
+    if not isinstance(spec, dict):
+        raise PresetError(f"{where}: expected a table")
+    unknown = set(spec) - allowed
+    if unknown:
+        raise PresetError(f"{where}: unknown fields {', '.join(sorted(unknown))}")
+
+    argv = []
+    for name, flag in fields:
+        if name in spec:
+            argv.extend([flag, str(spec[name])])
+    argv.extend(_argv(spec.get("extra", []), f"{where}.extra"))
+    return argv
+
+
+def _argv(value, where):
+    if not isinstance(value, list) or not all(isinstance(v, (str, int, float)) for v in value):
+        raise PresetError(f"{where}: expected a list of ffmpeg arguments")
+    return [str(v) for v in value]
+
+
+def compile_video(spec, where="video"):
+    return _compile_fields(VIDEO_FIELDS, spec, where)
+
+
+def compile_gpu(spec, where="gpu"):
+    allow = {name for name, _ in VIDEO_FIELDS if name != "codec"} | {"extra"}
+    return _compile_fields(VIDEO_FIELDS, spec, where, allow)
+
+
+def compile_audio(spec, where="audio"):
+    return _compile_fields(AUDIO_FIELDS, spec, where)
+
+
+def compile_filters(scale=None, filters=None):
+    """Returns ['-vf', '<chain>'] for a scale spec and/or a list of filters."""
+    chain = []
+    if scale:
+        if not isinstance(scale, dict) or not set(scale) <= {"width", "height"}:
+            raise PresetError("scale: expected {width, height}")
+        width, height = scale.get("width", -2), scale.get("height", -2)
+        chain.append(f"scale={width}:{height}")
+    if filters:
+        chain.extend(_argv(filters, "filters"))
+    return ["-vf", ",".join(chain)] if chain else []
+
+
+def video_args(preset, gpu_codec=None, hw=None):
+    """
+    Returns the video encoder argv for `gpu_codec` (None = CPU path), without
+    the '-c:v <gpu encoder>' that build_command adds itself.
+
+    With `hw` (a core.hardware backend), returns the variant for frames that
+    stay in GPU memory, or None if the preset's filters can't run there.
+    """
+    key = gpu_codec or CPU
+    compiled = preset.get("compiled")
+    if compiled is None:
+        compiled = {}
+    if key not in compiled:
+        compiled[key] = _merge(preset, gpu_codec)
+    if not hw:
+        return compiled[key]
+
+    hw_key = f"{key}@{hw}"
+    if hw_key not in compiled:
+        compiled[hw_key] = hw_video_args(compiled[key], hw)
+    return compiled[hw_key]
+
+
+def _merge(preset, gpu_codec):
+    common = preset.get("video_params", [])
+    if gpu_codec:
+        return preset.get("gpu_quality_flags", {}).get(gpu_codec, []) + common
+    return preset.get("cpu_fallback", []) + common
+
+
+def compile_preset(preset):
+    """Caches the merged video argv of every encoder on the preset (in place)."""
+    compiled = {CPU: _merge(preset, None)}
+    for encoder in preset.get("gpu_quality_flags", {}):
+        compiled[encoder] = _merge(preset, encoder)
+    preset["compiled"] = compiled
+    return preset
+
+
+def validate_preset(preset_id, raw):
+    """
+    Checks one preset against the schema and compiles it.
+
+    Returns:
+        dict: A new preset dict with structured fields turned into argv lists.
+
+    Raises:
+        PresetError: Describing the first problem found.
+    """
+    where = f"preset {preset_id}"
+    if not isinstance(raw, dict):
+        raise PresetError(f"{where}: expected a table")
+    unknown = set(raw) - KNOWN_KEYS
+    if unknown:
+        raise PresetError(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+
+    preset = {k: v for k, v in raw.items() if k not in STRUCTURED_KEYS and k != "compiled"}
+
+    for key, kind in SCALAR_KEYS.items():
+        if key in preset and (
+            not isinstance(preset[key], kind)
+            or (kind is not bool and isinstance(preset[key], bool))
+        ):
+            raise PresetError(f"{where}: '{key}' has the wrong type")
+    for key in ("name", "description", "use_gpu"):
+        if key not in preset:
+            raise PresetError(f"{where}: missing '{key}'")
+
+    def structured(key, raw_key, compiled):
+        if raw_key in preset:
+            raise PresetError(f"{where}: give either '{key}' or '{raw_key}', not both")
+        preset[raw_key] = compiled
+
+    if "video" in raw:
+        structured("video", "cpu_fallback", compile_video(raw["video"], f"{where}: video"))
+    if "audio" in raw:
+        structured("audio", "audio_params", compile_audio(raw["audio"], f"{where}: audio"))
+    if "gpu" in raw:
+        if not isinstance(raw["gpu"], dict):
+            raise PresetError(f"{where}: gpu: expected a table of encoders")
+        structured(
+            "gpu",
+            "gpu_quality_flags",
+            {enc: compile_gpu(spec, f"{where}: gpu.{enc}") for enc, spec in raw["gpu"].items()},
+        )
+    if "scale" in raw or "filters" in raw:
+        structured(
+            "scale/filters", "video_params", compile_filters(raw.get("scale"), raw.get("filters"))
+        )
+
+    for key in ARGV_KEYS:
+        if key in preset:
+            preset[key] = _argv(preset[key], f"{where}: {key}")
+    if "audio_params" not in preset:
+        raise PresetError(f"{where}: missing 'audio_params' (or 'audio')")
+
+    flags = preset.get("gpu_quality_flags", {})
+    if not isinstance(flags, dict):
+        raise PresetError(f"{where}: gpu_quality_flags: expected a table of encoders")
+    preset["gpu_quality_flags"] = {
+        enc: _argv(argv, f"{where}: gpu_quality_flags.{enc}") for enc, argv in flags.items()
+    }
+
+    cpu_argv = preset.get("cpu_fallback", []) + preset.get("video_params", [])
+    if "-c:v" not in cpu_argv:
+        raise PresetError(f"{where}: no CPU encoder ('-c:v' in cpu_fallback or video_params)")
+    if preset["use_gpu"] and "-c:v" in preset.get("video_params", []):
+        # video_params is shared with the GPU encoders, so it can't pick the encoder.
+        raise PresetError(f"{where}: GPU presets must keep '-c:v' out of video_params")
+
+    speeds = preset.get("est_speed", {})
+    if not isinstance(speeds, dict) or not all(
+        k in (CPU, "gpu") and isinstance(v, (int, float)) and v > 0 for k, v in speeds.items()
+    ):
+        raise PresetError(f"{where}: est_speed must map 'cpu'/'gpu' to positive numbers")
+    suffix = preset.get("suffix")
+    if suffix is not None and (not suffix or any(c in suffix for c in "/\\:")):
+        raise PresetError(f"{where}: suffix must be a non-empty file name fragment")
+    if preset.get("max_size_ratio", 1) <= 0:
+        raise PresetError(f"{where}: max_size_ratio must be positive")
+
+    criteria = preset.get("passthrough")
+    if criteria is not None:
+        if not isinstance(criteria, dict) or set(criteria) - set(CRITERIA_KEYS):
+            raise PresetError(f"{where}: passthrough accepts {', '.join(CRITERIA_KEYS)}")
+
+    return compile_preset(preset)
+
+
+def validate_presets(presets):
+    """Validates and compiles a {preset_id: preset} mapping."""
+    if not isinstance(presets, dict):
+        raise PresetError("expected a table of presets")
+    return {str(pid): validate_preset(pid, raw) for pid, raw in presets.items()}
+
+
+def load_preset_file(path):
+    """
+    Reads user presets from a TOML/JSON file: either a `presets` table or
+    top-level tables keyed by preset id.
+    """
+    try:
+        data = read_data_file(path)
+    except OSError as e:
+        raise PresetError(f"cannot read preset file: {e}") from e
+    except ValueError as e:
+        raise PresetError(f"cannot parse preset file {os.path.basename(path)}: {e}") from e
+    if isinstance(data, dict) and isinstance(data.get("presets"), dict):
+        data = data["presets"]
+    return validate_presets(data)
@@ -0,0 +1,119 @@
+"""
+Media probing via `ffmpeg -i`.
+
+imageio-ffmpeg only ships the ffmpeg binary (no ffprobe), so stream details
+are parsed from the banner ffmpeg prints when it is given an input and no
+output.
+"""
+
+import os
+import re
+import subprocess
+import threading
+
+from config.settings import FFMPEG_EXE
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+_BITRATE_RE = re.compile(r"bitrate: (\d+) kb/s")
+_FORMAT_RE = re.compile(r"^Input #0, (.+), from ", re.MULTILINE)
+_VIDEO_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+)(.*)")
+_AUDIO_RE = re.compile(r"Stream #\d+:\d+.*?: Audio: (\w+)(.*)")
+_PIX_FMT_RE = re.compile(r"^[^,]*, (\w+)")
+_SIZE_RE = re.compile(r", (\d{2,5})x(\d{2,5})")
+_FPS_RE = re.compile(r", (\d+(?:\.\d+)?) fps")
+_KBPS_RE = re.compile(r", (\d+) kb/s")
+_HZ_RE = re.compile(r", (\d+) Hz, ([^,]+)")
+
+# Probe results keyed by (path, size, mtime), so each file is probed once per run
+# no matter how many stages (ordering, progress, ...) ask for it.
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def parse_probe_output(text):
+    """
+    Parses the stderr of `ffmpeg -i <file>` into a dict.
+
+    Returns:
+        dict: {"format", "duration", "bitrate_kbps", "video", "audio"}.
+              `video`/`audio` describe the first stream of that type, or are None.
+    """
+    info = {"format": None, "duration": None, "bitrate_kbps": None, "video": None, "audio": None}
+
+    m = _FORMAT_RE.search(text)
+    if m:
+        info["format"] = m.group(1)
+
+    m = _DURATION_RE.search(text)
+    if m:
+        hours, minutes, seconds = m.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    m = _BITRATE_RE.search(text)
+    if m:
+        info["bitrate_kbps"] = int(m.group(1))
+
+    m = _VIDEO_RE.search(text)
+    if m:
+        codec, rest = m.groups()
+        video = {"codec": codec, "pix_fmt": None, "width": None, "height": None}
+        video["fps"] = video["bitrate_kbps"] = None
+        if pm := _PIX_FMT_RE.search(rest):
+            video["pix_fmt"] = pm.group(1)
+        if sm := _SIZE_RE.search(rest):
+            video["width"], video["height"] = int(sm.group(1)), int(sm.group(2))
+        if fm := _FPS_RE.search(rest):
+            video["fps"] = float(fm.group(1))
+        if km := _KBPS_RE.search(rest):
+            video["bitrate_kbps"] = int(km.group(1))
+        info["video"] = video
+
+    m = _AUDIO_RE.search(text)
+    if m:
+        codec, rest = m.groups()
+        audio = {"codec": codec, "sample_rate": None, "channels": None, "bitrate_kbps": None}
+        if hm := _HZ_RE.search(rest):
+            audio["sample_rate"] = int(hm.group(1))
+            audio["channels"] = hm.group(2).strip()
+        if km := _KBPS_RE.search(rest):
+            audio["bitrate_kbps"] = int(km.group(1))
+        info["audio"] = audio
+
+    return info
+
+
+def probe_media(path):
+    """
+    Returns stream information for `path` (see parse_probe_output), or None if
+    ffmpeg cannot read it. Results are cached until the file changes.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+
+    info = _run_probe(path)
+    with _cache_lock:
+        _cache[key] = info
+    return info
+
+
+def _run_probe(path):
+    try:
+        result = subprocess.run(
+            [FFMPEG_EXE, "-hide_banner", "-i", path],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        return None
+
+    info = parse_probe_output(result.stderr.decode(errors="replace"))
+    if not info["format"]:
+        return None
+    return info
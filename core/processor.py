@@ -1,27 +1,78 @@
-import subprocess
+import concurrent.futures
+import contextlib
+import os
+import shutil
+import tempfile
+import time
 
 from tqdm import tqdm
 
-from config.settings import FFMPEG_EXE
+from config.settings import (
+    CHUNK_SEGMENT_SECONDS,
+    CHUNK_THRESHOLD_SECONDS,
+    FFMPEG_EXE,
+    JOB_TIMEOUT_SECONDS,
+    THREADS_PER_JOB,
+)
+from core import chunking, slides
+from core.atomic import WORKDIR_PREFIX, discard, partial_path, publish
+from core.failures import GPU_BUSY, classify_failure, gpu_failure
+from core.hardware import hw_input_args
+from core.jobqueue import CLAIM_LOST
+from core.metrics import FAILED, KEPT_ORIGINAL, OK, RETRY, JobMetrics
+from core.passthrough import COPY_ALL, passthrough_mode
+from core.preset_schema import video_args
+from core.probe import probe_media
+from core.quality import quality_value, tune_preset, with_quality
+from core.runner import cancelled, run_ffmpeg
+from core.sizeguard import SizeGuard
 
 
-def build_command(input_path, output_path, preset, gpu_codec=None):
+def build_command(
+    input_path,
+    output_path,
+    preset,
+    gpu_codec=None,
+    threads=None,
+    passthrough=None,
+    audio=True,
+    hw=None,
+):
     """
     Constructs the FFMPEG command based on the preset and detected hardware.
+
+    `threads` sets the encoder thread count for CPU encodes (defaults to THREADS_PER_JOB).
+    `passthrough` is a mode from core.passthrough: the video (and maybe audio)
+    stream is copied instead of re-encoded. `audio=False` drops the audio
+    (used for segments of a chunked encode). `hw` is a core.hardware backend:
+    decoding and filtering then happen on the GPU too, if the preset allows it.
     """
-    cmd = [FFMPEG_EXE, "-y", "-v", "error", "-i", input_path]
+    cmd = [FFMPEG_EXE, "-y", "-v", "error", "-nostats", "-progress", "pipe:1"]
+
+    use_gpu = not passthrough and preset["use_gpu"] and gpu_codec
+    hw_args = video_args(preset, gpu_codec, hw) if use_gpu and hw else None
+    if hw_args is not None:
+        cmd.extend(hw_input_args(hw))
+    cmd.extend(["-i", input_path])
 
     # VIDEO SECTION
-    if preset["use_gpu"] and gpu_codec:
+    if passthrough:
+        cmd.extend(["-c:v", "copy"])
+    elif use_gpu:
         cmd.extend(["-c:v", gpu_codec])
-        cmd.extend(preset["gpu_quality_flags"].get(gpu_codec, []))
+        cmd.extend(hw_args if hw_args is not None else video_args(preset, gpu_codec))
     else:
         # CPU Mode (Fallback or intentional)
-        params = preset.get("video_params", preset.get("cpu_fallback", []))
-        cmd.extend(params)
+        cmd.extend(["-threads", str(threads or THREADS_PER_JOB)])
+        cmd.extend(video_args(preset))
 
     # AUDIO SECTION
-    cmd.extend(preset["audio_params"])
+    if not audio:
+        cmd.append("-an")
+    elif passthrough == COPY_ALL:
+        cmd.extend(["-c:a", "copy"])
+    else:
+        cmd.extend(preset["audio_params"])
 
     # OUTPUT
     cmd.append(output_path)
@@ -29,21 +80,362 @@ def build_command(input_path, output_path, preset, gpu_codec=None):
     return cmd
 
 
-def process_file(args):
+def _sample_command(input_path, output_path, preset, gpu_codec):
+    """Single-threaded, video-only encode used for quality search samples."""
+    return build_command(input_path, output_path, preset, gpu_codec, threads=1, audio=False)
+
+
+def resolve_encoder(preset, gpu_codec=None):
+    """
+    Returns the name of the video encoder a job will use (e.g. 'h264_nvenc' or 'libx264').
+    """
+    if preset["use_gpu"] and gpu_codec:
+        return gpu_codec
+
+    for key in ("cpu_fallback", "video_params"):
+        params = preset.get(key, [])
+        if "-c:v" in params:
+            return params[params.index("-c:v") + 1]
+
+    return None
+
+
+def process_file(
+    args, scheduler=None, progress=None, history=None, metrics=None, stager=None, claims=None
+):
     """
     Worker function to run the compression.
+
+    If a ResourceScheduler is given, the job waits for a CPU or GPU slot and
+    sizes its encoder threads from the slot it was granted. If a BatchProgress
+    is given, live ffmpeg stats are shown per worker and logged. If a
+    ThroughputHistory is given, the measured encode speed is recorded. If a
+    JobMetrics is given, it is filled in with the job's timings and usage.
+
+    If a Stager is given (see core.staging), the input is read from its local
+    scratch copy, and the output is written to scratch and uploaded in the
+    background so the next encode can start meanwhile.
+
+    On a queue worker, `claims` (see core.jobqueue.Claims) names the partial
+    after the worker, and the output is only published while the worker still
+    holds the ticket.
+
+    Returns:
+        bool: Whether the output was written; with a stager, a Future of it
+        that resolves once the upload is done.
+
+    Raises:
+        GpuFailure: If a GPU encode failed for a reason another attempt may
+            fix (busy sessions, unsupported input, driver error). Failures of
+            the input itself just return False.
     """
+    staged = stager.acquire(args[0]) if stager else contextlib.nullcontext(args[0])
+    with staged as source:
+        return _process_file(args, source, scheduler, progress, history, metrics, stager, claims)
+
+
+def _process_file(args, source, scheduler, progress, history, metrics, stager, claims):
+    """process_file() with the input read from `source`."""
     input_path, output_path, filename, preset, gpu_codec = args
+    use_gpu = bool(preset["use_gpu"] and gpu_codec)
+    metrics = metrics or JobMetrics(args)
+
+    with metrics.timed("probe_seconds"):
+        info = probe_media(source)
+    size = os.path.getsize(source)
+    copy_mode = passthrough_mode(info, preset)
+    metrics.set(input_bytes=size, duration=info["duration"] if info else None)
+    plain = preset
+    if preset.get("slide_detection") and not copy_mode:
+        # The analysis decodes the whole file, so it waits for a CPU slot like an encode.
+        with scheduler.reserve(False) if scheduler else contextlib.nullcontext():
+            with metrics.timed("analysis_seconds"):
+                preset = slides.tune_preset(source, info, preset)
+        if preset.get("slides"):
+            found = preset["slides"]
+            tqdm.write(
+                f"🖼 SLIDES: {filename} -> {found['static_ratio']:.0%} static, "
+                f"{len(found['changes'])} slide changes, dropping duplicate frames"
+            )
+    threshold = preset.get("chunk_threshold", CHUNK_THRESHOLD_SECONDS)
+    chunked = not copy_mode and chunking.should_chunk(info, threshold)
+    metrics.set(
+        mode="copy" if copy_mode else "chunked" if chunked else "encode",
+        encoder="copy" if copy_mode == COPY_ALL else resolve_encoder(preset, gpu_codec),
+    )
+
+    # Stream copies are pure I/O, so they don't take encoder budget. Chunked
+    # jobs reserve a slot per segment instead of one for the whole file.
+    if copy_mode or chunked or not scheduler:
+        reservation = contextlib.nullcontext()
+    else:
+        reservation = scheduler.reserve(use_gpu)
+
+    waiting = time.monotonic()
+    with reservation as slot:
+        metrics.add("queue_wait", time.monotonic() - waiting)
+        if copy_mode == COPY_ALL:
+            tqdm.write(f"⏩ STARTING: {filename} (already compliant, remuxing)")
+        elif copy_mode:
+            tqdm.write(f"⏩ STARTING: {filename} (copying video, transcoding audio)")
+        elif chunked:
+            tqdm.write(f"▶ STARTING: {filename} (long input, encoding segments in parallel)")
+        else:
+            tqdm.write(f"▶ STARTING: {filename}")
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        if preset.get("quality_search") and not copy_mode:
+            # Samples are scored frame by frame against the source, so they are
+            # encoded without slide decimation (a VFR sample would be misaligned);
+            # the value found then applies to the decimated preset too.
+            with metrics.timed("analysis_seconds"):
+                tuned = tune_preset(
+                    source,
+                    info,
+                    plain,
+                    gpu_codec,
+                    _sample_command,
+                    workers=1 if use_gpu else (slot.threads if slot else THREADS_PER_JOB),
+                )
+            found = quality_value(tuned, gpu_codec)
+            if found:
+                preset = with_quality(preset, gpu_codec, found[1])
+                tqdm.write(f"🎯 QUALITY: {filename} -> {found[0][1:]} {found[1]}")
 
-    tqdm.write(f"▶ STARTING: {filename}")
+        duration = info["duration"] if info else None
+        guard = None
+        if preset.get("max_size_ratio") and not copy_mode:
+            guard = SizeGuard(size, duration, preset["max_size_ratio"])
 
-    cmd = build_command(input_path, output_path, preset, gpu_codec)
+        job = None
+        if progress:
+            job = progress.start_job(filename, size, duration)
 
+        # GPU decode + filters, when the machine and the preset's filters allow it.
+        hw = preset.get("hw_backend") if use_gpu and not copy_mode else None
+        if hw and video_args(preset, gpu_codec, hw) is None:
+            hw = None
+
+        # ffmpeg writes a hidden partial that only gets the real name once
+        # complete (with a stager, a scratch file that is uploaded afterwards).
+        if stager:
+            partial = stager.output_path(output_path)
+        else:
+            partial = claims.partial_path(output_path) if claims else partial_path(output_path)
+
+        def encode(hw):
+            if chunked:
+                return encode_chunked(
+                    source,
+                    partial,
+                    preset,
+                    gpu_codec,
+                    scheduler,
+                    on_progress=job.update if job else None,
+                    hw=hw,
+                    on_usage=metrics.add_usage,
+                    audio=bool(info["audio"]),
+                )
+            cmd = build_command(
+                source,
+                partial,
+                preset,
+                gpu_codec,
+                threads=slot.threads if slot else None,
+                passthrough=copy_mode,
+                hw=hw,
+            )
+            return run_ffmpeg(
+                cmd,
+                on_progress=job.update if job else None,
+                should_abort=guard.check if guard else None,
+                on_usage=metrics.add_usage,
+                timeout=JOB_TIMEOUT_SECONDS or None,
+            )
+
+        def finish(ok, err_msg):
+            metrics.set(
+                status=(KEPT_ORIGINAL if kept_original else OK) if ok else FAILED,
+                output_bytes=out_size if ok else None,
+            )
+            if ok:
+                if history and not copy_mode and not kept_original:
+                    encoder = resolve_encoder(preset, gpu_codec)
+                    history.record(preset, encoder, info, size, wall)
+                note = " (original kept)" if kept_original else ""
+                tqdm.write(f"✔ COMPLETED: {filename} {format_savings(size, out_size)}{note}")
+            else:
+                tqdm.write(f"✘ FAILED: {filename} -> {err_msg or 'Unknown Error'}")
+            return ok
+
+        ok = False
+        kept_original = False
+        failure = None
+        upload = None
+        out_size = None
+        started = time.monotonic()
+        try:
+            returncode, err_msg = encode(hw)
+            if (
+                returncode != 0
+                and hw
+                and not (guard and guard.tripped)
+                and classify_failure(err_msg) != GPU_BUSY
+            ):
+                # e.g. a source codec or profile the hardware decoder doesn't support
+                tqdm.write(f"⚠ HW PIPELINE FAILED: {filename} -> retrying with software decoding")
+                returncode, err_msg = encode(None)
+            ok = returncode == 0
+            wall = time.monotonic() - started
+            metrics.set(encode_seconds=wall, exit_code=returncode)
+
+            if claims and not claims.holds(output_path):
+                ok, err_msg = False, CLAIM_LOST
+            elif guard and (guard.tripped or (ok and guard.exceeds(os.path.getsize(partial)))):
+                tqdm.write(f"↩ NOT SMALLER: {filename} -> keeping the original")
+                ok = keep_original(source, output_path, preset, claims)
+                kept_original = True
+            elif ok and stager:
+                out_size = os.path.getsize(partial)
+                upload = stager.upload(partial, output_path, then=finish)
+            elif ok:
+                publish(partial, output_path)
+            elif use_gpu and not copy_mode and not cancelled():
+                failure = gpu_failure(err_msg)
+            if ok and out_size is None:
+                out_size = os.path.getsize(output_path)
+        finally:
+            if not upload:
+                discard(partial)
+            if job and failure:
+                job.abandon()
+            elif job:
+                job.finish(ok, output_size=out_size)
+
+        if failure:
+            metrics.set(status=RETRY)
+            # The caller decides where the retry runs (see core.pipeline).
+            raise failure
+        return upload if upload else finish(ok, err_msg)
+
+
+def encode_chunked(
+    input_path,
+    output_path,
+    preset,
+    gpu_codec=None,
+    scheduler=None,
+    on_progress=None,
+    segment_seconds=CHUNK_SEGMENT_SECONDS,
+    hw=None,
+    on_usage=None,
+    audio=True,
+):
+    """
+    Encodes one long file as keyframe-aligned segments in parallel.
+
+    Segments are split with a stream copy, encoded concurrently (each waits for
+    its own scheduler slot), then concatenated losslessly with the audio that
+    was encoded once from the whole input (`audio` False: the input has no
+    audio stream, so the segments are joined alone). Temporary files live next
+    to the output and are removed afterwards. `on_usage` is passed to every
+    run_ffmpeg() call.
+
+    Returns:
+        tuple: (returncode, error_message) like run_ffmpeg().
+    """
+    use_gpu = bool(preset["use_gpu"] and gpu_codec)
+    out_dir = os.path.dirname(os.path.abspath(output_path))
+    workdir = tempfile.mkdtemp(prefix=WORKDIR_PREFIX, dir=out_dir)
+
+    try:
+        returncode, err = run_ffmpeg(
+            chunking.split_command(input_path, workdir, segment_seconds), on_usage=on_usage
+        )
+        segments = chunking.list_segments(workdir) if returncode == 0 else []
+        if not segments:
+            return returncode or 1, err or "Splitting into segments failed"
+
+        merged = chunking.SegmentProgress(on_progress)
+
+        def encode_segment(index, segment):
+            reservation = scheduler.reserve(use_gpu) if scheduler else contextlib.nullcontext()
+            with reservation as slot:
+                encoded = segment[: -len(".mkv")] + "_enc.mkv"
+                cmd = build_command(
+                    segment,
+                    encoded,
+                    preset,
+                    gpu_codec,
+                    threads=slot.threads if slot else None,
+                    audio=False,
+                    hw=hw,
+                )
+                code, msg = run_ffmpeg(
+                    cmd,
+                    on_progress=merged.for_segment(index),
+                    on_usage=on_usage,
+                    timeout=JOB_TIMEOUT_SECONDS or None,
+                )
+                return code, msg, encoded
+
+        audio_path = os.path.join(workdir, "audio.mka") if audio else None
+        workers = scheduler.max_jobs(use_gpu) if scheduler else THREADS_PER_JOB
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers + 1) as executor:
+            audio_future = None
+            if audio_path:
+                audio_cmd = chunking.audio_command(input_path, audio_path, preset)
+                audio_future = executor.submit(run_ffmpeg, audio_cmd, on_usage=on_usage)
+            results = list(executor.map(encode_segment, range(len(segments)), segments))
+            audio_code, audio_err = audio_future.result() if audio_future else (0, "")
+
+        for code, msg, _ in results:
+            if code != 0:
+                return code, msg
+        if audio_code != 0:
+            return audio_code, audio_err
+
+        list_path = chunking.write_concat_list(
+            [encoded for _, _, encoded in results], os.path.join(workdir, "segments.txt")
+        )
+        return run_ffmpeg(
+            chunking.concat_command(list_path, audio_path, output_path), on_usage=on_usage
+        )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def format_savings(input_size, output_size):
+    """Returns e.g. '(120.0MB → 35.2MB, -71%)'."""
+    before = tqdm.format_sizeof(input_size, "B", 1024)
+    after = tqdm.format_sizeof(output_size, "B", 1024)
+    change = 100.0 * (output_size - input_size) / input_size if input_size else 0.0
+    return f"({before} → {after}, {change:+.0f}%)"
+
+
+def keep_original(input_path, output_path, preset, claims=None):
+    """
+    Puts the original file at `output_path` instead of a larger encode.
+
+    Same container: plain copy. Different container (e.g. .avi -> .mp4): remux
+    the original streams with `-c copy`.
+    """
+    same_container = (
+        os.path.splitext(input_path)[1].lower() == os.path.splitext(output_path)[1].lower()
+    )
+    partial = claims.partial_path(output_path) if claims else partial_path(output_path)
     try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-        tqdm.write(f"✔ COMPLETED: {filename}")
+        if same_container:
+            shutil.copyfile(input_path, partial)
+        else:
+            cmd = build_command(input_path, partial, preset, passthrough=COPY_ALL)
+            returncode, _ = run_ffmpeg(cmd)
+            if returncode != 0:
+                return False
+        publish(partial, output_path)
         return True
-    except subprocess.CalledProcessError as e:
-        err_msg = e.stderr.decode().strip() if e.stderr else "Unknown Error"
-        tqdm.write(f"✘ FAILED: {filename} -> {err_msg}")
+    except OSError:
         return False
+    finally:
+        discard(partial)
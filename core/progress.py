@@ -0,0 +1,280 @@
+"""
+Live progress telemetry for running ffmpeg jobs.
+
+ffmpeg is started with `-progress pipe:1`, which makes it print blocks of
+`key=value` lines to stdout every ~0.5s. A ProgressParser assembles those
+blocks as core.runner reads the pipe, and the numbers feed:
+- one tqdm bar per active worker (frame, fps, speed, bitrate, ETA),
+- an aggregate bar weighted by input bytes,
+- a JSONL telemetry log for later analysis.
+"""
+
+import json
+import queue
+import threading
+import time
+
+from tqdm import tqdm
+
+TELEMETRY_NAME = ".mvc_telemetry.jsonl"
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_stats(raw, duration=None):
+    """
+    Converts one raw ffmpeg progress block into typed stats.
+
+    Parameters:
+        raw (dict): key/value strings as printed by `-progress`.
+        duration (float): Input duration in seconds, used for percent and ETA.
+
+    Returns:
+        dict: frame, fps, speed (x realtime), bitrate_kbps, out_time (s),
+              total_size (bytes), percent, eta (s) and the raw `progress` state.
+    """
+    out_time_us = _to_float(raw.get("out_time_us", raw.get("out_time_ms")))
+    out_time = max(0.0, out_time_us / 1_000_000) if out_time_us is not None else 0.0
+
+    speed = _to_float(raw.get("speed", "").rstrip("x"))
+    bitrate = _to_float(raw.get("bitrate", "").replace("kbits/s", ""))
+    total_size = _to_float(raw.get("total_size"))
+
+    stats = {
+        "frame": int(_to_float(raw.get("frame")) or 0),
+        "fps": _to_float(raw.get("fps")),
+        "speed": speed,
+        "bitrate_kbps": bitrate,
+        "out_time": out_time,
+        "total_size": int(total_size) if total_size is not None else None,
+        "percent": None,
+        "eta": None,
+        "progress": raw.get("progress"),
+    }
+
+    if duration:
+        stats["percent"] = min(100.0, 100.0 * out_time / duration)
+        if speed:
+            stats["eta"] = max(0.0, duration - out_time) / speed
+
+    return stats
+
+
+class ProgressParser:
+    """
+    Assembles `-progress` lines into blocks.
+
+    `callback(raw_block)` is invoked once per complete block (i.e. on every
+    `progress=continue|end` line).
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.last = {}
+        self._block = {}
+
+    def feed(self, line):
+        """Takes one line (bytes) of the stream."""
+        key, sep, value = line.decode(errors="replace").strip().partition("=")
+        if not sep:
+            return
+        self._block[key] = value
+        if key == "progress":
+            self.last = self._block
+            self._block = {}
+            if self.callback:
+                self.callback(self.last)
+
+
+class TelemetryLog:
+    """
+    JSONL writer for progress and job events.
+
+    write() only queues the event: progress blocks arrive on the event loop
+    that drives every ffmpeg child (see core.runner), which must not wait for
+    a slow destination disk. A writer thread appends whatever has queued up
+    with one open() per batch; close() writes the rest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="mvc-telemetry", daemon=True)
+        self._thread.start()
+
+    def write(self, event, **fields):
+        self._queue.put({"ts": round(time.time(), 3), "event": event, **fields})
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            while not self._queue.empty():
+                records.append(self._queue.get())
+            lines = [json.dumps(record) + "\n" for record in records if record is not None]
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+            except OSError:
+                pass  # telemetry is best effort; the encodes go on
+            if None in records:
+                return
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class JobProgress:
+    """Progress view of one running file; created by BatchProgress.start_job()."""
+
+    def __init__(self, batch, filename, size, duration, position):
+        self.batch = batch
+        self.filename = filename
+        self.size = size
+        self.duration = duration
+        self.position = position
+        self.started = time.monotonic()
+        self.bytes_done = 0
+        self.last_stats = None
+        self.label = filename if len(filename) <= 24 else filename[:21] + "..."
+        self.bar = tqdm(
+            total=round(duration, 1) if duration else None,
+            desc=self.label,
+            unit="s",
+            position=position,
+            leave=False,
+            bar_format="{percentage:3.0f}%|{bar:20}| {desc}",
+        )
+
+    def update(self, raw):
+        """Feeds one raw ffmpeg progress block (see ProgressParser)."""
+        stats = normalize_stats(raw, self.duration)
+        self.last_stats = stats
+
+        with self.batch.lock:
+            self.bar.n = round(stats["out_time"], 1)
+            self.bar.set_description_str(f"{self.label} {format_stats(stats)}", refresh=True)
+
+            if self.duration:
+                done = int(self.size * min(1.0, stats["out_time"] / self.duration))
+                self.batch.advance(done - self.bytes_done)
+                self.bytes_done = done
+
+        self.batch.log(
+            "progress",
+            file=self.filename,
+            elapsed=round(time.monotonic() - self.started, 2),
+            duration=self.duration,
+            **stats,
+        )
+
+    def finish(self, ok, output_size=None):
+        """Marks the job done, completing its share of the aggregate bar."""
+        with self.batch.lock:
+            self.batch.advance(self.size - self.bytes_done)
+            self.bytes_done = self.size
+            self.bar.close()
+        self.batch.release_position(self.position)
+
+        wall = time.monotonic() - self.started
+        self.batch.log(
+            "finished",
+            file=self.filename,
+            ok=ok,
+            wall=round(wall, 2),
+            size=self.size,
+            output_size=output_size,
+            saved=self.size - output_size if output_size is not None else None,
+            duration=self.duration,
+            realtime=round(self.duration / wall, 3) if self.duration and wall else None,
+        )
+
+    def abandon(self):
+        """Ends a job that will be retried, taking back its share of the aggregate bar."""
+        with self.batch.lock:
+            self.batch.rewind(self.bytes_done)
+            self.bytes_done = 0
+            self.bar.close()
+        self.batch.release_position(self.position)
+        self.batch.log("retry", file=self.filename, wall=round(time.monotonic() - self.started, 2))
+
+
+def format_stats(stats):
+    """Short human-readable summary shown next to a per-worker bar."""
+    parts = [f"frame={stats['frame']}"]
+    if stats["fps"] is not None:
+        parts.append(f"fps={stats['fps']:.0f}")
+    if stats["speed"] is not None:
+        parts.append(f"{stats['speed']:.2f}x")
+    if stats["bitrate_kbps"] is not None:
+        parts.append(f"{stats['bitrate_kbps']:.0f}kbps")
+    if stats["eta"] is not None:
+        parts.append(f"ETA {tqdm.format_interval(stats['eta'])}")
+    return " ".join(parts)
+
+
+class BatchProgress:
+    """
+    Aggregate progress for a batch plus per-worker bars.
+
+    The aggregate bar counts input bytes, so its ETA is weighted by file size
+    rather than by file count.
+    """
+
+    def __init__(self, total_bytes=0, workers=1, log_path=None):
+        self.lock = threading.RLock()
+        self.bar = tqdm(
+            total=total_bytes,
+            desc="Total",
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+            position=0,
+            mininterval=0.5,
+        )
+        self._positions = list(range(1, workers + 1))
+        self._telemetry = TelemetryLog(log_path) if log_path else None
+
+    def add_total(self, nbytes):
+        """Grows the aggregate total as files are discovered."""
+        with self.lock:
+            self.bar.total = (self.bar.total or 0) + nbytes
+            self.bar.refresh()
+
+    def start_job(self, filename, size, duration):
+        with self.lock:
+            position = self._positions.pop(0) if self._positions else None
+        self.log("started", file=filename, size=size, duration=duration)
+        return JobProgress(self, filename, size, duration, position)
+
+    def release_position(self, position):
+        if position is None:
+            return
+        with self.lock:
+            self._positions.append(position)
+            self._positions.sort()
+
+    def advance(self, nbytes):
+        if nbytes > 0:
+            self.bar.update(nbytes)
+
+    def rewind(self, nbytes):
+        """Undoes advance() for work that has to be redone."""
+        if nbytes > 0:
+            self.bar.n = max(0, self.bar.n - nbytes)
+            self.bar.refresh()
+
+    def log(self, event, **fields):
+        if self._telemetry:
+            self._telemetry.write(event, **fields)
+
+    def close(self):
+        self.bar.close()
+        if self._telemetry:
+            self._telemetry.close()
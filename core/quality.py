@@ -0,0 +1,273 @@
+"""
+Content-adaptive quality search.
+
+A preset's fixed CRF/QP over-encodes easy content (static slides) and
+under-encodes hard content (high motion). When enabled, a few short windows of
+the source are encoded at several candidate values in parallel and scored
+against the original with ffmpeg's `ssim`, `psnr` or `libvmaf` filter. The
+cheapest value (highest CRF/QP) whose worst window still meets the target is
+used for the full encode. Results are cached per source fingerprint.
+"""
+
+import concurrent.futures
+import copy
+import functools
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from config.settings import CACHE_DIR, FFMPEG_EXE
+from core.manifest import fingerprint
+from core.preset_schema import compile_preset
+from core.probe import probe_media
+from core.runner import run_ffmpeg
+
+CACHE_FILE = "quality.json"
+
+# Flags whose value trades quality for size, where a higher value means a smaller file.
+QUALITY_FLAGS = ("-crf", "-qp", "-global_quality")
+
+# Candidate offsets around the preset's own value.
+CANDIDATE_OFFSETS = (-4, -2, 0, 2, 4, 6, 8)
+
+SAMPLE_WINDOWS = 3
+SAMPLE_SECONDS = 4.0
+
+_SCORE_RE = {
+    "ssim": re.compile(r"SSIM .*All:([\d.]+|inf)"),
+    "psnr": re.compile(r"PSNR .*average:([\d.]+|inf)"),
+    "vmaf": re.compile(r"VMAF score: ([\d.]+)"),
+}
+_FILTER = {"ssim": "ssim", "psnr": "psnr", "vmaf": "libvmaf"}
+
+
+@functools.lru_cache(maxsize=None)
+def available_metrics():
+    """Returns the quality metrics this ffmpeg build can compute."""
+    try:
+        result = subprocess.run(
+            [FFMPEG_EXE, "-hide_banner", "-filters"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        return ()
+    names = set()
+    for line in result.stdout.decode(errors="replace").splitlines():
+        fields = line.split()
+        if len(fields) > 2 and "->" in fields[2]:
+            names.add(fields[1])
+    return tuple(m for m in ("vmaf", "ssim", "psnr") if _FILTER[m] in names)
+
+
+def _active_params(preset, gpu_codec):
+    """Returns (key, subkey) of the parameter list the encode will actually use."""
+    if preset["use_gpu"] and gpu_codec:
+        return "gpu_quality_flags", gpu_codec
+    for key in ("video_params", "cpu_fallback"):
+        if any(flag in preset.get(key, []) for flag in QUALITY_FLAGS):
+            return key, None
+    return None, None
+
+
+def _params(preset, key, subkey):
+    return preset[key][subkey] if subkey else preset[key]
+
+
+def quality_value(preset, gpu_codec=None):
+    """Returns (flag, value) of the preset's quality setting for this encoder, or None."""
+    key, subkey = _active_params(preset, gpu_codec)
+    if not key or (subkey and subkey not in preset[key]):
+        return None
+    params = _params(preset, key, subkey)
+    for flag in QUALITY_FLAGS:
+        if flag in params:
+            return flag, int(params[params.index(flag) + 1])
+    return None
+
+
+def with_quality(preset, gpu_codec, value):
+    """Returns a copy of `preset` with its CRF/QP set to `value`."""
+    found = quality_value(preset, gpu_codec)
+    if not found:
+        return preset
+    flag = found[0]
+    key, subkey = _active_params(preset, gpu_codec)
+    variant = copy.deepcopy(preset)
+    params = _params(variant, key, subkey)
+    params[params.index(flag) + 1] = str(value)
+    return compile_preset(variant)
+
+
+def sample_windows(duration, count=SAMPLE_WINDOWS, length=SAMPLE_SECONDS):
+    """Returns (start, length) pairs spread across the timeline (20%..80%)."""
+    if not duration or duration <= length * count:
+        return [(0.0, min(length, duration or length))]
+    if count == 1:
+        return [(duration / 2 - length / 2, length)]
+    span = 0.6 * duration
+    return [(0.2 * duration + i * span / (count - 1) - length / 2, length) for i in range(count)]
+
+
+def parse_score(text, metric):
+    """Extracts the overall score from ssim/psnr/libvmaf filter output."""
+    m = _SCORE_RE[metric].search(text)
+    if not m:
+        return None
+    return float(m.group(1))
+
+
+def measure(encoded_path, input_path, start, length, metric):
+    """Scores an encoded sample against the same window of the source."""
+    info = probe_media(encoded_path)
+    video = info["video"] if info else None
+    if not video or not video.get("width"):
+        return None
+
+    # Compare at the encoded size, so scaling presets are judged fairly.
+    graph = (
+        f"[1:v]scale={video['width']}:{video['height']}:flags=bicubic[ref];"
+        f"[0:v][ref]{_FILTER[metric]}"
+    )
+    cmd = [
+        FFMPEG_EXE,
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        encoded_path,
+        "-ss",
+        f"{start:.3f}",
+        "-t",
+        f"{length:.3f}",
+        "-i",
+        input_path,
+        "-lavfi",
+        graph,
+        "-f",
+        "null",
+        "-",
+    ]
+    returncode, stderr = run_ffmpeg(cmd)
+    return parse_score(stderr, metric) if returncode == 0 else None
+
+
+def pick_value(scores, target, candidates):
+    """
+    Returns the highest candidate whose every sample scored >= `target`, or the
+    lowest (best quality) candidate if none did.
+    """
+    passing = [
+        value
+        for value, results in scores.items()
+        if results and None not in results and min(results) >= target
+    ]
+    return max(passing) if passing else min(candidates)
+
+
+class QualityCache:
+    """Chosen CRF/QP values keyed by source fingerprint and search settings."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, CACHE_FILE)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(input_path, preset, encoder, metric, target):
+        return f"{fingerprint(input_path)}|{preset['name']}|{encoder}|{metric}|{target}"
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.entries, f, indent=2)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+
+
+def search_quality(input_path, info, preset, gpu_codec, build, target, metric="ssim", workers=4):
+    """
+    Finds the highest CRF/QP whose worst sample window still scores >= `target`.
+
+    Parameters:
+        build (callable): build_command-like callable used for the sample
+            encodes, so samples get exactly the preset's filters and flags.
+        workers (int): Sample encodes run concurrently.
+
+    Returns:
+        int|None: The chosen value, or None if the preset has no CRF/QP setting.
+    """
+    found = quality_value(preset, gpu_codec)
+    if not found:
+        return None
+    base = found[1]
+    candidates = sorted({max(0, base + offset) for offset in CANDIDATE_OFFSETS})
+    windows = sample_windows(info.get("duration") if info else None)
+
+    workdir = tempfile.mkdtemp(prefix=".mvc_quality_")
+    try:
+
+        def score(job):
+            value, index = job
+            start, length = windows[index]
+            sample = os.path.join(workdir, f"q{value}_{index}.mp4")
+            cmd = build(input_path, sample, with_quality(preset, gpu_codec, value), gpu_codec)
+            pos = cmd.index("-i")
+            cmd[pos:pos] = ["-ss", f"{start:.3f}", "-t", f"{length:.3f}"]
+            returncode, _ = run_ffmpeg(cmd)
+            if returncode != 0:
+                return value, None
+            return value, measure(sample, input_path, start, length, metric)
+
+        jobs = [(value, i) for value in candidates for i in range(len(windows))]
+        scores = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for value, result in executor.map(score, jobs):
+                scores.setdefault(value, []).append(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return pick_value(scores, target, candidates)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def tune_preset(input_path, info, preset, gpu_codec, build, workers=4):
+    """
+    Returns `preset` with its CRF/QP replaced by the searched value if the
+    preset carries a `quality_search` dict ({"target": float, "metric": str}),
+    otherwise `preset` unchanged. Chosen values are cached across runs.
+    """
+    global _cache
+    search = preset.get("quality_search")
+    if not search or not quality_value(preset, gpu_codec):
+        return preset
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = QualityCache()
+    metric, target = search.get("metric", "ssim"), search["target"]
+    encoder = gpu_codec or "cpu"
+    key = QualityCache.key(input_path, preset, encoder, metric, target)
+    value = _cache.get(key)
+    if value is None:
+        value = search_quality(input_path, info, preset, gpu_codec, build, target, metric, workers)
+        _cache.put(key, value)
+    return with_quality(preset, gpu_codec, value)
@@ -0,0 +1,317 @@
+"""
+Several presets from one decode.
+
+A multi-rendition job (e.g. archive master + editing proxy + social cut)
+encodes every rendition in a single ffmpeg run: the source is read and
+decoded once and a `-filter_complex` graph splits the frames to one encoder
+per preset. Renditions that share a filter chain (two 720p outputs, say) also
+share the scaling work. Outputs are named after the preset's `suffix`:
+
+    talk.mp4  ->  talk_archive.mp4, talk_proxy.mp4, talk_social.mp4
+
+Renditions whose preset would stream-copy the source (see core.passthrough)
+are written by the same run with `-c:v copy`. Every CPU rendition gets the
+encoder threads of a job of its own. Quality search, slide detection,
+segment-parallel encoding and the GPU decode pipeline apply to single-preset
+jobs only.
+"""
+
+import contextlib
+import os
+import time
+
+from tqdm import tqdm
+
+from config.settings import FFMPEG_EXE, GPU_SESSION_LIMIT, JOB_TIMEOUT_SECONDS, THREADS_PER_JOB
+from core.atomic import discard, partial_path, publish
+from core.failures import gpu_failure
+from core.jobqueue import CLAIM_LOST
+from core.metrics import FAILED, KEPT_ORIGINAL, OK, RETRY, JobMetrics
+from core.passthrough import COPY_ALL, passthrough_mode
+from core.preset_schema import video_args
+from core.probe import probe_media
+from core.processor import format_savings, keep_original, resolve_encoder
+from core.runner import cancelled, run_ffmpeg
+
+FILTER_FLAGS = ("-vf", "-filter:v")
+
+
+def rendition_suffix(preset_id, preset):
+    return preset.get("suffix") or f"p{preset_id}"
+
+
+def rendition_path(output_path, suffix):
+    """'out/talk.mp4' + 'proxy' -> 'out/talk_proxy.mp4'."""
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_{suffix}{ext}"
+
+
+def group_preset(renditions):
+    """
+    Wraps several resolved renditions into the preset of one pipeline task.
+
+    Parameters:
+        renditions (list): dicts with "id", "preset" and "gpu_codec" (None = CPU).
+
+    Returns:
+        dict: A task preset with the renditions under "renditions" and a
+        combined `est_speed`, so the task is ordered like any other.
+    """
+    renditions = [{**r, "suffix": rendition_suffix(r["id"], r["preset"])} for r in renditions]
+
+    def combined(engine):
+        # Encoders run side by side on one decode; the slowest ones dominate.
+        total = 0.0
+        for r in renditions:
+            hints = r["preset"].get("est_speed", {})
+            speed = hints.get(engine if r["gpu_codec"] else "cpu") or hints.get("cpu") or 1.0
+            total += 1.0 / speed
+        return 1.0 / total
+
+    return {
+        "name": " + ".join(r["preset"]["name"] for r in renditions),
+        "use_gpu": any(r["gpu_codec"] for r in renditions),
+        "est_speed": {"cpu": combined("cpu"), "gpu": combined("gpu")},
+        "renditions": renditions,
+    }
+
+
+def rendition_outputs(preset, output_path):
+    """Returns [(output_path, rendition), ...] for a group preset."""
+    return [(rendition_path(output_path, r["suffix"]), r) for r in preset["renditions"]]
+
+
+def split_filters(argv):
+    """Returns (filter_chain, argv_without_it) for a video argv."""
+    chain, rest = "", []
+    i = 0
+    while i < len(argv):
+        if argv[i] in FILTER_FLAGS and i + 1 < len(argv):
+            chain = argv[i + 1]
+            i += 2
+            continue
+        rest.append(argv[i])
+        i += 1
+    return chain, rest
+
+
+def split_graph(chains):
+    """
+    Builds the -filter_complex graph feeding one encoder per entry of `chains`
+    (a filter chain, or '' for unfiltered frames). Identical chains run once.
+
+    Returns:
+        tuple: (graph or None, [map specifier per entry])
+    """
+    groups = {}
+    for index, chain in enumerate(chains):
+        groups.setdefault(chain, []).append(index)
+
+    parts = []
+    labels = [None] * len(chains)
+    if len(groups) > 1:
+        parts.append(f"[0:v:0]split={len(groups)}" + "".join(f"[d{g}]" for g in range(len(groups))))
+        sources = [f"d{g}" for g in range(len(groups))]
+    else:
+        sources = ["0:v:0"]
+
+    for source, (chain, members) in zip(sources, groups.items()):
+        filters = [chain] if chain else []
+        if len(members) > 1:
+            filters.append(f"split={len(members)}")
+        if not filters:
+            labels[members[0]] = f"[{source}]" if source != "0:v:0" else source
+            continue
+        parts.append(f"[{source}]{','.join(filters)}" + "".join(f"[v{i}]" for i in members))
+        for i in members:
+            labels[i] = f"[v{i}]"
+
+    return (";".join(parts) or None), labels
+
+
+def build_rendition_command(input_path, outputs, threads=None):
+    """
+    Constructs one FFMPEG command that writes every rendition from a single decode.
+
+    Parameters:
+        outputs (list): (output_path, preset, gpu_codec, passthrough) per rendition,
+            with `passthrough` a core.passthrough mode or None.
+        threads (int): Encoder threads of all CPU renditions together, split
+            evenly (default: THREADS_PER_JOB each).
+    """
+    cmd = [FFMPEG_EXE, "-y", "-v", "error", "-nostats", "-progress", "pipe:1", "-i", input_path]
+
+    encoded = [i for i, (_, _, _, copy_mode) in enumerate(outputs) if not copy_mode]
+    cpu_encodes = sum(1 for i in encoded if not _uses_gpu(outputs[i]))
+    cpu_threads = max(1, threads // max(1, cpu_encodes)) if threads else THREADS_PER_JOB
+
+    video = {}
+    for i in encoded:
+        _, preset, gpu_codec, _ = outputs[i]
+        if _uses_gpu(outputs[i]):
+            video[i] = ["-c:v", gpu_codec, *video_args(preset, gpu_codec)]
+        else:
+            video[i] = ["-threads", str(cpu_threads), *video_args(preset)]
+    chains = {}
+    for i in encoded:
+        chains[i], video[i] = split_filters(video[i])
+
+    graph, labels = split_graph([chains[i] for i in encoded])
+    if graph:
+        cmd.extend(["-filter_complex", graph])
+    label_for = dict(zip(encoded, labels))
+
+    for i, (output_path, preset, _, copy_mode) in enumerate(outputs):
+        if copy_mode:
+            cmd.extend(["-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy"])
+        else:
+            cmd.extend(["-map", label_for[i], "-map", "0:a:0?", *video[i]])
+        if copy_mode == COPY_ALL:
+            cmd.extend(["-c:a", "copy"])
+        else:
+            cmd.extend(preset["audio_params"])
+        cmd.append(output_path)
+
+    return cmd
+
+
+def _uses_gpu(output):
+    _, preset, gpu_codec, _ = output
+    return bool(preset["use_gpu"] and gpu_codec)
+
+
+def process_renditions(
+    args, scheduler=None, progress=None, history=None, metrics=None, stager=None, claims=None
+):
+    """
+    Worker function for a multi-rendition task (see group_preset()).
+
+    The task's `gpu_codec` is None once the pipeline has moved it to the CPU
+    (see core.failures); every rendition is then encoded in software. With a
+    Stager, the input is read from its local copy; the renditions are written
+    to their destination directly. `claims` is as for process_file().
+
+    Raises:
+        GpuFailure: Like process_file(), for GPU errors another attempt may fix.
+    """
+    staged = stager.acquire(args[0]) if stager else contextlib.nullcontext(args[0])
+    with staged as source:
+        return _process_renditions(args, source, scheduler, progress, history, metrics, claims)
+
+
+def _process_renditions(args, source, scheduler, progress, history, metrics, claims):
+    """process_renditions() with the input read from `source`."""
+    input_path, output_path, filename, preset, gpu_codec = args
+    metrics = metrics or JobMetrics(args)
+
+    with metrics.timed("probe_seconds"):
+        info = probe_media(source)
+    size = os.path.getsize(source)
+    outputs = []
+    for path, rendition in rendition_outputs(preset, output_path):
+        outputs.append(
+            (
+                path,
+                rendition["preset"],
+                rendition["gpu_codec"] if gpu_codec else None,
+                passthrough_mode(info, rendition["preset"]),
+            )
+        )
+    # Every hardware encoder opens a driver session of its own; renditions
+    # beyond the session budget are encoded on the CPU.
+    sessions = scheduler.gpu_sessions if scheduler else GPU_SESSION_LIMIT
+    on_gpu = [i for i, o in enumerate(outputs) if not o[3] and _uses_gpu(o)]
+    for i in on_gpu[sessions:]:
+        path, rendition_preset, _, mode = outputs[i]
+        outputs[i] = (path, rendition_preset, None, mode)
+    if on_gpu[sessions:]:
+        tqdm.write(
+            f"⚠ {filename}: {len(on_gpu) - sessions} rendition(s) on the CPU "
+            f"(only {sessions} GPU session(s))"
+        )
+    encodes = [o for o in outputs if not o[3]]
+    cpu_encodes = sum(1 for o in encodes if not _uses_gpu(o))
+    gpu_encodes = len(encodes) - cpu_encodes
+    use_gpu = gpu_encodes > 0
+    encoders = [
+        "copy" if o[3] == COPY_ALL else resolve_encoder(o[1], o[2]) or "none" for o in outputs
+    ]
+    metrics.set(
+        mode="renditions",
+        encoder="+".join(encoders),
+        input_bytes=size,
+        duration=info["duration"] if info else None,
+    )
+
+    with contextlib.ExitStack() as stack:
+        waiting = time.monotonic()
+        slot = None
+        if scheduler and cpu_encodes:
+            # Threads for every CPU encoder, not one job's worth split between them.
+            slot = stack.enter_context(scheduler.reserve(False, count=cpu_encodes))
+        if scheduler and use_gpu:
+            stack.enter_context(scheduler.reserve(True, count=gpu_encodes))
+        metrics.add("queue_wait", time.monotonic() - waiting)
+
+        tqdm.write(f"▶ STARTING: {filename} ({len(outputs)} renditions, one decode)")
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        duration = info["duration"] if info else None
+        job = progress.start_job(filename, size, duration) if progress else None
+
+        # Every rendition is written to a partial and published once the run succeeded.
+        partial_name = claims.partial_path if claims else partial_path
+        partials = [(partial_name(o[0]), *o[1:]) for o in outputs]
+        cmd = build_rendition_command(source, partials, threads=slot.threads if slot else None)
+        ok = False
+        failure = None
+        started = time.monotonic()
+        try:
+            returncode, err_msg = run_ffmpeg(
+                cmd,
+                on_progress=job.update if job else None,
+                on_usage=metrics.add_usage,
+                timeout=JOB_TIMEOUT_SECONDS or None,
+            )
+            ok = returncode == 0
+            metrics.set(encode_seconds=time.monotonic() - started, exit_code=returncode)
+            if claims and not claims.holds(output_path):
+                ok, err_msg = False, CLAIM_LOST
+            elif ok:
+                for partial, output in zip(partials, outputs):
+                    publish(partial[0], output[0])
+            elif use_gpu and not cancelled():
+                failure = gpu_failure(err_msg)
+        finally:
+            for partial in partials:
+                discard(partial[0])
+            if job and failure:
+                job.abandon()
+            elif job:
+                job.finish(ok)
+
+    if failure:
+        metrics.set(status=RETRY)
+        raise failure
+    if not ok:
+        metrics.set(status=FAILED)
+        tqdm.write(f"✘ FAILED: {filename} -> {err_msg or 'Unknown Error'}")
+        return False
+
+    status = OK
+    for path, rendition_preset, _, copy_mode in outputs:
+        name = os.path.basename(path)
+        ratio = rendition_preset.get("max_size_ratio")
+        if ratio and not copy_mode and os.path.getsize(path) > size * ratio:
+            tqdm.write(f"↩ NOT SMALLER: {name} -> keeping the original")
+            status = KEPT_ORIGINAL
+            if not keep_original(source, path, rendition_preset, claims):
+                tqdm.write(f"✘ FAILED: {name} -> could not copy the original")
+                ok = False
+            continue
+        tqdm.write(f"✔ COMPLETED: {name} {format_savings(size, os.path.getsize(path))}")
+    metrics.set(
+        status=status if ok else FAILED,
+        output_bytes=sum(os.path.getsize(o[0]) for o in outputs if os.path.exists(o[0])),
+    )
+    return ok
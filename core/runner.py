@@ -0,0 +1,294 @@
+"""
+Runs ffmpeg child processes without blocking on their output pipes.
+
+Every child is driven by one shared asyncio event loop on a background
+thread: its stdout (`-progress` blocks) and stderr are read incrementally as
+data arrives, and on Linux its exit is awaited through a pidfd. Running
+hundreds of children therefore costs no extra thread per child. Elsewhere
+the exit is awaited on the loop's executor, and on Windows (whose event loop
+cannot watch anonymous pipes) the pipes are read there too.
+
+run_ffmpeg() is the blocking entry point for the worker threads;
+run_async() is the same as a coroutine for code running on event_loop().
+"""
+
+import asyncio
+import collections
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from core.metrics import usage_fields
+from core.progress import ProgressParser
+
+# Lines of stderr kept for error reporting. Older lines are dropped so a
+# chatty failure cannot grow without bound.
+STDERR_TAIL_LINES = 200
+
+# Longest line kept whole; longer ones are split so a stream without newlines
+# can't grow the read buffer without bound either.
+MAX_LINE_BYTES = 64 * 1024
+READ_CHUNK_BYTES = 64 * 1024
+
+# Seconds a child gets to exit after SIGTERM before it is killed.
+TERMINATE_GRACE_SECONDS = 5
+
+# Windows has no SIGKILL; os.kill() terminates the process for any signal there.
+SIGKILL = getattr(signal, "SIGKILL", signal.SIGTERM)
+
+# Running ffmpeg children, so an interrupt can stop all of them.
+_children = set()
+_children_lock = threading.Lock()
+_cancelled = threading.Event()
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def event_loop():
+    """The event loop that drives every child, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="mvc-runner", daemon=True)
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+def cancel(grace=TERMINATE_GRACE_SECONDS):
+    """
+    Stops every running ffmpeg child and refuses to start new ones. Called
+    when the user interrupts the run (Ctrl+C or SIGTERM); the unfinished
+    outputs are partials (see core.atomic), so nothing half-written is left
+    under a final name.
+    """
+    _cancelled.set()
+    with _children_lock:
+        procs = list(_children)
+    for proc in procs:
+        _signal(proc, signal.SIGTERM)
+    deadline = time.monotonic() + grace
+    for proc in procs:
+        try:
+            proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            _signal(proc, SIGKILL)
+
+
+def _signal(proc, sig):
+    """
+    Sends `sig` to `proc` unless it has been reaped. Unlike Popen.terminate(),
+    this never reaps the child itself: only _reap() may, so os.wait4 still
+    gets its usage.
+    """
+    if proc.returncode is None:
+        try:
+            os.kill(proc.pid, sig)
+        except ProcessLookupError:
+            pass
+
+
+def cancelled():
+    return _cancelled.is_set()
+
+
+def child_pids():
+    """Process ids of the running ffmpeg children."""
+    with _children_lock:
+        return [proc.pid for proc in _children]
+
+
+def _wait(proc):
+    """Waits for `proc`. Returns (returncode, rusage), rusage None where unavailable."""
+    if not hasattr(os, "wait4"):
+        return proc.wait(), None
+    try:
+        _, status, rusage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        # Already reaped by a concurrent poll(), which takes the usage with it.
+        return proc.wait(), None
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, rusage
+
+
+def _pidfd(proc):
+    try:
+        return os.pidfd_open(proc.pid)
+    except (AttributeError, OSError):
+        # Not Linux 5.3+, or the child is already reaped.
+        return None
+
+
+async def _reap(proc):
+    """Awaits the exit of `proc`. Returns (returncode, rusage) like _wait()."""
+    loop = asyncio.get_running_loop()
+    pidfd = _pidfd(proc)
+    if pidfd is None:
+        return await loop.run_in_executor(None, _wait, proc)
+    exited = loop.create_future()
+    loop.add_reader(pidfd, lambda: exited.done() or exited.set_result(None))
+    try:
+        await exited
+    finally:
+        loop.remove_reader(pidfd)
+        os.close(pidfd)
+    return _wait(proc)  # the child is a zombie now, so this doesn't block
+
+
+async def _stop(proc, grace=TERMINATE_GRACE_SECONDS):
+    """Terminates `proc`, kills it if it outlives `grace`, and reaps it."""
+    _signal(proc, signal.SIGTERM)
+    try:
+        return await asyncio.wait_for(_reap(proc), grace)
+    except asyncio.TimeoutError:
+        _signal(proc, SIGKILL)
+        return await _reap(proc)
+
+
+def _split_lines(pending, chunk, on_line):
+    pending += chunk
+    *lines, pending = pending.split(b"\n")
+    if len(pending) > MAX_LINE_BYTES:
+        lines.append(pending)
+        pending = b""
+    for line in lines:
+        on_line(line)
+    return pending
+
+
+def _read_blocking(pipe, on_line):
+    pending = b""
+    for chunk in iter(lambda: pipe.read1(READ_CHUNK_BYTES), b""):
+        pending = _split_lines(pending, chunk, on_line)
+    if pending:
+        on_line(pending)
+
+
+async def _read_lines(pipe, on_line):
+    """Reads `pipe` to EOF, calling on_line(bytes) per line."""
+    loop = asyncio.get_running_loop()
+    if os.name == "nt":
+        await loop.run_in_executor(None, _read_blocking, pipe, on_line)
+        return
+    reader = asyncio.StreamReader(limit=MAX_LINE_BYTES, loop=loop)
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe
+    )
+    try:
+        pending = b""
+        while chunk := await reader.read(READ_CHUNK_BYTES):
+            pending = _split_lines(pending, chunk, on_line)
+        if pending:
+            on_line(pending)
+    finally:
+        transport.close()
+
+
+async def run_async(
+    cmd, on_progress=None, should_abort=None, on_stderr=None, on_usage=None, timeout=None
+):
+    """
+    Coroutine behind run_ffmpeg(); takes the same arguments and must run on
+    event_loop(), where the callbacks are called.
+    """
+    if _cancelled.is_set():
+        return 1, "Cancelled"
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    with _children_lock:
+        _children.add(proc)
+
+    def handle(block):
+        if on_progress:
+            on_progress(block)
+        if should_abort and proc.returncode is None and should_abort(block):
+            _signal(proc, signal.SIGTERM)
+
+    tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+
+    def on_err(line):
+        text = line.decode(errors="replace").rstrip()
+        tail.append(text)
+        if on_stderr:
+            on_stderr(text)
+
+    parser = ProgressParser(handle)
+    stdout = _read_lines(proc.stdout, parser.feed)
+    streams = asyncio.gather(stdout, _read_lines(proc.stderr, on_err))
+    exited = asyncio.ensure_future(_reap(proc))
+    timed_out = False
+    try:
+        # A failing callback ends its reader, so it has to stop the child
+        # too: nothing would drain the pipe any more.
+        await asyncio.wait(
+            {exited, streams}, timeout=timeout or None, return_when=asyncio.FIRST_EXCEPTION
+        )
+        if streams.done() and streams.exception():
+            raise streams.exception()
+        if exited.done():
+            returncode, rusage = exited.result()
+        else:
+            timed_out = True
+            exited.cancel()
+            returncode, rusage = await _stop(proc)
+        await streams
+    except BaseException:
+        # Also reached when the caller cancels: the child must not outlive its run.
+        exited.cancel()
+        streams.cancel()
+        await asyncio.shield(_stop(proc, grace=0))
+        raise
+    finally:
+        with _children_lock:
+            _children.discard(proc)
+
+    if on_usage and rusage is not None:
+        on_usage(usage_fields(rusage))
+    message = "\n".join(tail).strip()
+    if timed_out:
+        return returncode or 1, f"{message}\nTimed out after {timeout}s".strip()
+    return returncode, message
+
+
+def run_ffmpeg(
+    cmd, on_progress=None, should_abort=None, on_stderr=None, on_usage=None, timeout=None
+):
+    """
+    Runs an ffmpeg command that was built with `-progress pipe:1`.
+
+    stdout (progress blocks) and stderr are drained as data arrives, so
+    neither pipe can fill up and stall the encoder. The calling thread only
+    waits for the result.
+
+    Parameters:
+        cmd (list): Full argv, starting with the ffmpeg binary.
+        on_progress (callable): Called with each raw progress block (dict).
+        should_abort (callable): Called with each raw progress block; if it
+            returns True, ffmpeg is terminated.
+        on_stderr (callable): Called with every stderr line, for output that
+            must not be cut to the tail (e.g. per-frame filter logs).
+        on_usage (callable): Called once ffmpeg has exited with its CPU time
+            and peak RSS (see core.metrics.usage_fields()), where the
+            platform reports them.
+        timeout (float): Seconds after which ffmpeg is stopped (None: no limit).
+
+    Returns:
+        tuple: (returncode, stderr_tail) where stderr_tail is a str. After
+        cancel(), nothing is started and (1, "Cancelled") is returned; a run
+        that hit `timeout` ends its tail with "Timed out after ...".
+    """
+    if _cancelled.is_set():
+        return 1, "Cancelled"
+    future = asyncio.run_coroutine_threadsafe(
+        run_async(cmd, on_progress, should_abort, on_stderr, on_usage, timeout), event_loop()
+    )
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
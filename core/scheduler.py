@@ -0,0 +1,159 @@
+"""
+Resource scheduler that budgets CPU threads and GPU encode sessions separately.
+
+A CPU job (libx264/libx265) is limited by cores, while a GPU job (NVENC, AMF,
+QSV...) is limited by the number of hardware sessions and only needs a couple
+of CPU threads for decoding and muxing. Tracking both budgets lets CPU and GPU
+jobs run side by side instead of sharing one global worker count.
+"""
+
+import contextlib
+import threading
+
+from config.settings import (
+    CPU_THREAD_BUDGET,
+    GPU_JOB_THREADS,
+    GPU_SESSION_LIMIT,
+    THREADS_PER_JOB,
+)
+
+# A CPU job is never started with fewer threads than this.
+MIN_JOB_THREADS = 2
+
+
+class Slot:
+    """Resources granted to one running job."""
+
+    def __init__(self, gpu, threads, sessions=None):
+        self.gpu = gpu
+        self.threads = threads
+        # Hardware encode sessions held (one per encoder of a multi-rendition job).
+        self.sessions = (1 if gpu else 0) if sessions is None else sessions
+
+    def __repr__(self):
+        kind = "gpu" if self.gpu else "cpu"
+        return f"Slot({kind}, threads={self.threads})"
+
+
+class ResourceScheduler:
+    """
+    Hands out CPU threads and GPU sessions to jobs, blocking until enough is free.
+    """
+
+    def __init__(
+        self,
+        cpu_threads=CPU_THREAD_BUDGET,
+        gpu_sessions=GPU_SESSION_LIMIT,
+        threads_per_job=THREADS_PER_JOB,
+        gpu_job_threads=GPU_JOB_THREADS,
+    ):
+        self.cpu_threads = max(1, cpu_threads)
+        self.gpu_sessions = max(0, gpu_sessions)
+        self.threads_per_job = max(1, threads_per_job)
+        self.gpu_job_threads = max(0, min(gpu_job_threads, self.cpu_threads))
+        self.min_threads = min(MIN_JOB_THREADS, self.threads_per_job, self.cpu_threads)
+
+        self.free_threads = self.cpu_threads
+        self.free_sessions = self.gpu_sessions
+        # Caps on concurrent jobs below what the budget allows (None = no cap),
+        # set by core.autoscale while the machine is busy with other work.
+        self.cpu_job_limit = None
+        self.gpu_job_limit = None
+        self.running = {False: 0, True: 0}
+        self.waiting = {False: 0, True: 0}
+        self._cond = threading.Condition()
+
+    def max_jobs(self, gpu=None):
+        """
+        Returns the largest number of jobs that can run at once.
+
+        `gpu=True`/`False` limits the answer to one kind of job; `None` counts both,
+        which is the right size for a worker pool shared by CPU and GPU jobs.
+        """
+        cpu_jobs = max(1, self.cpu_threads // self.threads_per_job)
+        gpu_jobs = self.gpu_sessions
+        if self.gpu_job_threads:
+            gpu_jobs = min(gpu_jobs, self.cpu_threads // self.gpu_job_threads)
+
+        if gpu is True:
+            return max(1, gpu_jobs)
+        if gpu is False:
+            return cpu_jobs
+        return cpu_jobs + gpu_jobs
+
+    def max_cpu_jobs(self):
+        """Most CPU jobs the thread budget can hold, each with the minimum thread count."""
+        return max(1, self.cpu_threads // max(1, self.min_threads))
+
+    def set_limits(self, cpu_jobs=None, gpu_jobs=None):
+        """
+        Caps the number of concurrent CPU and GPU jobs. Running jobs are not
+        interrupted; a lower cap takes effect as they finish.
+        """
+        with self._cond:
+            self.cpu_job_limit = cpu_jobs
+            self.gpu_job_limit = gpu_jobs
+            self._cond.notify_all()
+
+    def _at_limit(self, gpu):
+        limit = self.gpu_job_limit if gpu else self.cpu_job_limit
+        return limit is not None and self.running[gpu] >= limit
+
+    def _try_acquire(self, gpu, count=1):
+        if self._at_limit(gpu):
+            return None
+        if gpu:
+            if self.free_sessions < count or self.free_threads < self.gpu_job_threads:
+                return None
+            self.free_sessions -= count
+            self.free_threads -= self.gpu_job_threads
+            return Slot(True, self.gpu_job_threads, sessions=count)
+
+        if self.free_threads < self.min_threads * count:
+            return None
+        threads = min(self.threads_per_job * count, self.free_threads)
+        self.free_threads -= threads
+        return Slot(False, threads)
+
+    def acquire(self, gpu=False, count=1):
+        """
+        Blocks until resources for one job are free and returns its Slot.
+
+        A CPU job running `count` encoders at once (see core.renditions) gets
+        the threads of `count` jobs in one slot, as far as the budget goes. A
+        GPU job running `count` hardware encoders holds a session for each
+        (at most the whole session budget).
+        """
+        if gpu and self.gpu_sessions < 1:
+            raise ValueError("GPU job requested but the GPU session budget is 0.")
+        limit = self.gpu_sessions if gpu else self.max_cpu_jobs()
+        count = max(1, min(count, limit))
+
+        with self._cond:
+            self.waiting[gpu] += 1
+            try:
+                while True:
+                    slot = self._try_acquire(gpu, count)
+                    if slot:
+                        self.running[gpu] += 1
+                        return slot
+                    self._cond.wait()
+            finally:
+                self.waiting[gpu] -= 1
+
+    def release(self, slot):
+        """Returns the resources of a finished job to the budget."""
+        with self._cond:
+            self.free_threads += slot.threads
+            self.running[slot.gpu] -= 1
+            self.free_sessions += slot.sessions
+            self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def reserve(self, gpu=False, count=1):
+        """Context manager wrapping acquire()/release()."""
+        slot = self.acquire(gpu, count)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
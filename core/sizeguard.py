@@ -0,0 +1,61 @@
+"""
+Size-regression guard for running encodes.
+
+Some sources are already efficient, and re-encoding them under a high-quality
+preset produces a *bigger* file. A preset's `max_size_ratio` caps the output
+size relative to the input. While ffmpeg runs, the guard projects the final
+size from the bytes written so far and the position in the timeline, so a
+losing encode is stopped early instead of finishing first.
+"""
+
+from core.progress import normalize_stats
+
+# Don't judge before this fraction of the input (or MIN_SECONDS of media) is encoded;
+# the first seconds are dominated by the initial keyframe and muxer headers.
+MIN_FRACTION = 0.1
+MIN_SECONDS = 20.0
+
+# Slack on early projections, since bitrate varies across a file.
+TOLERANCE = 0.15
+
+
+class SizeGuard:
+    """
+    Tracks one encode against its size budget.
+
+    Parameters:
+        input_size (int): Source size in bytes.
+        duration (float): Source duration in seconds (None disables projection).
+        max_ratio (float): Largest allowed output/input size ratio.
+    """
+
+    def __init__(self, input_size, duration, max_ratio):
+        self.limit = input_size * max_ratio
+        self.duration = duration
+        self.tripped = False
+        self.projected = None
+
+    def check(self, raw):
+        """
+        Feeds one raw ffmpeg progress block. Returns True when the encode
+        should be aborted because it is projected to exceed the budget.
+        """
+        if self.tripped:
+            return True
+        if not self.duration:
+            return False
+
+        stats = normalize_stats(raw, self.duration)
+        out_time, written = stats["out_time"], stats["total_size"]
+        warmup = max(MIN_FRACTION * self.duration, min(MIN_SECONDS, self.duration / 2))
+        if not written or out_time < warmup:
+            return False
+
+        self.projected = written * self.duration / out_time
+        if self.projected > self.limit * (1 + TOLERANCE) or written > self.limit:
+            self.tripped = True
+        return self.tripped
+
+    def exceeds(self, output_size):
+        """Final check once the encode has finished."""
+        return output_size > self.limit
@@ -0,0 +1,212 @@
+"""
+Static-slide detection for lecture recordings.
+
+Screen recordings of slides repeat the same picture for seconds or minutes,
+yet a constant-frame-rate encode still pushes all 30 frames per second
+through the encoder. For presets with `slide_detection`, a cheap analysis pass
+(reference frames only, 4 fps, 320 px wide, `mpdecimate`) finds the frames
+where the picture changes. If enough of the timeline is static, the file is
+encoded with duplicate frames dropped (`mpdecimate`, variable frame rate) and
+a keyframe at every slide change, so the encoder only sees the frames that
+matter and seeking lands on slide boundaries.
+
+Analysis results are cached per source fingerprint. `main.py --benchmark`
+reports the speed and size gained over the plain constant-frame-rate encode.
+"""
+
+import copy
+import json
+import os
+import threading
+
+from config.settings import CACHE_DIR, FFMPEG_EXE
+from core.manifest import fingerprint
+from core.preset_schema import compile_preset
+from core.runner import run_ffmpeg
+
+CACHE_FILE = "slides.json"
+# Bump when the analysis changes, so cached results are recomputed.
+ANALYSIS_VERSION = 1
+
+ANALYSIS_FPS = 4
+ANALYSIS_WIDTH = 320
+# A picture unchanged for at least this long counts as a static span.
+MIN_STATIC_SECONDS = 2.0
+# Files with less static time than this are encoded normally.
+MIN_STATIC_RATIO = 0.3
+# Even on a frozen slide one frame is kept every this many seconds, so players
+# and the last slide of a file without audio keep their full duration.
+MAX_HOLD_SECONDS = 2.0
+# Upper bound on forced keyframes (the list goes on the command line).
+MAX_KEYFRAMES = 2000
+
+FILTER_FLAGS = ("-vf", "-filter:v")
+
+
+def analysis_command(input_path):
+    """ffmpeg command printing one showinfo line per frame that differs from the last kept one."""
+    return [
+        FFMPEG_EXE,
+        "-hide_banner",
+        "-nostats",
+        "-skip_frame",
+        "noref",
+        "-i",
+        input_path,
+        "-map",
+        "0:v:0",
+        "-vf",
+        f"fps={ANALYSIS_FPS},scale={ANALYSIS_WIDTH}:-2,mpdecimate,showinfo",
+        "-f",
+        "null",
+        "-",
+    ]
+
+
+def parse_change(line):
+    """Returns the pts_time of a showinfo line, or None for any other line."""
+    if "Parsed_showinfo" not in line or "pts_time:" not in line:
+        return None
+    try:
+        return float(line.split("pts_time:", 1)[1].split()[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def summarize(changed, duration):
+    """
+    Turns the times of changed frames into the analysis result.
+
+    Returns:
+        dict: static_seconds, static_ratio, and `changes`: the times where a
+        new picture appears after a static span (the slide changes).
+    """
+    if not duration or not changed:
+        return {"static_seconds": 0.0, "static_ratio": 0.0, "changes": []}
+    bounds = sorted(changed) + [duration]
+    static = 0.0
+    changes = []
+    for previous, current in zip(bounds, bounds[1:]):
+        gap = current - previous
+        if gap >= MIN_STATIC_SECONDS:
+            static += gap
+            if current < duration:
+                changes.append(round(current, 3))
+    return {
+        "static_seconds": round(static, 3),
+        "static_ratio": round(min(1.0, static / duration), 3),
+        "changes": changes,
+    }
+
+
+def analyze(input_path, duration):
+    """Runs the analysis pass. Returns the summarize() dict, or None if ffmpeg failed."""
+    changed = []
+
+    def on_line(line):
+        time = parse_change(line)
+        if time is not None:
+            changed.append(time)
+
+    returncode, _ = run_ffmpeg(analysis_command(input_path), on_stderr=on_line)
+    if returncode != 0:
+        return None
+    return summarize(changed, duration)
+
+
+class SlideCache:
+    """Analysis results keyed by source fingerprint."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, CACHE_FILE)
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(input_path):
+        return f"{fingerprint(input_path)}|v{ANALYSIS_VERSION}"
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                pass
+
+
+def decimated_preset(preset, analysis, fps=None):
+    """
+    Returns a copy of `preset` that drops duplicate frames, writes variable
+    frame rate and forces keyframes at the slide changes of `analysis`.
+    """
+    hold = max(1, round((fps or 30) * MAX_HOLD_SECONDS))
+    decimate = f"mpdecimate=max={hold}"
+    variant = copy.deepcopy(preset)
+    variant.pop("compiled", None)
+
+    # Frames are dropped before the preset's own filters (e.g. scaling) run.
+    for key in ("video_params", "cpu_fallback"):
+        params = variant.get(key, [])
+        for i, arg in enumerate(params[:-1]):
+            if arg in FILTER_FLAGS:
+                params[i + 1] = f"{decimate},{params[i + 1]}"
+                break
+        else:
+            continue
+        break
+    else:
+        variant["video_params"] = ["-vf", decimate] + variant.get("video_params", [])
+
+    variant["video_params"] = variant["video_params"] + ["-fps_mode", "vfr"]
+    changes = analysis["changes"][:MAX_KEYFRAMES]
+    if changes:
+        times = ",".join(f"{t:g}" for t in changes)
+        variant["video_params"] += ["-force_key_frames", times]
+    # Only a fraction of the frames is encoded, so splitting into segments isn't worth it
+    # (and forced keyframe times would not line up with the segments).
+    variant["chunk_threshold"] = 0
+    variant["slides"] = analysis
+    return compile_preset(variant)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def tune_preset(input_path, info, preset):
+    """
+    Returns the decimated variant of `preset` when it has `slide_detection`
+    and the source is mostly static, otherwise `preset` unchanged.
+    """
+    global _cache
+    duration = info["duration"] if info else None
+    if not preset.get("slide_detection") or not duration:
+        return preset
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = SlideCache()
+    key = SlideCache.key(input_path)
+    analysis = _cache.get(key)
+    if analysis is None:
+        analysis = analyze(input_path, duration)
+        if analysis is None:
+            return preset
+        _cache.put(key, analysis)
+
+    if analysis["static_ratio"] < MIN_STATIC_RATIO:
+        return preset
+    fps = info["video"].get("fps") if info.get("video") else None
+    return decimated_preset(preset, analysis, fps)
@@ -0,0 +1,319 @@
+"""
+Local scratch staging for sources and outputs on network shares.
+
+When ffmpeg reads an SMB/NFS source directly, every seek (an MP4 with its
+index at the end, say) is a network round trip, and several workers doing so
+at once stall each other. With a Stager:
+
+- inputs the pipeline is about to encode are prefetched into a local scratch
+  folder with large sequential reads, ahead of the encode queue;
+- the encode reads the local copy and writes its output to scratch too;
+- finished outputs are uploaded in the background (under a partial name,
+  published atomically, see core.atomic), so the next encode does not wait
+  for the network.
+
+Staged inputs are an LRU cache with a byte budget: entries a queued or
+running job still needs are never evicted, and a file that does not fit is
+simply read from the share. A prefetched input whose task never runs is
+released by the pipeline, or its claim expires after PREFETCH_TTL_SECONDS.
+Prefetches and uploads share one bandwidth limit, so staging never takes the
+whole link from jobs still reading remotely.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from tqdm import tqdm
+
+from core.atomic import discard, partial_path, publish
+from core.jobqueue import CLAIM_LOST
+from core.runner import cancelled
+
+STAGE_PREFIX = "mvc-stage-"
+# Reads and writes of this size keep network I/O sequential.
+COPY_CHUNK_BYTES = 8 * 1024 * 1024
+# How long a prefetched input is kept for a task that never asks for it.
+PREFETCH_TTL_SECONDS = 3600
+
+
+class RateLimiter:
+    """Token bucket shared by every copy; `bytes_per_second` None means unlimited."""
+
+    def __init__(self, bytes_per_second=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = bytes_per_second
+        self.clock = clock
+        self.sleep = sleep
+        self._available = float(bytes_per_second or 0)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, nbytes):
+        """Blocks until `nbytes` may be transferred."""
+        if not self.rate:
+            return
+        with self._lock:
+            now = self.clock()
+            # At most one second of burst.
+            self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= nbytes
+            wait = -self._available / self.rate if self._available < 0 else 0.0
+        if wait:
+            self.sleep(wait)
+
+
+def copy_file(src, dst, limiter=None, chunk=COPY_CHUNK_BYTES):
+    """
+    Copies `src` to `dst` in large sequential chunks, paced by `limiter`.
+
+    Returns:
+        bool: False if the run was cancelled midway (dst is then removed).
+    """
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        while True:
+            if cancelled():
+                break
+            data = fin.read(chunk)
+            if not data:
+                return True
+            if limiter:
+                limiter.consume(len(data))
+            fout.write(data)
+    discard(dst)
+    return False
+
+
+class _Entry:
+    def __init__(self, local, size, mtime_ns):
+        self.local = local
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.pins = 0
+        # Prefetched but not used yet: protected from eviction like a pinned
+        # entry until this deadline (None: not wanted).
+        self.wanted_until = None
+        self.ok = False
+        self.started = False
+        self.ready = threading.Event()
+
+
+class Stager:
+    """
+    Stages inputs and outputs of one run in `scratch_dir`.
+
+    Parameters:
+        scratch_dir (str): Local folder (a per-run subfolder is created in it).
+        budget_bytes (int): Most bytes of staged inputs kept at once.
+        bytes_per_second (int): Bandwidth limit for prefetches and uploads
+            together (None: unlimited).
+        prefetch_ttl (float): Seconds a prefetched input stays protected from
+            eviction while no task acquires it.
+        claims (Claims): On a queue worker, names upload partials after the
+            worker and publishes only while it holds the ticket (see
+            core.jobqueue).
+    """
+
+    def __init__(
+        self,
+        scratch_dir,
+        budget_bytes,
+        bytes_per_second=None,
+        prefetch_ttl=PREFETCH_TTL_SECONDS,
+        clock=time.monotonic,
+        claims=None,
+    ):
+        os.makedirs(scratch_dir, exist_ok=True)
+        clean_stale(scratch_dir)
+        self.root = tempfile.mkdtemp(prefix=f"{STAGE_PREFIX}{os.getpid()}-", dir=scratch_dir)
+        self.budget = budget_bytes
+        self.limiter = RateLimiter(bytes_per_second)
+        self.prefetch_ttl = prefetch_ttl
+        self.clock = clock
+        self.claims = claims
+        self.entries = collections.OrderedDict()  # source path -> _Entry, oldest first
+        self._lock = threading.Lock()
+        self._prefetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._upload_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        for folder in ("in", "out"):
+            os.makedirs(os.path.join(self.root, folder))
+
+    def used_bytes(self):
+        with self._lock:
+            return sum(e.size for e in self.entries.values())
+
+    def _local_name(self, path, folder):
+        digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+        return os.path.join(self.root, folder, f"{digest}_{os.path.basename(path)}")
+
+    def _evict_for(self, size):
+        """Drops idle entries, least recently used first, until `size` fits. Lock held."""
+        used = sum(e.size for e in self.entries.values())
+        now = self.clock()
+        for path in list(self.entries):
+            if used + size <= self.budget:
+                break
+            entry = self.entries[path]
+            wanted = entry.wanted_until is not None and entry.wanted_until > now
+            if entry.pins or wanted or not entry.ready.is_set():
+                continue
+            del self.entries[path]
+            discard(entry.local)
+            used -= entry.size
+        return used + size <= self.budget
+
+    def _claim(self, path, wanted):
+        """
+        Returns (entry, new) for `path`, or (None, False) if it can't be staged.
+        A stale entry (the source changed) is replaced. Lock held; failed
+        copies have already left self.entries.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None, False
+        entry = self.entries.get(path)
+        if entry and (entry.size, entry.mtime_ns) == (st.st_size, st.st_mtime_ns):
+            self.entries.move_to_end(path)
+            if wanted:
+                entry.wanted_until = self.clock() + self.prefetch_ttl
+            return entry, False
+        if entry and not entry.pins:
+            del self.entries[path]
+            discard(entry.local)
+        elif entry:
+            return None, False
+        if not self._evict_for(st.st_size):
+            return None, False
+        entry = _Entry(self._local_name(path, "in"), st.st_size, st.st_mtime_ns)
+        if wanted:
+            entry.wanted_until = self.clock() + self.prefetch_ttl
+        self.entries[path] = entry
+        return entry, True
+
+    def _fetch(self, path, entry):
+        # A job that needs the file before the prefetch pool got to it copies it
+        # itself, so whichever thread comes first does the work.
+        with self._lock:
+            if entry.started:
+                return
+            entry.started = True
+        try:
+            entry.ok = copy_file(path, entry.local, self.limiter)
+        except OSError as e:
+            tqdm.write(f"⚠ STAGING FAILED: {os.path.basename(path)} -> {e}")
+            discard(entry.local)
+        finally:
+            if not entry.ok:
+                with self._lock:
+                    if self.entries.get(path) is entry:
+                        del self.entries[path]
+            entry.ready.set()
+
+    def prefetch(self, path):
+        """Starts copying `path` to scratch in the background if the budget has room."""
+        with self._lock:
+            entry, new = self._claim(path, wanted=True)
+        if new:
+            self._prefetch_pool.submit(self._fetch, path, entry)
+
+    def release(self, path):
+        """Drops the prefetch claim on `path` (its task won't run); the copy becomes evictable."""
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry:
+                entry.wanted_until = None
+
+    @contextlib.contextmanager
+    def acquire(self, path):
+        """
+        Yields the local copy of `path` (copying it now if it wasn't
+        prefetched), or `path` itself if it can't be staged. The copy stays
+        in the cache afterwards, e.g. for a retry on another encoder.
+        """
+        with self._lock:
+            entry, _ = self._claim(path, wanted=False)
+            if entry:
+                entry.pins += 1
+                entry.wanted_until = None
+        if not entry:
+            yield path
+            return
+        try:
+            self._fetch(path, entry)
+            entry.ready.wait()
+            yield entry.local if entry.ok else path
+        finally:
+            with self._lock:
+                entry.pins -= 1
+
+    def output_path(self, output_path):
+        """Where the encode writes instead of `output_path` (see upload())."""
+        return self._local_name(output_path, "out")
+
+    def _upload(self, local, output_path):
+        claims = self.claims
+        remote = claims.partial_path(output_path) if claims else partial_path(output_path)
+        try:
+            if copy_file(local, remote, self.limiter):
+                if claims and not claims.holds(output_path):
+                    return False, CLAIM_LOST
+                publish(remote, output_path)
+                return True, None
+            return False, "Cancelled"
+        except OSError as e:
+            return False, f"Upload failed: {e}"
+        finally:
+            discard(remote)
+            discard(local)
+
+    def upload(self, local, output_path, then=None):
+        """
+        Copies a finished local output to `output_path` in the background.
+
+        Returns:
+            Future: resolves to (ok, error message or None), or to
+            then(ok, error) if `then` is given (called on the upload thread).
+        """
+
+        def run():
+            result = self._upload(local, output_path)
+            return then(*result) if then else result
+
+        return self._upload_pool.submit(run)
+
+    def close(self):
+        """Waits for pending uploads and removes the scratch folder."""
+        self._prefetch_pool.shutdown(wait=True, cancel_futures=True)
+        self._upload_pool.shutdown(wait=True)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+def _alive(pid):
+    if os.name == "nt":
+        return True  # no cheap check; leave it for the owner to remove
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def clean_stale(scratch_dir):
+    """Removes scratch folders of runs whose process is gone. Returns how many."""
+    removed = 0
+    for name in os.listdir(scratch_dir):
+        pid = name[len(STAGE_PREFIX) :].split("-")[0]
+        if not name.startswith(STAGE_PREFIX) or not pid.isdigit() or _alive(int(pid)):
+            continue
+        shutil.rmtree(os.path.join(scratch_dir, name), ignore_errors=True)
+        removed += 1
+    return removed
@@ -0,0 +1,246 @@
+"""
+Watch-folder mode.
+
+Source folders are rescanned with core.discovery on a fixed interval. On Linux,
+inotify (through libc, no extra dependency) wakes the scanner as soon as
+something is written or moved into a watched folder; elsewhere the interval
+alone drives it. A file is only handed on once its size and mtime have stayed
+the same for a settle period, so half-copied camera offloads are not encoded.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import threading
+import time
+
+from config.settings import WATCH_POLL_SECONDS, WATCH_SETTLE_SECONDS
+from core.discovery import VIDEO_EXTENSIONS, discover
+
+# inotify event masks (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# Coalesce bursts of events (e.g. a whole offload landing) into one rescan.
+MIN_RESCAN_SECONDS = 1.0
+
+
+class StabilityTracker:
+    """
+    Remembers when each file last changed and reports files that have been
+    quiet for `settle` seconds. Each (path, size, mtime) is reported once, so a
+    file that is later replaced or rewritten is reported again.
+    """
+
+    def __init__(self, settle=WATCH_SETTLE_SECONDS, clock=time.monotonic):
+        self.settle = settle
+        self.clock = clock
+        self._pending = {}  # key -> (size, mtime_ns, quiet_since)
+        self._reported = {}  # key -> (size, mtime_ns)
+
+    def observe(self, path, size, mtime_ns):
+        """
+        Returns True the first time `path` (any hashable key) is found settled
+        in its current state.
+        """
+        now = self.clock()
+        state = (size, mtime_ns)
+        if self._reported.get(path) == state:
+            return False
+
+        pending = self._pending.get(path)
+        if not pending or pending[:2] != state:
+            self._pending[path] = (size, mtime_ns, now)
+            if self.settle > 0:
+                return False
+        elif now - pending[2] < self.settle:
+            return False
+
+        del self._pending[path]
+        self._reported[path] = state
+        return True
+
+    def forget_missing(self, seen):
+        """Drops state for files that disappeared (moved away or deleted)."""
+        for path in [p for p in self._pending if p not in seen]:
+            del self._pending[path]
+        for path in [p for p in self._reported if p not in seen]:
+            del self._reported[path]
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+
+class PollWaker:
+    """Sleeps until the next rescan. Used where inotify is unavailable."""
+
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+
+    def watch(self, folder):
+        pass
+
+    def wait(self, timeout):
+        self.stop_event.wait(timeout)
+        return False
+
+    def close(self):
+        pass
+
+
+class InotifyWaker:
+    """
+    Wakes the scanner early when a watched folder receives a new or
+    finished file. Raises OSError if inotify cannot be initialised.
+    """
+
+    def __init__(self, stop_event, libc=None):
+        self.stop_event = stop_event
+        self._libc = libc or _load_libc()
+        if self._libc is None:
+            raise OSError("inotify is not available")
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched = set()
+
+    def watch(self, folder):
+        if folder in self._watched:
+            return
+        # Failures (e.g. the per-user watch limit) just fall back to polling that folder.
+        if self._libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK) >= 0:
+            self._watched.add(folder)
+
+    def wait(self, timeout):
+        """Returns True if an event arrived before `timeout` (or a stop request)."""
+        deadline = time.monotonic() + timeout
+        while not self.stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            # Short select slices keep stop requests responsive.
+            ready, _, _ = select.select([self.fd], [], [], min(remaining, 0.5))
+            if ready:
+                self._drain()
+                return True
+        return False
+
+    def _drain(self):
+        while True:
+            try:
+                if not os.read(self.fd, 64 * 1024):
+                    return
+            except BlockingIOError:
+                return
+            except OSError:
+                return
+
+    def close(self):
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def make_waker(stop_event, use_inotify=True):
+    """Returns an InotifyWaker when possible, otherwise a PollWaker."""
+    if use_inotify:
+        try:
+            return InotifyWaker(stop_event)
+        except OSError:
+            pass
+    return PollWaker(stop_event)
+
+
+class FolderWatcher:
+    """
+    Repeatedly scans `folders` and calls `on_ready(index, path, rel_path)`
+    for every video that has settled, where `index` is the position of its
+    folder in `folders` (the same folder may be listed more than once).
+
+    Parameters:
+        folders (list): Source folders to watch, either paths or
+            (path, extensions, recursive) tuples as for core.discovery.discover().
+        exclude (tuple): Folders to skip (e.g. output folders).
+        settle (float): Seconds a file must stay unchanged before it is ready.
+        interval (float): Seconds between rescans without inotify events.
+        stop_event (threading.Event): Optional external stop signal.
+    """
+
+    def __init__(
+        self,
+        folders,
+        exclude=(),
+        settle=WATCH_SETTLE_SECONDS,
+        interval=WATCH_POLL_SECONDS,
+        use_inotify=True,
+        stop_event=None,
+    ):
+        self.folders = [
+            (f, VIDEO_EXTENSIONS, True) if isinstance(f, (str, os.PathLike)) else tuple(f)
+            for f in folders
+        ]
+        self.exclude = exclude
+        self.interval = interval
+        self.tracker = StabilityTracker(settle)
+        self.stop_event = stop_event or threading.Event()
+        self.waker = make_waker(self.stop_event, use_inotify)
+
+    def scan(self, on_ready):
+        """Runs one pass over every folder. Returns the number of files handed on."""
+        ready = 0
+        seen = set()
+        for index, (folder, extensions, recursive) in enumerate(self.folders):
+            self.waker.watch(os.path.abspath(folder))
+            for path, rel_path in discover(
+                folder, extensions, recursive=recursive, exclude=self.exclude
+            ):
+                self.waker.watch(os.path.dirname(path))
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                key = (index, path)
+                seen.add(key)
+                if self.tracker.observe(key, st.st_size, st.st_mtime_ns):
+                    on_ready(index, path, rel_path)
+                    ready += 1
+        self.tracker.forget_missing(seen)
+        return ready
+
+    def run(self, on_ready):
+        """Scans until stop() is called."""
+        try:
+            while not self.stop_event.is_set():
+                started = time.monotonic()
+                self.scan(on_ready)
+                # Files still settling need a rescan even without new events.
+                timeout = self.interval
+                if self.tracker.pending:
+                    timeout = min(timeout, max(self.tracker.settle / 2, MIN_RESCAN_SECONDS))
+                if self.waker.wait(timeout):
+                    self.stop_event.wait(
+                        max(0.0, MIN_RESCAN_SECONDS - (time.monotonic() - started))
+                    )
+        finally:
+            self.waker.close()
+
+    def stop(self):
+        self.stop_event.set()
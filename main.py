@@ -1,13 +1,60 @@
+import argparse
 import concurrent.futures
+import glob
+import json
 import os
+import signal
 import sys
+import threading
+import time
 
 from tqdm import tqdm
 
-from config.presets import PRESETS
-from config.settings import DEFAULT_WORKERS
-from core.hardware import detect_gpu_codec
-from core.processor import process_file
+from config.presets import PRESETS, load_user_presets
+from config.settings import (
+    QUEUE_POLL_SECONDS,
+    STAGE_BANDWIDTH_MBPS,
+    STAGE_BUDGET_GB,
+    STAGE_DIR,
+    WATCH_SETTLE_SECONDS,
+    WORKER_TIMEOUT_SECONDS,
+)
+from core.atomic import clean_orphans
+from core.autoscale import Autoscaler
+from core.benchmark import CLIPS, DEFAULT_CLIP_SECONDS, compare, run_benchmark
+from core.dedup import Deduper
+from core.discovery import VIDEO_EXTENSIONS, discover, output_path_for
+from core.hardware import detect_gpu_codec, detect_hw_pipeline, preset_codec_family
+from core.jobqueue import Claims, JobQueue, LivenessTracker, ticket_id, worker_name
+from core.jobs import (
+    PRESET_OPTION_KEYS,
+    JobFileError,
+    job_preset,
+    load_job_file,
+    make_job,
+    parse_preset_ids,
+    path_selected,
+)
+from core.manifest import Manifest
+from core.metrics import METRICS_NAME, MetricsRecorder, format_summary
+from core.ordering import ThroughputHistory
+from core.pipeline import PROBE_WORKERS, Pipeline
+from core.preset_schema import PresetError
+from core.processor import resolve_encoder
+from core.progress import TELEMETRY_NAME, BatchProgress
+from core.quality import available_metrics
+from core.renditions import group_preset, rendition_outputs
+from core.runner import cancel
+from core.scheduler import ResourceScheduler
+from core.staging import Stager
+from core.watch import FolderWatcher
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+BENCHMARK_REPORT = "mvc-benchmark.json"
 
 
 def clean_path(path_str):
@@ -27,69 +74,1123 @@ def select_preset():
 
     # Create a dynamic prompt string (e.g., "1/2/3/4/5")
     options_str = "/".join(sorted_keys)
-    choice = input(f"\nEnter choice ({options_str}): ").strip()
+    choice = input(f"\nEnter choice ({options_str}, or several e.g. 5,4,3): ").strip()
 
-    return PRESETS.get(choice)
+    ids = [c.strip() for c in choice.split(",") if c.strip()]
+    return choice if ids and all(c in PRESETS for c in ids) else None
 
 
-def main():
-    print("==========================================")
-    print("      MASS VIDEO COMPRESSOR (MVC)         ")
-    print("==========================================\n")
+def parse_extensions(value):
+    """Turns 'mp4, .MOV,mkv' into ('.mp4', '.mov', '.mkv')."""
+    exts = [e.strip().lower() for e in value.split(",") if e.strip()]
+    return tuple(e if e.startswith(".") else "." + e for e in exts)
 
-    preset = select_preset()
-    if not preset:
-        print("Invalid selection. Exiting.")
-        return
 
-    print("\n(Tip: Drag and drop folders into this window)")
-    source_folder = clean_path(input("Source Folder: "))
-    dest_folder = clean_path(input("Output Folder: "))
+def parse_clips(value):
+    clips = tuple(c.strip() for c in value.split(",") if c.strip())
+    unknown = [c for c in clips if c not in CLIPS]
+    if unknown or not clips:
+        raise argparse.ArgumentTypeError(
+            f"unknown clip(s) {', '.join(unknown) or value!r}; choose from {', '.join(CLIPS)}"
+        )
+    return clips
 
-    if not os.path.exists(source_folder):
-        print(f"Error: Source folder does not exist: {source_folder}")
-        return
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mass Video Compressor (MVC)")
+    parser.add_argument(
+        "--job",
+        metavar="FILE",
+        help="Run the preset/folder pairs listed in a TOML or JSON job file (no prompts).",
+    )
+    parser.add_argument(
+        "--preset",
+        help="Preset id to use (skips the prompt). Several ids (e.g. 5,4,3) write one "
+        "output per preset from a single decode.",
+    )
+    parser.add_argument(
+        "--presets",
+        metavar="FILE",
+        help="Load extra presets from a TOML/JSON file "
+        "(default: ~/.config/mvc/presets.toml if it exists).",
+    )
+    parser.add_argument("--source", help="Source folder (skips the prompt).")
+    parser.add_argument("--dest", help="Output folder (skips the prompt).")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of parallel jobs (default: derived from the CPU/GPU budget).",
+    )
+    parser.add_argument(
+        "--autoscale",
+        action="store_true",
+        help="Adjust the number of running jobs to the system load (CPU, memory, I/O, "
+        "GPU encoder) instead of fixing it at startup; --workers then caps the CPU jobs.",
+    )
+    parser.add_argument(
+        "--prometheus",
+        metavar="[HOST:]PORT|FILE",
+        help="Export per-job metrics in the Prometheus text format: serve them at "
+        "http://HOST:PORT/metrics (HOST defaults to 127.0.0.1; use 0.0.0.0 to allow remote "
+        "scrapes), or rewrite FILE (e.g. for node_exporter) after every job.",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Encode byte-identical source files once per job and hardlink (or reflink, "
+        "or copy) the output to the duplicates' output names.",
+    )
+    parser.add_argument(
+        "--stage-dir",
+        metavar="DIR",
+        default=STAGE_DIR,
+        help="Local scratch folder: inputs are prefetched there ahead of the encode queue "
+        "and outputs uploaded from there in the background (for sources and outputs on "
+        "network shares).",
+    )
+    parser.add_argument(
+        "--stage-budget",
+        type=int,
+        default=STAGE_BUDGET_GB,
+        metavar="GB",
+        help=f"Most GB of prefetched inputs kept in --stage-dir (default: {STAGE_BUDGET_GB}).",
+    )
+    parser.add_argument(
+        "--stage-bandwidth",
+        type=int,
+        default=STAGE_BANDWIDTH_MBPS,
+        metavar="MBPS",
+        help="Bandwidth limit in MB/s for copies to and from the shares (default: unlimited).",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and compress new files as they land in the source folder(s).",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help=f"In --watch mode, how long a file must stop changing before it is queued "
+        f"(default: {WATCH_SETTLE_SECONDS}).",
+    )
+    parser.add_argument(
+        "--coordinator",
+        metavar="QUEUE_DIR",
+        help="Distributed mode: discover files and queue them in QUEUE_DIR (on shared "
+        "storage) for --worker processes instead of encoding here.",
+    )
+    parser.add_argument(
+        "--worker",
+        metavar="QUEUE_DIR",
+        help="Distributed mode: encode files queued in QUEUE_DIR by a --coordinator.",
+    )
+    parser.add_argument(
+        "--benchmark",
+        nargs="?",
+        const=BENCHMARK_REPORT,
+        metavar="REPORT",
+        help="Measure the presets on synthetic clips, write a JSON report (default: "
+        f"{BENCHMARK_REPORT}) and propose a worker/thread layout for this machine. "
+        "Limit it with --preset.",
+    )
+    parser.add_argument(
+        "--bench-clips",
+        type=parse_clips,
+        default=tuple(CLIPS),
+        help=f"Benchmark clips to use (default: {','.join(CLIPS)}).",
+    )
+    parser.add_argument(
+        "--bench-seconds",
+        type=int,
+        default=DEFAULT_CLIP_SECONDS,
+        metavar="SECONDS",
+        help=f"Length of each benchmark clip (default: {DEFAULT_CLIP_SECONDS}).",
+    )
+    parser.add_argument(
+        "--bench-baseline",
+        metavar="REPORT",
+        help="Compare the benchmark with an earlier report and fail on regressions.",
+    )
+    parser.add_argument(
+        "--summary",
+        metavar="PATH",
+        help="Write a JSON summary of the run to PATH ('-' for stdout).",
+    )
+    parser.add_argument(
+        "--refresh-hardware",
+        action="store_true",
+        help="Ignore the cached GPU encoder probe and detect hardware again.",
+    )
+    parser.add_argument(
+        "--extensions",
+        type=parse_extensions,
+        default=VIDEO_EXTENSIONS,
+        help="Comma-separated video extensions to pick up (e.g. mp4,mov,mkv).",
+    )
+    parser.add_argument(
+        "--no-recursive",
+        action="store_true",
+        help="Only process the top level of the source folder.",
+    )
+    parser.add_argument(
+        "--no-passthrough",
+        action="store_true",
+        help="Always re-encode, even if a file already meets the preset's target.",
+    )
+    parser.add_argument(
+        "--no-hw-pipeline",
+        action="store_true",
+        help="Decode and scale on the CPU even when the GPU could do it.",
+    )
+    parser.add_argument(
+        "--no-slide-detection",
+        action="store_true",
+        help="Encode every frame of lecture recordings instead of dropping repeated "
+        "frames of static slides.",
+    )
+    parser.add_argument(
+        "--chunk-threshold",
+        type=int,
+        default=None,
+        metavar="SECONDS",
+        help="Split inputs at least this long into segments encoded in parallel (0 = never).",
+    )
+    parser.add_argument(
+        "--quality-target",
+        type=float,
+        default=None,
+        metavar="SCORE",
+        help="Search the cheapest CRF/QP per file that still reaches this score "
+        "(e.g. 0.97 for ssim, 42 for psnr, 93 for vmaf).",
+    )
+    parser.add_argument(
+        "--quality-metric",
+        choices=("ssim", "psnr", "vmaf"),
+        default="ssim",
+        help="Metric used by --quality-target (default: ssim).",
+    )
+    return parser.parse_args(argv)
+
+
+def prompt_job(args):
+    """Asks for whatever the command line did not provide and returns a raw job entry."""
+    preset_id = args.preset or select_preset()
+    if not preset_id:
+        raise JobFileError("Invalid selection.")
+
+    if not (args.source and args.dest):
+        print("\n(Tip: Drag and drop folders into this window)")
+    source_folder = args.source or clean_path(input("Source Folder: "))
+    dest_folder = args.dest or clean_path(input("Output Folder: "))
+
+    if not os.path.exists(source_folder):
+        raise JobFileError(f"Source folder does not exist: {source_folder}")
     if not os.path.exists(dest_folder):
         print(f"Creating output folder: {dest_folder}")
         os.makedirs(dest_folder)
 
-    gpu_codec = None
-    if preset["use_gpu"]:
-        print("  ⚙ Analyzing Hardware...")
-        gpu_codec = detect_gpu_codec()
-        if gpu_codec:
-            print(f"✔ GPU Accelerated: Using {gpu_codec}")
+    job = {
+        "preset": preset_id,
+        # A folder typed or dropped in is literal, even if its name contains [ ] or *.
+        "source": glob.escape(source_folder),
+        "dest": dest_folder,
+        "extensions": args.extensions,
+        "recursive": not args.no_recursive,
+        "passthrough": not args.no_passthrough,
+        "hw_pipeline": not args.no_hw_pipeline,
+        "slide_detection": not args.no_slide_detection,
+        "chunk_threshold": args.chunk_threshold,
+        "quality_metric": args.quality_metric,
+    }
+    if args.quality_target is not None:
+        job["quality_target"] = args.quality_target
+    return job
+
+
+STAT_KEYS = (
+    "found",
+    "queued",
+    "skipped",
+    "completed",
+    "failed",
+    "linked",
+    "bytes_in",
+    "bytes_out",
+)
+
+
+class HardwareResolver:
+    """
+    Picks the GPU encoder (and GPU pipeline) for presets, probing each family
+    once. With `refresh`, the cached probe results are renewed once per run:
+    the first lookup re-probes every encoder, later ones read the new cache.
+    """
+
+    def __init__(self, refresh=False):
+        self.refresh = refresh
+        self._refresh_encoders = refresh
+        self._gpu_codecs = {}
+        self._hw_backends = {}
+
+    def gpu_codec(self, family):
+        if family not in self._gpu_codecs:
+            print("  ⚙ Analyzing Hardware...")
+            refresh, self._refresh_encoders = self._refresh_encoders, False
+            self._gpu_codecs[family] = detect_gpu_codec(family, refresh=refresh)
+            if self._gpu_codecs[family]:
+                print(f"✔ GPU Accelerated: Using {self._gpu_codecs[family]}")
+            else:
+                print("⚠ GPU requested but not found. Falling back to CPU.")
+        return self._gpu_codecs[family]
+
+    def resolve(self, preset):
+        """Returns (preset, gpu_codec) for this machine."""
+        if not preset["use_gpu"]:
+            return preset, None
+        gpu_codec = self.gpu_codec(preset_codec_family(preset))
+        if gpu_codec and preset.get("hw_pipeline"):
+            if gpu_codec not in self._hw_backends:
+                backend = detect_hw_pipeline(gpu_codec, refresh=self.refresh)
+                self._hw_backends[gpu_codec] = backend
+                if backend:
+                    print(f"✔ GPU Decode + Scaling: Using {backend}")
+            if self._hw_backends[gpu_codec]:
+                preset = {**preset, "hw_backend": self._hw_backends[gpu_codec]}
+        return preset, gpu_codec
+
+
+def resolve_job(job, resolve):
+    """
+    Returns the (preset, gpu_codec) of a job's tasks, where `resolve(preset)`
+    picks the encoder; several presets become one multi-rendition preset.
+    """
+    renditions = []
+    for preset_id in job["presets"]:
+        preset, gpu_codec = resolve(job_preset(job, preset_id))
+        renditions.append({"id": preset_id, "preset": preset, "gpu_codec": gpu_codec})
+    if len(renditions) == 1:
+        return renditions[0]["preset"], renditions[0]["gpu_codec"]
+    gpu_codec = next((r["gpu_codec"] for r in renditions if r["gpu_codec"]), None)
+    return group_preset(renditions), gpu_codec
+
+
+def task_targets(task, preset_id):
+    """
+    Returns [(output_path, preset_id, encoder), ...] for the outputs of a task.
+    Encoders follow the task's gpu_codec, which is None once a failed GPU
+    encode was moved to the CPU.
+    """
+    _, output_path, _, preset, gpu_codec = task
+    if not preset.get("renditions"):
+        return [(output_path, preset_id, resolve_encoder(preset, gpu_codec))]
+    return [
+        (path, r["id"], resolve_encoder(r["preset"], r["gpu_codec"] if gpu_codec else None))
+        for path, r in rendition_outputs(preset, output_path)
+    ]
+
+
+class Batch:
+    """
+    Shared state for one invocation: the scheduler, worker pool and progress
+    display, plus per-job preset, GPU encoder, manifest and counters.
+    """
+
+    def __init__(
+        self,
+        jobs,
+        workers=None,
+        refresh_hardware=False,
+        autoscale=False,
+        prometheus=None,
+        stage=None,
+        dedup=False,
+    ):
+        self.started = time.time()
+        self.autoscale = autoscale
+        self.autoscaler = None
+        self.prometheus = prometheus
+        self.stage = stage
+        self.stager = None
+        self.dedup = Deduper() if dedup else None
+        # Files whose size collides with another are hashed here, not on discovery.
+        self._hash_pool = (
+            concurrent.futures.ThreadPoolExecutor(max_workers=PROBE_WORKERS) if dedup else None
+        )
+        self.metrics = None
+        self._lock = threading.Lock()
+        self.hardware = HardwareResolver(refresh_hardware)
+        self.entries = []
+
+        for job in jobs:
+            preset, gpu_codec = resolve_job(job, self._resolve)
+            renditions = preset.get("renditions", ())
+            slides = [r["id"] for r in renditions if r["preset"].get("slide_detection")]
+            if slides:
+                print(f"⚠ Multi-rendition jobs skip slide detection (preset {', '.join(slides)}).")
+            os.makedirs(job["dest"], exist_ok=True)
+
+            # A glob matching several folders keeps them apart in the output.
+            root = os.path.commonpath(job["sources"]) if len(job["sources"]) > 1 else None
+            entry = {
+                "job": job,
+                "preset": preset,
+                "gpu_codec": gpu_codec,
+                "manifest": Manifest(job["dest"]),
+                "prefixes": [os.path.relpath(src, root) if root else "" for src in job["sources"]],
+                "stats": dict.fromkeys(STAT_KEYS, 0),
+            }
+            entry["record"] = self._recorder(entry)
+            self.entries.append(entry)
+
+        self.dest_folders = tuple(job["dest"] for job in jobs)
+        self._clean_partials()
+        self._start(jobs, workers)
+
+    def _clean_partials(self):
+        # Leftovers of an interrupted run; their files are not in the manifest,
+        # so discovery queues exactly those again.
+        removed = sum(clean_orphans(dest) for dest in set(self.dest_folders))
+        if removed:
+            print(f"🧹 Removed {removed} unfinished partial file(s) from an interrupted run.")
+
+    def _resolve(self, preset):
+        return self.hardware.resolve(preset)
+
+    def _start(self, jobs, workers):
+        self.scheduler = ResourceScheduler()
+        self.history = ThroughputHistory()
+        log_path = os.path.join(jobs[0]["dest"], TELEMETRY_NAME)
+        if self.autoscale:
+            # The pool is sized for the most jobs the controller may allow;
+            # an explicit --workers caps the CPU jobs instead.
+            self.autoscaler = Autoscaler(self.scheduler, max_jobs=workers)
+            workers = self.autoscaler.cpu_range[1]
+            if any(e["gpu_codec"] for e in self.entries):
+                workers += self.scheduler.gpu_sessions
+        elif workers is None:
+            # Pool threads wait inside the scheduler, so a batch with GPU jobs needs
+            # room for the CPU and the GPU jobs at once (retries move to the CPU).
+            has_gpu = any(e["gpu_codec"] for e in self.entries)
+            workers = self.scheduler.max_jobs(gpu=None if has_gpu else False)
+        self.workers = workers
+        if self.autoscaler:
+            print(
+                f"\nProcessing with up to {workers} workers, autoscaled to the system load "
+                f"(starting at {self.autoscaler.cpu_jobs} CPU jobs)..."
+            )
         else:
-            print("⚠ GPU requested but not found. Falling back to CPU.")
+            print(
+                f"\nProcessing with {workers} workers "
+                f"(budget: {self.scheduler.cpu_threads} CPU threads, "
+                f"{self.scheduler.gpu_sessions} GPU sessions)..."
+            )
 
-    files = [f for f in os.listdir(source_folder) if f.lower().endswith(".mp4")]
-    if not files:
-        print("No .mp4 files found.")
-        return
+        self.progress = BatchProgress(workers=workers, log_path=log_path)
+        self.metrics = MetricsRecorder(
+            os.path.join(jobs[0]["dest"], METRICS_NAME), prometheus=self.prometheus
+        )
+        self.stager = Stager(**self.stage) if self.stage else None
+        self.pipeline = Pipeline(
+            workers,
+            self.scheduler,
+            self.progress,
+            self.history,
+            metrics=self.metrics,
+            stager=self.stager,
+        )
+        if self.autoscaler:
+            self.autoscaler.log = self.progress.log
+            self.autoscaler.start()
+
+    def _targets(self, entry, task):
+        return task_targets(task, entry["job"]["presets"][0])
+
+    def _record(self, entry, task, ok, encoders=None, linked=False):
+        """
+        Updates the manifest and counters for one finished task. A `linked`
+        duplicate is counted apart from encodes and left out of the byte totals.
+        """
+        stats = entry["stats"]
+        targets = self._targets(entry, task)
+        if ok:
+            for i, (output_path, preset_id, encoder) in enumerate(targets):
+                encoder = encoders[i] if encoders else encoder
+                entry["manifest"].record(task[0], output_path, preset_id, encoder)
+        with self._lock:
+            if ok and linked:
+                stats["linked"] += 1
+            elif ok:
+                stats["completed"] += 1
+                stats["bytes_in"] += os.path.getsize(task[0])
+                stats["bytes_out"] += sum(os.path.getsize(t[0]) for t in targets)
+            else:
+                stats["failed"] += 1
+        if self.dedup:
+            self.dedup.finished(id(entry), task[0], ok)
+
+    def _recorder(self, entry):
+        return lambda task, ok: self._record(entry, task, ok)
+
+    def _linker(self, entry, task):
+        """done() callback for a duplicate of an already queued or encoded file."""
+
+        def linked(original, method, error):
+            if method:
+                tqdm.write(f"🔗 DUPLICATE: {task[2]} -> {method} of {os.path.basename(original)}")
+            else:
+                tqdm.write(f"✘ FAILED: {task[2]} -> {error}")
+            self._record(entry, task, bool(method), linked=True)
+
+        return linked
+
+    def sources(self):
+        """Yields (entry, source_index, source_folder) for every job source."""
+        for entry in self.entries:
+            for index, source in enumerate(entry["job"]["sources"]):
+                yield entry, index, source
+
+    def offer(self, entry, source_index, input_path, rel_path):
+        """Queues one discovered file unless it is filtered out or already up to date."""
+        job, stats = entry["job"], entry["stats"]
+        if not path_selected(rel_path, job["include"], job["exclude"]):
+            return False
+        prefix = entry["prefixes"][source_index]
+        rel_path = os.path.join(prefix, rel_path) if prefix else rel_path
+        output_path = output_path_for(input_path, rel_path, job["dest"], job["extensions"])
+        task = (input_path, output_path, rel_path, entry["preset"], entry["gpu_codec"])
+        with self._lock:
+            stats["found"] += 1
+        manifest = entry["manifest"]
+        targets = self._targets(entry, task)
+        outputs = [target[0] for target in targets]
+        if all(manifest.is_current(input_path, *target) for target in targets):
+            if self.dedup:
+                # Still the original for duplicates that turn up later.
+                self._dedup(entry, task, outputs, encoded=True)
+            with self._lock:
+                stats["skipped"] += 1
+            return False
+        with self._lock:
+            stats["queued"] += 1
+        if self.dedup:
+            self._dedup(entry, task, outputs)
+        else:
+            self.submit(entry, task)
+        return True
+
+    def _dedup(self, entry, task, outputs, encoded=False):
+        if self.dedup.collides(id(entry), task[0]):
+            # Comparing reads whole files: keep discovery going meanwhile.
+            self._hash_pool.submit(self._offer_copy, entry, task, outputs, encoded)
+        else:
+            self._offer_copy(entry, task, outputs, encoded)
+
+    def _offer_copy(self, entry, task, outputs, encoded):
+        """Offers a file to the Deduper and submits it unless it is a duplicate."""
+        # Jobs are separate scopes: each one encodes its own way.
+        linker = None if encoded else self._linker(entry, task)
+        if self.dedup.offer(id(entry), task[0], outputs, linker, encoded) or encoded:
+            return
+        try:
+            self.submit(entry, task)
+        except OSError as e:  # e.g. deleted while it was compared
+            tqdm.write(f"✘ FAILED: {task[2]} -> {e}")
+            self._record(entry, task, False)
+
+    def _finish_dedup(self):
+        """Waits for pending duplicate checks (they may still submit files) and saves hashes."""
+        if self.dedup:
+            self._hash_pool.shutdown(wait=True)
+            self.dedup.index.save()
+
+    def submit(self, entry, task):
+        self.pipeline.submit(task, entry["record"])
+
+    def discover_all(self):
+        """
+        Offers every file in every job source. Returns the number of files found.
+
+        Encoding starts as soon as the first file is found; larger files found
+        later still jump ahead of smaller ones that have not started yet.
+        """
+        for entry, index, source in self.sources():
+            job = entry["job"]
+            for input_path, rel_path in discover(
+                source,
+                extensions=job["extensions"],
+                recursive=job["recursive"],
+                exclude=self.dest_folders,
+            ):
+                self.offer(entry, index, input_path, rel_path)
+        return sum(e["stats"]["found"] for e in self.entries)
+
+    def wait(self):
+        self._finish_dedup()
+        self.pipeline.close()
+        if self.stager:
+            self.stager.close()
+        if self.autoscaler:
+            self.autoscaler.stop()
+        self.progress.close()
+
+    def close(self):
+        """Waits for queued work, then returns the machine-readable summary."""
+        self.wait()
+
+        summary = {
+            "started": self.started,
+            "elapsed_seconds": round(time.time() - self.started, 3),
+            "workers": self.workers,
+            "jobs": [],
+        }
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        for entry in self.entries:
+            job, stats = entry["job"], entry["stats"]
+            summary["jobs"].append(
+                {"name": job["name"], "preset": job["preset"], "dest": job["dest"], **stats}
+            )
+            for key, value in stats.items():
+                totals[key] += value
+        summary.update(totals)
+        if self.metrics:
+            summary["metrics"] = self.metrics.summary()
+            self.metrics.close()
+        return summary
+
+
+class QueueBatch(Batch):
+    """
+    Coordinator of a distributed run (see core.jobqueue): discovery and the
+    manifests stay here, and every file to encode becomes a ticket that
+    `--worker` processes on any machine claim and encode.
+    """
+
+    def __init__(
+        self,
+        jobs,
+        queue,
+        poll=QUEUE_POLL_SECONDS,
+        worker_timeout=WORKER_TIMEOUT_SECONDS,
+        dedup=False,
+    ):
+        self.queue = queue
+        self.poll = poll
+        self.liveness = LivenessTracker(worker_timeout)
+        self._tickets = {}
+        self._seen_workers = set()
+        queue.reset()
+        super().__init__(jobs, dedup=dedup)
+
+    def _resolve(self, preset):
+        # Each worker picks the encoder its own hardware supports.
+        return preset, None
+
+    def _start(self, jobs, workers):
+        self.workers = 0
+        print(f"\nQueueing jobs in {self.queue.root} for --worker processes...")
+
+    def _targets(self, entry, task):
+        # Any encoder counts as current: which machine encodes a file is up to the workers.
+        return [(path, preset_id, None) for path, preset_id, _ in super()._targets(entry, task)]
+
+    def submit(self, entry, task):
+        gpu_encoders = set()
+        for preset_id in entry["job"]["presets"]:
+            preset = job_preset(entry["job"], preset_id)
+            if preset["use_gpu"]:
+                gpu_encoders.update(preset.get("gpu_quality_flags", {}))
+        ticket = {
+            "id": ticket_id(task[1]),
+            "input": task[0],
+            "output": task[1],
+            "rel": task[2],
+            "job": {key: entry["job"][key] for key in PRESET_OPTION_KEYS},
+            "gpu_encoders": sorted(gpu_encoders),
+            "cost": os.path.getsize(task[0]),
+        }
+        self._tickets[ticket["id"]] = (entry, task)
+        self.queue.put(ticket)
+
+    def _collect(self):
+        for result in self.queue.results():
+            entry, task = self._tickets.pop(result["id"], (None, None))
+            if entry is None:
+                continue  # a second result for a ticket that was re-queued
+            self._seen_workers.add(result["worker"])
+            ok = result.get("ok", False)
+            self._record(entry, task, ok, result.get("encoders"))
+            status = "✔ COMPLETED" if ok else "✘ FAILED"
+            tqdm.write(f"{status}: {task[2]} (on {result['worker']})")
 
-    tasks = []
-    for f in files:
-        tasks.append(
-            (os.path.join(source_folder, f), os.path.join(dest_folder, f), f, preset, gpu_codec)
+    def _requeue_lost(self):
+        claims = self.queue.claims()
+        for worker in self.liveness.dead(self.queue.workers(), claims.values()):
+            lost = [tid for tid, owner in claims.items() if owner == worker]
+            tqdm.write(f"⚠ WORKER LOST: {worker} -> re-queueing {len(lost)} file(s)")
+            for tid in lost:
+                self.queue.release(tid, worker)
+
+    def wait(self):
+        self._finish_dedup()
+        self.queue.close()
+        while True:
+            self._collect()
+            if not self._tickets:
+                break
+            self._requeue_lost()
+            time.sleep(self.poll)
+        self.workers = len(self._seen_workers)
+
+
+def run_jobs(
+    jobs,
+    workers=None,
+    refresh_hardware=False,
+    autoscale=False,
+    prometheus=None,
+    stage=None,
+    dedup=False,
+):
+    """
+    Runs every job through one shared scheduler and worker pool (resized to
+    the system load while running if `autoscale`, see core.autoscale).
+    Per-job metrics go to the first job's destination and, with
+    `prometheus`, to a Prometheus endpoint or file (see core.metrics).
+    `stage` holds Stager arguments to stage inputs and outputs through local
+    scratch (see core.staging and stage_options()). With `dedup`, identical
+    sources are encoded once per job and linked (see core.dedup).
+
+    Returns:
+        dict: Machine-readable summary with totals, per-job counts and
+        per-preset/per-encoder throughput ("metrics").
+    """
+    batch = Batch(jobs, workers, refresh_hardware, autoscale, prometheus, stage, dedup)
+    found = batch.discover_all()
+    tqdm.write(f"🔎 Discovery finished: {found} videos found, {batch.pipeline.submitted} queued.")
+    return batch.close()
+
+
+def run_coordinator(
+    jobs, queue_dir, workers=None, refresh_hardware=False, poll=QUEUE_POLL_SECONDS, dedup=False
+):
+    """
+    Runs discovery and bookkeeping here and leaves the encoding to `--worker`
+    processes sharing `queue_dir`. `workers` and `refresh_hardware` are
+    accepted for symmetry with run_jobs(); each worker sets its own.
+    Duplicates (`dedup`) are linked here rather than queued.
+
+    Returns:
+        dict: Summary like run_jobs(); "workers" counts the workers that took part.
+    """
+    batch = QueueBatch(jobs, JobQueue(queue_dir), poll=poll, dedup=dedup)
+    found = batch.discover_all()
+    queued = sum(e["stats"]["queued"] for e in batch.entries)
+    tqdm.write(f"🔎 Discovery finished: {found} videos found, {queued} queued for workers.")
+    return batch.close()
+
+
+def advertised_encoders(hardware):
+    """Returns the encoders this machine can run for the loaded presets."""
+    encoders = set()
+    for preset in PRESETS.values():
+        encoders.add(resolve_encoder(preset))
+        if preset["use_gpu"]:
+            encoders.add(hardware.gpu_codec(preset_codec_family(preset)))
+    encoders.discard(None)
+    return encoders
+
+
+def run_worker(
+    queue_dir,
+    workers=None,
+    refresh_hardware=False,
+    stop_event=None,
+    poll=QUEUE_POLL_SECONDS,
+    autoscale=False,
+    prometheus=None,
+    stage=None,
+):
+    """
+    Claims tickets from a coordinator's queue and encodes them on this machine
+    until the coordinator has queued everything and the queue is empty (or
+    `stop_event` is set / Ctrl+C, after which running encodes are finished).
+
+    GPU tickets go to workers with a matching encoder; a worker without one
+    only takes them when no live worker advertises that encoder. Per-job
+    metrics are written to the queue's metrics/ folder. `stage` is like in
+    run_jobs().
+
+    Returns:
+        dict: {"worker", "completed", "failed", "metrics"}
+    """
+    queue = JobQueue(queue_dir)
+    name = worker_name()
+    stop_event = stop_event or threading.Event()
+    hardware = HardwareResolver(refresh_hardware)
+    encoders = advertised_encoders(hardware)
+    has_gpu = any(
+        hardware.gpu_codec(preset_codec_family(p)) for p in PRESETS.values() if p["use_gpu"]
+    )
+
+    scheduler = ResourceScheduler()
+    autoscaler = Autoscaler(scheduler, max_jobs=workers) if autoscale else None
+    if autoscaler:
+        workers = autoscaler.cpu_range[1] + (scheduler.gpu_sessions if has_gpu else 0)
+    elif workers is None:
+        workers = scheduler.max_jobs(gpu=None if has_gpu else False)
+    progress = BatchProgress(workers=workers)
+    metrics = MetricsRecorder(queue.metrics_path(name), prometheus=prometheus)
+    claims = Claims(queue, name)
+    stager = Stager(**stage, claims=claims) if stage else None
+    pipeline = Pipeline(
+        workers,
+        scheduler,
+        progress,
+        ThroughputHistory(),
+        metrics=metrics,
+        stager=stager,
+        claims=claims,
+    )
+    if autoscaler:
+        autoscaler.log = progress.log
+        autoscaler.start()
+    lock = threading.Lock()
+    state = {"worker": name, "completed": 0, "failed": 0, "running": 0}
+    # A 'closed' marker left by the previous batch doesn't count until a coordinator
+    # has (re)opened the queue, so workers can be started before the coordinator.
+    seen_open = False
+    # Peers count as alive while their heartbeat changes; their clocks aren't compared.
+    liveness = LivenessTracker(WORKER_TIMEOUT_SECONDS)
+
+    def accept(ticket):
+        wanted = set(ticket.get("gpu_encoders", ()))
+        if not wanted or wanted & encoders:
+            return True
+        live = liveness.alive(queue.workers())
+        return not any(wanted & set(w.get("encoders", ())) for w in live)
+
+    def finisher(ticket):
+        def done(task, ok):
+            targets = task_targets(task, ticket["job"]["presets"][0])
+            result = {"ok": ok, "encoders": [t[2] for t in targets]}
+            published = queue.complete(ticket, name, result)
+            if not published:
+                tqdm.write(f"⚠ CLAIM LOST: {ticket['rel']} -> re-queued by the coordinator")
+            with lock:
+                if published:
+                    state["completed" if ok else "failed"] += 1
+                state["running"] -= 1
+
+        return done
+
+    def capacity():
+        if not autoscaler:
+            return workers
+        # One ticket more than may run, so the autoscaler sees a file waiting for a slot.
+        return autoscaler.cpu_jobs + (autoscaler.gpu_jobs if has_gpu else 0) + 1
+
+    tqdm.write(
+        f"🛠 WORKER {name}: {workers} slots, encoders {', '.join(sorted(encoders))}. "
+        "Press Ctrl+C to stop."
+    )
+    try:
+        while True:
+            try:
+                queue.heartbeat(
+                    name,
+                    {
+                        "encoders": sorted(encoders),
+                        "capacity": capacity(),
+                        "busy": state["running"],
+                    },
+                )
+                seen_open = seen_open or not queue.closed
+                while not stop_event.is_set() and state["running"] < capacity():
+                    ticket = queue.claim(name, accept)
+                    if not ticket:
+                        break
+                    seen_open = True
+                    task = (
+                        ticket["input"],
+                        ticket["output"],
+                        ticket["rel"],
+                        *resolve_job(ticket["job"], hardware.resolve),
+                    )
+                    with lock:
+                        state["running"] += 1
+                    pipeline.submit(task, finisher(ticket))
+
+                idle = state["running"] == 0
+                finished = seen_open and queue.closed and not queue.pending()
+                if idle and (stop_event.is_set() or finished):
+                    break
+                stop_event.wait(poll)
+            except KeyboardInterrupt:
+                tqdm.write("⏹ Stopping: finishing running files...")
+                stop_event.set()
+    finally:
+        pipeline.close()
+        if stager:
+            stager.close()
+        if autoscaler:
+            autoscaler.stop()
+        progress.close()
+        metrics.close()
+        queue.leave(name)
+
+    del state["running"]
+    state["metrics"] = metrics.summary()
+    return state
+
+
+def watch_jobs(
+    jobs,
+    workers=None,
+    refresh_hardware=False,
+    settle=None,
+    stop_event=None,
+    autoscale=False,
+    prometheus=None,
+    stage=None,
+    dedup=False,
+):
+    """
+    Daemon mode: keeps the worker pool alive and queues files as they appear
+    (and have finished copying) until interrupted or `stop_event` is set.
+
+    Returns:
+        dict: Summary of everything processed while watching.
+    """
+    batch = Batch(jobs, workers, refresh_hardware, autoscale, prometheus, stage, dedup)
+    sources = list(batch.sources())
+    watcher = FolderWatcher(
+        [(src, entry["job"]["extensions"], entry["job"]["recursive"]) for entry, _, src in sources],
+        exclude=batch.dest_folders,
+        settle=WATCH_SETTLE_SECONDS if settle is None else settle,
+        stop_event=stop_event,
+    )
+
+    def on_ready(index, input_path, rel_path):
+        entry, source_index, _ = sources[index]
+        if batch.offer(entry, source_index, input_path, rel_path):
+            tqdm.write(f"📥 QUEUED: {rel_path}")
+
+    folders = len({src for _, _, src in sources})
+    tqdm.write(f"👀 Watching {folders} folder(s) for new videos. Press Ctrl+C to stop.")
+    try:
+        watcher.run(on_ready)
+    except KeyboardInterrupt:
+        watcher.stop()
+        tqdm.write("⏹ Stopping: finishing queued files...")
+    return batch.close()
+
+
+def benchmark(args):
+    """Runs `--benchmark` and returns the exit code."""
+    try:
+        preset_ids = parse_preset_ids(args.preset) if args.preset else list(PRESETS)
+    except JobFileError as e:
+        print(f"Error: {e}")
+        return EXIT_USAGE
+    unknown = [p for p in preset_ids if p not in PRESETS]
+    if unknown:
+        print(f"Error: unknown preset(s) {', '.join(unknown)}")
+        return EXIT_USAGE
+
+    baseline = None
+    if args.bench_baseline:
+        try:
+            with open(args.bench_baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: cannot read baseline {args.bench_baseline}: {e}")
+            return EXIT_USAGE
+
+    hardware = HardwareResolver(args.refresh_hardware)
+    presets, gpu_codecs = {}, {}
+    for preset_id in preset_ids:
+        presets[preset_id], gpu_codecs[preset_id] = hardware.resolve(PRESETS[preset_id])
+
+    print(f"\nBenchmarking {len(presets)} preset(s) on {', '.join(args.bench_clips)}...")
+
+    def on_result(r):
+        layout = f"{r['workers']} job(s) x {r['threads']} thread(s)"
+        if r["variant"]:
+            layout += f" [{r['variant']}]"
+        if not r["ok"]:
+            print(f"  ✘ {r['preset']} {r['clip']:<7} {r['encoder']:<11} {layout}: {r['error']}")
+            return
+        print(
+            f"  ⏱ {r['preset']} {r['clip']:<7} {r['encoder']:<11} {layout}: "
+            f"{r['fps']:.1f} fps, {r['speed']:.2f}x, CPU {r['cpu_percent']}%, "
+            f"{(r['peak_rss_kb'] or 0) // 1024} MiB"
+        )
+
+    report = run_benchmark(
+        presets,
+        clips=args.bench_clips,
+        seconds=args.bench_seconds,
+        gpu_codecs=gpu_codecs,
+        on_result=on_result,
+    )
+    write_summary(report, args.benchmark)
+
+    rec = report["recommendation"]
+    if rec and "workers" in rec:
+        env = " ".join(f"{k}={v}" for k, v in rec["env"].items())
+        print(
+            f"\n🎯 Recommended: {rec['workers']} worker(s) x {rec['threads_per_job']} "
+            f"thread(s) ({env})"
+        )
+    for gain in report["slide_gains"]:
+        print(
+            f"🖼 Slide detection, preset {gain['preset']} on {gain['clip']}: "
+            f"{gain['speedup']:.1f}x faster, output {gain['size_ratio']:.0%} of the plain encode"
+        )
+    print(f"Report written to {args.benchmark}")
+
+    failed = any(not r["ok"] for r in report["results"])
+    if baseline is not None:
+        regressions = compare(baseline, report)
+        for message in regressions:
+            print(f"⚠ REGRESSION: {message}")
+        failed = failed or bool(regressions)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def print_summary(summary):
+    if not summary["found"]:
+        print("No video files found.")
+        return
+    if summary["skipped"]:
+        print(f"⏭ Skipped {summary['skipped']} unchanged files (already in manifest).")
+    if summary["failed"]:
+        print(f"⚠ {summary['failed']} files failed.")
+    if summary["linked"]:
+        print(f"🔗 Linked {summary['linked']} duplicate files instead of encoding them.")
+    if summary["bytes_in"]:
+        saved = summary["bytes_in"] - summary["bytes_out"]
+        print(
+            f"💾 {tqdm.format_sizeof(summary['bytes_in'], 'B', 1024)} → "
+            f"{tqdm.format_sizeof(summary['bytes_out'], 'B', 1024)} "
+            f"(saved {tqdm.format_sizeof(max(saved, 0), 'B', 1024)}, "
+            f"{100.0 * saved / summary['bytes_in']:.0f}%)"
         )
+    if "metrics" in summary:
+        for line in format_summary(summary["metrics"]):
+            print(line)
+
+
+def stage_options(args):
+    """Stager arguments from the --stage-* flags, or None without --stage-dir."""
+    if not args.stage_dir:
+        return None
+    return {
+        "scratch_dir": args.stage_dir,
+        "budget_bytes": args.stage_budget * 1024**3,
+        "bytes_per_second": args.stage_bandwidth * 1024**2 or None,
+    }
+
+
+def write_summary(summary, path):
+    """Writes the JSON summary to `path` ('-' for stdout)."""
+    text = json.dumps(summary, indent=2)
+    if path == "-":
+        print(text)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text + "\n")
+
+
+def main(argv=None):
+    """
+    Entry point. Returns a process exit code: EXIT_OK, EXIT_FAILED when at
+    least one file failed, or EXIT_USAGE for invalid arguments, presets or job files.
+    """
+    args = parse_args(argv)
+
+    print("==========================================")
+    print("      MASS VIDEO COMPRESSOR (MVC)         ")
+    print("==========================================\n")
 
-    print(f"\nProcessing {len(files)} files with {DEFAULT_WORKERS} threads...")
+    try:
+        user_presets = load_user_presets(args.presets)
+    except PresetError as e:
+        print(f"Error: {e}")
+        return EXIT_USAGE
+    if user_presets:
+        print(f"Loaded presets: {', '.join(user_presets)}")
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as executor:
-        futures = {executor.submit(process_file, task): task for task in tasks}
-        pbar = tqdm(
-            concurrent.futures.as_completed(futures), total=len(tasks), unit="file", mininterval=0.5
+    if args.benchmark:
+        return benchmark(args)
+    if args.worker:
+        result = run_worker(
+            args.worker,
+            workers=args.workers,
+            refresh_hardware=args.refresh_hardware,
+            autoscale=args.autoscale,
+            prometheus=args.prometheus,
+            stage=stage_options(args),
         )
-        for _ in pbar:
-            pass
+        print(f"\nWorker finished: {result['completed']} completed, {result['failed']} failed.")
+        for line in format_summary(result["metrics"]):
+            print(line)
+        return EXIT_FAILED if result["failed"] else EXIT_OK
+    if args.coordinator and args.watch:
+        print("Error: --watch cannot be combined with --coordinator.")
+        return EXIT_USAGE
+
+    try:
+        if args.job:
+            spec = load_job_file(args.job)
+        else:
+            spec = {"workers": None, "summary": None, "jobs": [make_job(prompt_job(args))]}
+    except JobFileError as e:
+        print(f"Error: {e}")
+        return EXIT_USAGE
+
+    for job in spec["jobs"]:
+        if job["quality_target"] is not None and job["quality_metric"] not in available_metrics():
+            print(f"Error: this ffmpeg build cannot compute {job['quality_metric']}.")
+            return EXIT_USAGE
+
+    run = watch_jobs if args.watch else run_jobs
+    kwargs = {"settle": args.settle} if args.watch else {}
+    kwargs["autoscale"] = args.autoscale
+    kwargs["prometheus"] = args.prometheus
+    kwargs["stage"] = stage_options(args)
+    kwargs["dedup"] = args.dedup
+    if args.coordinator:
+        run, kwargs = run_coordinator, {"queue_dir": args.coordinator, "dedup": args.dedup}
+    summary = run(
+        spec["jobs"],
+        workers=args.workers or spec["workers"],
+        refresh_hardware=args.refresh_hardware,
+        **kwargs,
+    )
+    print_summary(summary)
+
+    summary_path = args.summary or spec["summary"]
+    if summary_path:
+        write_summary(summary, summary_path)
 
     print("\nAll tasks finished.")
+    return EXIT_FAILED if summary["failed"] else EXIT_OK
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
 
 
 if __name__ == "__main__":
+    # SIGTERM (systemd, docker stop, kill) stops a run the same way as Ctrl+C.
+    signal.signal(signal.SIGTERM, _interrupt)
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
+        cancel()
         print("\n\nOperation cancelled by user.")
-        sys.exit(0)
+        sys.exit(EXIT_INTERRUPTED)
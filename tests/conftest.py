@@ -0,0 +1,20 @@
+"""
+conftest.py
+Shared fixtures for the test suite.
+"""
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep on-disk caches (e.g. hardware probe results) out of the user's home."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr("core.hardware.CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr("core.quality.CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr("core.quality._cache", None)
+    monkeypatch.setattr("core.slides.CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr("core.slides._cache", None)
+    monkeypatch.setattr("core.benchmark.BENCH_DIR", str(cache_dir / "bench"))
+    monkeypatch.setattr("core.dedup.CACHE_DIR", str(cache_dir))
+    return cache_dir
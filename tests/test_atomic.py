@@ -0,0 +1,50 @@
+"""
+test_atomic.py
+Tests partial outputs, publishing and cleanup of interrupted runs.
+"""
+
+import os
+import time
+
+from core.atomic import clean_orphans, find_orphans, partial_path, publish
+
+
+def test_partial_path_is_hidden_next_to_output():
+    path = partial_path(os.path.join("out", "talk.mp4"))
+    assert path == os.path.join("out", ".mvc-partial.talk.mp4")
+    assert os.path.splitext(path)[1] == ".mp4"
+
+
+def test_publish_replaces_output(tmp_path):
+    output = tmp_path / "talk.mp4"
+    output.write_bytes(b"old")
+    partial = partial_path(str(output))
+    with open(partial, "wb") as f:
+        f.write(b"new")
+
+    publish(partial, str(output))
+
+    assert output.read_bytes() == b"new"
+    assert not os.path.exists(partial)
+
+
+def test_clean_orphans_removes_only_old_leftovers(tmp_path):
+    (tmp_path / "sub").mkdir()
+    old_partial = tmp_path / "sub" / ".mvc-partial.a.mp4"
+    old_partial.write_bytes(b"x")
+    fresh_partial = tmp_path / ".mvc-partial.b.mp4"
+    fresh_partial.write_bytes(b"x")
+    workdir = tmp_path / ".mvc_chunks_abc"
+    workdir.mkdir()
+    (workdir / "seg_000.mp4").write_bytes(b"x")
+    finished = tmp_path / "c.mp4"
+    finished.write_bytes(b"x")
+
+    hour_ago = time.time() - 3600
+    for path in (old_partial, workdir, workdir / "seg_000.mp4", finished):
+        os.utime(path, (hour_ago, hour_ago))
+
+    assert find_orphans(str(tmp_path)) == sorted([str(old_partial), str(workdir)])
+    assert clean_orphans(str(tmp_path)) == 2
+    assert not old_partial.exists() and not workdir.exists()
+    assert fresh_partial.exists() and finished.exists()
@@ -0,0 +1,92 @@
+"""
+test_autoscale.py
+Tests the autoscaling decisions and how they are applied to the scheduler.
+"""
+
+from core.autoscale import Autoscaler, decide_cpu, decide_gpu
+from core.scheduler import ResourceScheduler
+
+
+def _reading(**values):
+    reading = dict.fromkeys(
+        (
+            "cpu_percent",
+            "mvc_cpu_percent",
+            "iowait_percent",
+            "load_per_core",
+            "memory_available_percent",
+            "memory_pressure",
+            "disk_bytes_per_s",
+            "gpu_encoder_percent",
+        )
+    )
+    reading.update(values)
+    return reading
+
+
+class FakeSampler:
+    def __init__(self, readings):
+        self.readings = list(readings)
+
+    def sample(self):
+        return self.readings.pop(0)
+
+
+def test_grows_when_cpu_idle_and_files_wait():
+    jobs, reason = decide_cpu(_reading(cpu_percent=40), 2, waiting=3, low=1, high=8, target=85)
+    assert jobs == 3 and "40%" in reason
+    # Nothing waiting for a slot, at the cap, or already oversubscribed: hold.
+    assert decide_cpu(_reading(cpu_percent=40), 2, 0, 1, 8, 85) == (2, None)
+    assert decide_cpu(_reading(cpu_percent=40), 8, 3, 1, 8, 85) == (8, None)
+    assert decide_cpu(_reading(cpu_percent=40, load_per_core=2.0), 2, 3, 1, 8, 85) == (2, None)
+
+
+def test_own_encoders_saturating_the_cpu_is_not_a_reason_to_shrink():
+    busy = _reading(cpu_percent=99, mvc_cpu_percent=96)
+    assert decide_cpu(busy, 4, 2, 1, 8, 85) == (4, None)
+
+
+def test_shrinks_for_other_processes_memory_and_io():
+    others = _reading(cpu_percent=99, mvc_cpu_percent=50)
+    assert decide_cpu(others, 4, 0, 1, 8, 85)[0] == 3
+    assert decide_cpu(_reading(memory_available_percent=5), 4, 0, 1, 8, 85)[0] == 3
+    assert decide_cpu(_reading(memory_pressure=35.0), 4, 0, 1, 8, 85)[0] == 3
+    jobs, reason = decide_cpu(_reading(cpu_percent=30, iowait_percent=45), 4, 2, 1, 8, 85)
+    assert jobs == 3 and "I/O wait" in reason
+    # Never below the floor.
+    assert decide_cpu(others, 1, 0, 1, 8, 85) == (1, None)
+
+
+def test_gpu_follows_encoder_utilisation():
+    assert decide_gpu(_reading(), 2, 1, 1, 3) == (2, None)
+    assert decide_gpu(_reading(gpu_encoder_percent=99), 2, 0, 1, 3)[0] == 1
+    assert decide_gpu(_reading(gpu_encoder_percent=50), 2, 1, 1, 3)[0] == 3
+    assert decide_gpu(_reading(gpu_encoder_percent=50), 2, 0, 1, 3) == (2, None)
+
+
+def test_autoscaler_applies_and_logs_decisions():
+    scheduler = ResourceScheduler(cpu_threads=16, gpu_sessions=2, threads_per_job=4)
+    events = []
+    sampler = FakeSampler(
+        [
+            _reading(cpu_percent=99, mvc_cpu_percent=40),
+            _reading(cpu_percent=80, mvc_cpu_percent=60),
+        ]
+    )
+    scaler = Autoscaler(
+        scheduler, log=lambda event, **fields: events.append((event, fields)), sampler=sampler
+    )
+    assert scaler.cpu_range == (1, 8)
+    assert scheduler.cpu_job_limit == 4 and scheduler.gpu_job_limit == 2
+
+    scaler.step()
+    assert scheduler.cpu_job_limit == 3
+    assert events[0][0] == "autoscale"
+    assert events[0][1]["old"] == 4 and events[0][1]["new"] == 3
+    assert events[0][1]["cpu_percent"] == 99
+
+    scaler.step()  # inside the band: hold
+    assert scheduler.cpu_job_limit == 3 and len(events) == 1
+
+    scaler.stop()
+    assert scheduler.cpu_job_limit is None and scheduler.gpu_job_limit is None
@@ -0,0 +1,115 @@
+"""
+test_benchmark.py
+Tests benchmark parsing, layout selection, recommendations and regression checks.
+"""
+
+from config.presets import PRESETS
+from core.benchmark import (
+    benchmark_command,
+    candidate_layouts,
+    compare,
+    parse_benchmark,
+    recommend,
+    run_benchmark,
+    slide_gains,
+)
+
+
+def _result(workers, threads, fps, preset="1", clip="slides", ok=True, gpu=False):
+    return {
+        "preset": preset,
+        "clip": clip,
+        "encoder": "h264_nvenc" if gpu else "libx264",
+        "gpu": gpu,
+        "workers": workers,
+        "threads": threads,
+        "ok": ok,
+        "fps": fps,
+        "speed": fps / 30,
+        "output_size": 1000,
+    }
+
+
+def test_parse_benchmark_report():
+    stderr = (
+        "frame=  300 fps=120\n"
+        "bench: utime=3.500s stime=0.250s rtime=2.000s\n"
+        "bench: maxrss=204800KiB\n"
+    )
+    stats = parse_benchmark(stderr)
+    assert stats == {"cpu_seconds": 3.75, "rtime": 2.0, "maxrss_kb": 204800}
+    assert parse_benchmark("")["cpu_seconds"] is None
+
+
+def test_benchmark_command_logs_the_report():
+    cmd = benchmark_command(["ffmpeg", "-y", "-v", "error", "-i", "in.mp4", "out.mp4"])
+    assert cmd[:2] == ["ffmpeg", "-benchmark"]
+    assert cmd[cmd.index("-v") + 1] == "info"
+
+
+def test_candidate_layouts():
+    assert candidate_layouts(8) == [(1, 1), (1, 2), (1, 4), (1, 8), (2, 4), (4, 2), (8, 1)]
+    assert candidate_layouts(1) == [(1, 1)]
+    assert candidate_layouts(8, gpu=True, gpu_sessions=2) == [(1, 2), (2, 2)]
+
+
+def test_recommend_picks_best_throughput_across_presets():
+    results = [
+        _result(1, 8, 100, preset="1"),
+        _result(4, 2, 180, preset="1"),
+        _result(1, 8, 60, preset="2"),
+        _result(4, 2, 90, preset="2"),
+        _result(8, 1, 0, preset="2", ok=False),
+    ]
+    rec = recommend(results)
+    assert (rec["workers"], rec["threads_per_job"], rec["cpu_threads"]) == (4, 2, 8)
+    assert rec["score"] == 1.0
+    assert rec["env"] == {"MVC_THREADS_PER_JOB": 2, "MVC_CPU_THREADS": 8}
+    # est_speed comes from single-job runs on 1080p clips.
+    assert rec["est_speed"] == {"1": {"cpu": 100 / 30}, "2": {"cpu": 2.0}}
+    assert recommend([_result(1, 1, 0, ok=False)]) is None
+
+
+def test_compare_flags_slower_and_larger_runs():
+    baseline = {"results": [_result(1, 4, 100), _result(2, 2, 100, clip="motion")]}
+    slower = _result(1, 4, 80)
+    larger = {**_result(2, 2, 101, clip="motion"), "output_size": 1500}
+    unknown = _result(8, 1, 10)
+
+    regressions = compare(baseline, {"results": [slower, larger, unknown]})
+
+    assert len(regressions) == 2
+    assert "80 fps" in regressions[0]
+    assert "1500 bytes" in regressions[1]
+    assert compare(baseline, {"results": [_result(1, 4, 95)]}) == []
+
+
+def test_slide_gains_compare_with_the_plain_encode():
+    plain = _result(1, 4, 100)
+    decimated = {**_result(1, 4, 400), "variant": "slides", "output_size": 600}
+    other_layout = {**_result(2, 2, 300), "variant": "slides"}
+
+    gains = slide_gains([plain, decimated, other_layout, _result(1, 4, 50, clip="motion")])
+
+    assert gains == [
+        {"preset": "1", "clip": "slides", "workers": 1, "threads": 4, "speedup": 4.0,
+         "size_ratio": 0.6}
+    ]  # fmt: skip
+    # Variants are scored on their own, so the faster decimated run isn't the best layout.
+    assert recommend([plain, decimated])["score"] == 1.0
+
+
+def test_run_benchmark_measures_a_real_encode(isolated_cache):
+    seen = []
+
+    report = run_benchmark(
+        {"4": PRESETS["4"]}, clips=("slides",), seconds=1, layouts=[(1, 1)], on_result=seen.append
+    )
+
+    assert len(report["results"]) == 1 == len(seen)
+    result = report["results"][0]
+    assert result["ok"], result.get("error")
+    assert result["fps"] > 0 and result["output_size"] > 0
+    assert result["peak_rss_kb"] and result["cpu_percent"] is not None
+    assert report["recommendation"]["workers"] == 1
+    assert (isolated_cache / "bench" / "slides_1s.mp4").exists()
@@ -0,0 +1,144 @@
+"""
+test_chunking.py
+Tests segment-parallel encoding of long inputs.
+"""
+
+import os
+import subprocess
+
+import pytest
+
+from config.presets import PRESETS
+from config.settings import FFMPEG_EXE, _env_int
+from core.chunking import (
+    SegmentProgress,
+    audio_command,
+    concat_command,
+    should_chunk,
+    split_command,
+    write_concat_list,
+)
+from core.probe import probe_media
+from core.processor import build_command, encode_chunked
+from core.scheduler import ResourceScheduler
+
+
+@pytest.mark.parametrize(
+    "value, expected", [("", 1800), ("oops", 1800), ("-5", 1800), ("0", 0), ("600", 600)]
+)
+def test_chunk_threshold_override(monkeypatch, value, expected):
+    """0 disables chunking; values that aren't a count fall back to the default."""
+    monkeypatch.setenv("MVC_CHUNK_THRESHOLD", value)
+    assert _env_int("MVC_CHUNK_THRESHOLD", 1800, minimum=0) == expected
+
+
+def test_should_chunk_threshold():
+    info = {"duration": 4 * 3600, "video": {"codec": "h264"}}
+    assert should_chunk(info, 1800) is True
+    assert should_chunk({**info, "duration": 600}, 1800) is False
+    assert should_chunk(info, 0) is False
+    assert should_chunk({**info, "video": None}, 1800) is False
+    assert should_chunk(None, 1800) is False
+
+
+def test_split_is_a_keyframe_stream_copy():
+    cmd = split_command("in.mp4", "work", 300)
+    assert cmd[cmd.index("-c") + 1] == "copy"
+    assert cmd[cmd.index("-f") + 1] == "segment"
+    assert cmd[cmd.index("-segment_time") + 1] == "300"
+    assert "0:v:0" in cmd
+
+
+def test_audio_encoded_once_with_preset_params():
+    cmd = audio_command("in.mp4", "audio.mka", PRESETS["1"])
+    assert "-vn" in cmd
+    assert "64k" in cmd
+
+
+def test_segments_are_encoded_without_audio():
+    cmd = build_command("seg.mkv", "seg_enc.mkv", PRESETS["1"], audio=False)
+    assert "-an" in cmd
+    assert "-c:a" not in cmd
+    assert "libx264" in cmd
+
+
+def test_concat_is_lossless(tmp_path):
+    list_path = write_concat_list(["a.mkv", "it's.mkv"], str(tmp_path / "list.txt"))
+    text = open(list_path, encoding="utf-8").read()
+    assert text.count("file '") == 2
+    assert "it'\\''s.mkv" in text
+
+    cmd = concat_command(list_path, "audio.mka", "out.mp4")
+    assert cmd[cmd.index("-f") + 1] == "concat"
+    assert cmd[cmd.index("-c") + 1] == "copy"
+    assert "1:a:0?" in cmd
+
+
+def test_segment_progress_merges():
+    blocks = []
+    merged = SegmentProgress(blocks.append)
+    merged.for_segment(0)({"frame": "10", "out_time_us": "1000000", "total_size": "100"})
+    merged.for_segment(1)({"frame": "5", "out_time_us": "500000", "total_size": "50"})
+    merged.for_segment(0)({"frame": "20", "out_time_us": "2000000", "total_size": "200"})
+
+    assert blocks[-1]["frame"] == "25"
+    assert blocks[-1]["out_time_us"] == "2500000"
+    assert blocks[-1]["total_size"] == "250"
+
+
+@pytest.mark.skipif(not os.path.exists(FFMPEG_EXE), reason="ffmpeg binary not available")
+def test_encode_chunked_end_to_end(tmp_path):
+    """A 6s clip split every 2s keeps every frame and the audio track."""
+    src = str(tmp_path / "long.mp4")
+    subprocess.run(
+        [
+            FFMPEG_EXE, "-v", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc=s=160x120:r=25:d=6",
+            "-f", "lavfi", "-i", "sine=d=6",
+            "-c:v", "libx264", "-g", "25", "-pix_fmt", "yuv420p", "-c:a", "aac", src,
+        ],
+        check=True,
+    )  # fmt: skip
+    out = str(tmp_path / "out.mp4")
+
+    code, err = encode_chunked(
+        src, out, PRESETS["1"], None, ResourceScheduler(cpu_threads=4), segment_seconds=2
+    )
+
+    assert code == 0, err
+    info = probe_media(out)
+    assert abs(info["duration"] - 6) < 0.2
+    assert info["audio"]["codec"] == "aac"
+    # Temporary segments are cleaned up
+    assert sorted(os.listdir(tmp_path)) == ["long.mp4", "out.mp4"]
+
+
+@pytest.mark.skipif(not os.path.exists(FFMPEG_EXE), reason="ffmpeg binary not available")
+def test_encode_chunked_silent_input(tmp_path):
+    """Without an audio stream, the video segments are joined alone."""
+    src = str(tmp_path / "silent.mp4")
+    subprocess.run(
+        [
+            FFMPEG_EXE, "-v", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc=s=160x120:r=25:d=4",
+            "-c:v", "libx264", "-g", "25", "-pix_fmt", "yuv420p", src,
+        ],
+        check=True,
+    )  # fmt: skip
+    out = str(tmp_path / "out.mp4")
+    assert probe_media(src)["audio"] is None
+
+    code, err = encode_chunked(
+        src,
+        out,
+        PRESETS["1"],
+        None,
+        ResourceScheduler(cpu_threads=4),
+        segment_seconds=2,
+        audio=False,
+    )
+
+    assert code == 0, err
+    info = probe_media(out)
+    assert abs(info["duration"] - 4) < 0.2
+    assert info["audio"] is None
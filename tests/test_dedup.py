@@ -0,0 +1,139 @@
+"""
+test_dedup.py
+Tests content-hash deduplication of sources and linking of duplicate outputs.
+"""
+
+import os
+import threading
+from unittest.mock import patch
+
+import main
+from core import dedup
+from core.dedup import COPY, HARDLINK, Deduper, HashIndex, link_file
+from core.dedup import full_hash as dedup_full_hash
+from core.jobs import make_job
+
+
+def _file(tmp_path, name, data):
+    path = tmp_path / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_hash_index_is_persistent_and_follows_changes(tmp_path):
+    src = _file(tmp_path, "a.mp4", b"video")
+    index_path = str(tmp_path / "hashes.json")
+
+    index = HashIndex(index_path)
+    first = index.full(src)
+    # Written once per batch, not after every hash.
+    assert not os.path.exists(index_path)
+    index.save()
+    with patch("core.dedup.full_hash") as compute:
+        assert HashIndex(index_path).full(src) == first
+    compute.assert_not_called()
+
+    os.utime(src, ns=(0, 1))
+    with patch("core.dedup.full_hash", return_value="new") as compute:
+        assert HashIndex(index_path).full(src) == "new"
+    compute.assert_called_once()
+
+
+def test_only_size_collisions_are_hashed(tmp_path):
+    a = _file(tmp_path, "a.mp4", b"aaaa")
+    b = _file(tmp_path, "b.mp4", b"bbbbbb")
+    c = _file(tmp_path, "c.mp4", b"cccc")
+    deduper = Deduper(HashIndex(str(tmp_path / "hashes.json")))
+
+    with patch("core.dedup.full_hash", wraps=dedup.full_hash) as full:
+        assert not deduper.offer(1, a, ["out/a.mp4"])
+        assert not deduper.offer(1, b, ["out/b.mp4"])
+        assert deduper.index.entries == {}
+        # Same size, different head: the fingerprints tell them apart.
+        assert not deduper.offer(1, c, ["out/c.mp4"])
+    full.assert_not_called()
+    assert set(deduper.index.entries) == {a, c}
+
+
+def test_duplicate_is_linked_once_the_original_is_encoded(tmp_path):
+    a = _file(tmp_path, "in/a.mp4", b"same")
+    b = _file(tmp_path, "in/sub/renamed.mp4", b"same")
+    out_a, out_b = str(tmp_path / "out" / "a.mp4"), str(tmp_path / "out" / "renamed.mp4")
+    deduper = Deduper(HashIndex(str(tmp_path / "hashes.json")))
+    done = []
+
+    assert not deduper.offer(1, a, [out_a])
+    assert deduper.offer(1, b, [out_b], lambda *args: done.append(args))
+    # Another job encodes its own copy.
+    assert not deduper.offer(2, b, [str(tmp_path / "other" / "renamed.mp4")])
+    assert done == []
+
+    _file(tmp_path, "out/a.mp4", b"encoded")
+    deduper.finished(1, a, True)
+
+    assert done == [(a, HARDLINK, None)]
+    assert open(out_b, "rb").read() == b"encoded"
+    assert sorted(os.listdir(tmp_path / "out")) == ["a.mp4", "renamed.mp4"]
+
+
+def test_failed_original_fails_waiting_duplicates_only(tmp_path):
+    a, b, c = (_file(tmp_path, name, b"same") for name in ("a.mp4", "b.mp4", "c.mp4"))
+    deduper = Deduper(HashIndex(str(tmp_path / "hashes.json")))
+    done = []
+
+    deduper.offer(1, a, ["out/a.mp4"])
+    deduper.offer(1, b, ["out/b.mp4"], lambda *args: done.append(args))
+    deduper.finished(1, a, False)
+
+    assert done == [(a, None, "The file with the same content failed to encode")]
+    # A copy found later gets an encode of its own.
+    assert not deduper.offer(1, c, ["out/c.mp4"])
+
+
+def test_link_file_falls_back_to_a_copy(tmp_path):
+    src = _file(tmp_path, "a.mp4", b"encoded")
+    dst = str(tmp_path / "out" / "b.mp4")
+
+    with (
+        patch("core.dedup.os.link", side_effect=OSError("cross-device link")),
+        patch("core.dedup._reflink", return_value=False),
+    ):
+        assert link_file(src, dst) == COPY
+
+    assert open(dst, "rb").read() == b"encoded"
+    assert os.listdir(tmp_path / "out") == ["b.mp4"]
+
+
+def test_run_jobs_encodes_duplicates_once(tmp_path):
+    for rel in ("raw/a.mp4", "raw/copy of a.mp4", "raw/b.mp4"):
+        _file(tmp_path, rel, b"same" if "a.mp4" in rel else b"other")
+    job = make_job({"preset": "1", "source": "raw", "dest": "out"}, tmp_path)
+    encoded, hashed_on = [], set()
+
+    def full_hash(path):
+        hashed_on.add(threading.current_thread().name)
+        return dedup_full_hash(path)
+
+    def fake_process(task, *args):
+        encoded.append(task[2])
+        with open(task[1], "wb") as f:
+            f.write(b"v")
+        return True
+
+    with (
+        patch("core.pipeline.process_file", side_effect=fake_process),
+        patch("core.pipeline.task_cost", return_value=1.0),
+        patch("main.detect_gpu_codec", return_value=None),
+        patch("core.dedup.full_hash", side_effect=full_hash),
+    ):
+        summary = main.run_jobs([job], workers=1, dedup=True)
+        again = main.run_jobs([job], workers=1, dedup=True)
+
+    assert len(encoded) == 2
+    assert (summary["completed"], summary["failed"], summary["linked"]) == (2, 0, 1)
+    # The linked copy is not an encode of its own.
+    assert (summary["bytes_in"], summary["bytes_out"]) == (len(b"same") + len(b"other"), 2)
+    assert hashed_on and threading.main_thread().name not in hashed_on
+    assert (tmp_path / "out" / "copy of a.mp4").read_bytes() == b"v"
+    assert again["skipped"] == 3
@@ -0,0 +1,106 @@
+"""
+test_discovery.py
+Tests recursive video discovery, content sniffing and output path mirroring.
+"""
+
+import os
+
+from core.discovery import discover, output_path_for, sniff_video
+
+MP4_HEAD = b"\x00\x00\x00\x20ftypisom" + b"\x00" * 20
+MKV_HEAD = b"\x1a\x45\xdf\xa3" + b"\x00" * 20
+
+
+def _touch(path, data=b"data"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _found(root, **kwargs):
+    return sorted(rel for _, rel in discover(str(root), **kwargs))
+
+
+def test_discover_recursive_multi_container(tmp_path):
+    _touch(tmp_path / "a.mp4")
+    _touch(tmp_path / "b.MOV")
+    _touch(tmp_path / "sub" / "c.mkv")
+    _touch(tmp_path / "sub" / "deep" / "d.mts")
+    _touch(tmp_path / "notes.txt")
+
+    found = _found(tmp_path)
+    assert found == sorted(
+        ["a.mp4", "b.MOV", os.path.join("sub", "c.mkv"), os.path.join("sub", "deep", "d.mts")]
+    )
+
+
+def test_discover_non_recursive(tmp_path):
+    _touch(tmp_path / "a.mp4")
+    _touch(tmp_path / "sub" / "c.mkv")
+    assert _found(tmp_path, recursive=False) == ["a.mp4"]
+
+
+def test_discover_custom_extensions(tmp_path):
+    _touch(tmp_path / "a.mp4")
+    _touch(tmp_path / "b.avi")
+    assert _found(tmp_path, extensions=(".avi",)) == ["b.avi"]
+
+
+def test_discover_sniffs_files_without_extension(tmp_path):
+    _touch(tmp_path / "camera_dump", MP4_HEAD)
+    _touch(tmp_path / "README", b"just some text, not a video at all")
+    assert _found(tmp_path) == ["camera_dump"]
+    assert _found(tmp_path, sniff=False) == []
+
+
+def test_discover_skips_hidden_and_excluded(tmp_path):
+    _touch(tmp_path / "a.mp4")
+    _touch(tmp_path / ".mvc_manifest.jsonl")
+    _touch(tmp_path / "out" / "a.mp4")
+    assert _found(tmp_path, exclude=(str(tmp_path / "out"),)) == ["a.mp4"]
+
+
+def test_discover_is_lazy(tmp_path):
+    """The first file is yielded before the whole tree is listed."""
+    _touch(tmp_path / "a.mp4")
+    gen = discover(str(tmp_path))
+    assert next(gen)[1] == "a.mp4"
+
+
+def test_sniff_video_signatures(tmp_path):
+    assert sniff_video(_touch(tmp_path / "mp4", MP4_HEAD))
+    assert sniff_video(_touch(tmp_path / "mkv", MKV_HEAD))
+    assert sniff_video(_touch(tmp_path / "avi", b"RIFF\x00\x00\x00\x00AVI LIST" + b"\x00" * 8))
+    ts = bytearray(400)
+    ts[0] = ts[188] = 0x47
+    assert sniff_video(_touch(tmp_path / "ts", bytes(ts)))
+    assert not sniff_video(_touch(tmp_path / "txt", b"hello world, this is text"))
+
+
+def test_output_path_mirrors_tree(tmp_path):
+    src = _touch(tmp_path / "src" / "sub" / "c.mkv")
+    rel = os.path.join("sub", "c.mkv")
+    assert output_path_for(src, rel, "out") == os.path.join("out", "sub", "c.mkv")
+
+
+def test_output_path_converts_other_containers_to_mp4(tmp_path):
+    src = _touch(tmp_path / "src" / "d.avi")
+    assert output_path_for(src, "d.avi", "out") == os.path.join("out", "d.mp4")
+
+
+def test_output_path_avoids_sibling_clash(tmp_path):
+    _touch(tmp_path / "src" / "a.mp4")
+    src = _touch(tmp_path / "src" / "a.avi")
+    assert output_path_for(src, "a.avi", "out") == os.path.join("out", "a_avi.mp4")
+
+
+def test_output_path_avoids_clash_between_converted_siblings(tmp_path):
+    avi = _touch(tmp_path / "src" / "clip.avi")
+    mts = _touch(tmp_path / "src" / "clip.mts")
+    outputs = {output_path_for(p, os.path.basename(p), "out") for p in (avi, mts)}
+    assert outputs == {os.path.join("out", "clip_avi.mp4"), os.path.join("out", "clip_mts.mp4")}
+    # A namesake that isn't picked up doesn't count.
+    assert output_path_for(avi, "clip.avi", "out", extensions=(".avi",)) == os.path.join(
+        "out", "clip.mp4"
+    )
@@ -0,0 +1,51 @@
+"""
+test_failures.py
+Tests the ffmpeg stderr failure classifier.
+"""
+
+from core.failures import (
+    BAD_INPUT,
+    GPU_BUSY,
+    GPU_FAULT,
+    GPU_UNSUPPORTED,
+    UNKNOWN,
+    backoff_delay,
+    classify_failure,
+    gpu_failure,
+)
+
+
+def test_classify_session_exhaustion():
+    err = "[h264_nvenc @ 0x55] OpenEncodeSessionEx failed: out of memory (10): (no details)"
+    assert classify_failure(err) == GPU_BUSY
+
+
+def test_classify_unsupported_input():
+    err = (
+        "[h264_nvenc @ 0x55] 10 bit encode not supported\n"
+        "[vost#0:0/h264_nvenc @ 0x56] Error while opening encoder - maybe incorrect parameters"
+    )
+    assert classify_failure(err) == GPU_UNSUPPORTED
+
+
+def test_classify_driver_fault():
+    assert classify_failure("[hevc_nvenc @ 0x1] EncodePicture failed!: CUDA_ERROR_UNKNOWN") == (
+        GPU_FAULT
+    )
+
+
+def test_classify_bad_input_wins():
+    err = "in.mp4: Invalid data found when processing input\nError while opening encoder"
+    assert classify_failure(err) == BAD_INPUT
+    assert gpu_failure(err) is None
+
+
+def test_gpu_failure_reports_last_line():
+    failure = gpu_failure("first\nsomething odd happened\n")
+    assert failure.kind == UNKNOWN
+    assert str(failure) == "something odd happened"
+
+
+def test_backoff_doubles_and_caps():
+    assert [backoff_delay(i, base=10) for i in range(3)] == [10, 20, 40]
+    assert backoff_delay(20, base=10) == 300
@@ -4,9 +4,22 @@ Tests the GPU detection logic using mocks.
 """
 
 import subprocess
+import threading
 from unittest.mock import patch
 
-from core.hardware import check_encoder, detect_gpu_codec
+import main
+from config.presets import PRESETS
+from core.hardware import (
+    GPU_ENCODERS,
+    backend_for,
+    check_encoder,
+    check_hw_pipeline,
+    detect_gpu_codec,
+    detect_hw_pipeline,
+    hw_video_args,
+    preset_codec_family,
+    probe_encoders,
+)
 
 
 @patch("subprocess.run")
@@ -42,3 +55,114 @@ def test_detect_no_gpu(mock_check):
     """Should return None if no hardware encoders work."""
     mock_check.return_value = False
     assert detect_gpu_codec() is None
+
+
+@patch("core.hardware.check_encoder")
+def test_detect_hevc_family(mock_check):
+    """HEVC presets must get an HEVC encoder, not the H.264 one."""
+    mock_check.side_effect = lambda enc: enc in ("h264_nvenc", "hevc_nvenc")
+    assert detect_gpu_codec("hevc") == "hevc_nvenc"
+
+
+@patch("core.hardware.check_encoder")
+def test_probe_uses_cache(mock_check):
+    """A second probe with the same ffmpeg binary must not start ffmpeg again."""
+    mock_check.return_value = False
+    probe_encoders()
+    calls = mock_check.call_count
+    assert calls == sum(len(v) for v in GPU_ENCODERS.values())
+
+    probe_encoders()
+    assert mock_check.call_count == calls
+
+
+@patch("core.hardware.check_encoder")
+def test_probe_refresh_ignores_cache(mock_check):
+    mock_check.return_value = False
+    probe_encoders()
+    mock_check.return_value = True
+    assert all(probe_encoders(refresh=True).values())
+
+
+@patch("core.hardware.ffmpeg_identity")
+@patch("core.hardware.check_encoder")
+def test_probe_cache_keyed_by_binary(mock_check, mock_identity):
+    """Swapping the ffmpeg binary (new version/mtime) invalidates the cache."""
+    mock_check.return_value = False
+    mock_identity.return_value = "ffmpeg|6.0|1"
+    probe_encoders()
+
+    mock_check.return_value = True
+    mock_identity.return_value = "ffmpeg|7.0|2"
+    assert probe_encoders()["h264_nvenc"] is True
+
+
+@patch("core.hardware.check_encoder")
+def test_probe_runs_in_parallel(mock_check):
+    """All candidates are probed concurrently instead of one after another."""
+    candidates = sum(len(v) for v in GPU_ENCODERS.values())
+    barrier = threading.Barrier(candidates, timeout=5)
+
+    def side_effect(enc):
+        barrier.wait()
+        return False
+
+    mock_check.side_effect = side_effect
+    probe_encoders()
+
+
+@patch("core.hardware.check_encoder", return_value=False)
+def test_refresh_probes_once_per_run(mock_check):
+    """--refresh-hardware renews the cache once, not for every codec family."""
+    candidates = sum(len(v) for v in GPU_ENCODERS.values())
+    probe_encoders()  # an older cache entry
+    mock_check.reset_mock()
+
+    hardware = main.HardwareResolver(refresh=True)
+    for family in GPU_ENCODERS:
+        hardware.gpu_codec(family)
+
+    assert mock_check.call_count == candidates
+
+
+def test_preset_codec_family():
+    assert preset_codec_family(PRESETS["2"]) == "h264"
+    assert preset_codec_family(PRESETS["5"]) == "hevc"
+
+
+def test_backend_for_encoder():
+    assert backend_for("h264_nvenc") == "cuda"
+    assert backend_for("hevc_qsv") == "qsv"
+    assert backend_for("h264_amf") is None
+
+
+def test_hw_video_args():
+    args = ["-preset", "p1", "-vf", "scale=-2:720"]
+    assert hw_video_args(args, "qsv") == ["-preset", "p1", "-vf", "scale_qsv=-2:720"]
+    # Filters without a GPU equivalent, or a forced pixel format, need the software path.
+    assert hw_video_args(["-vf", "scale=-2:720,unsharp"], "cuda") is None
+    assert hw_video_args(["-pix_fmt", "yuv420p"], "cuda") is None
+
+
+@patch("core.hardware.list_hwaccels", return_value={"cuda", "vaapi"})
+@patch("core.hardware.check_hw_pipeline", return_value=True)
+def test_detect_hw_pipeline_cached(mock_check, mock_hwaccels):
+    assert detect_hw_pipeline("h264_nvenc") == "cuda"
+    assert detect_hw_pipeline("h264_nvenc") == "cuda"
+    assert mock_check.call_count == 1
+
+
+@patch("core.hardware.list_hwaccels", return_value=set())
+@patch("core.hardware.check_hw_pipeline", return_value=True)
+def test_detect_hw_pipeline_needs_hwaccel(mock_check, mock_hwaccels):
+    """Without the hwaccel compiled in, there is no GPU decode path."""
+    assert detect_hw_pipeline("h264_qsv") is None
+    assert detect_hw_pipeline("h264_amf") is None
+
+
+@patch("subprocess.run")
+def test_check_hw_pipeline_command(mock_run):
+    assert check_hw_pipeline("hevc_nvenc") is True
+    cmd = mock_run.call_args[0][0]
+    assert "cuda=hw" in cmd
+    assert any("scale_cuda" in arg for arg in cmd)
@@ -0,0 +1,139 @@
+"""
+test_jobqueue.py
+Tests the shared-folder job queue and the coordinator/worker split.
+"""
+
+import os
+import threading
+from unittest.mock import patch
+
+import main
+from core.jobqueue import Claims, JobQueue, LivenessTracker, ticket_id
+from core.jobs import make_job
+
+
+def _ticket(name, cost=1, gpu_encoders=()):
+    return {"id": ticket_id(name), "output": name, "cost": cost, "gpu_encoders": list(gpu_encoders)}
+
+
+def test_claim_is_exclusive_and_most_expensive_first(tmp_path):
+    coordinator = JobQueue(str(tmp_path))
+    coordinator.put(_ticket("small.mp4", cost=1))
+    coordinator.put(_ticket("big.mp4", cost=9))
+    node_a, node_b = JobQueue(str(tmp_path)), JobQueue(str(tmp_path))
+
+    first = node_a.claim("a")
+    second = node_b.claim("b")
+    assert (first["output"], second["output"]) == ("big.mp4", "small.mp4")
+    assert node_a.claim("a") is None
+    assert coordinator.claims() == {first["id"]: "a", second["id"]: "b"}
+
+    node_a.complete(first, "a", {"ok": True})
+    results = coordinator.results()
+    assert [(r["output"], r["worker"], r["ok"]) for r in results] == [("big.mp4", "a", True)]
+    assert coordinator.results() == []
+    assert coordinator.claims() == {second["id"]: "b"}
+
+
+def test_claim_skips_tickets_the_worker_does_not_accept(tmp_path):
+    queue = JobQueue(str(tmp_path))
+    queue.put(_ticket("gpu.mp4", cost=9, gpu_encoders=["hevc_nvenc"]))
+    queue.put(_ticket("cpu.mp4", cost=1))
+
+    ticket = queue.claim("w", accept=lambda t: not t["gpu_encoders"])
+    assert ticket["output"] == "cpu.mp4"
+
+
+def test_release_requeues_a_claim(tmp_path):
+    queue = JobQueue(str(tmp_path))
+    queue.put(_ticket("a.mp4"))
+    ticket = queue.claim("dead")
+
+    assert queue.release(ticket["id"], "dead") is True
+    assert queue.claim("alive")["id"] == ticket["id"]
+
+
+def test_requeued_ticket_is_published_by_its_new_owner_only(tmp_path):
+    out = str(tmp_path / "out" / "a.mp4")
+    queue = JobQueue(str(tmp_path / "queue"))
+    queue.put(_ticket(out))
+    ticket = queue.claim("a")
+    # The coordinator took a slow worker for dead and re-queued its ticket.
+    queue.release(ticket["id"], "a")
+    assert queue.claim("b") == ticket
+    slow, fast = Claims(queue, "a"), Claims(queue, "b")
+
+    assert slow.partial_path(out) != fast.partial_path(out)
+    assert not slow.holds(out) and fast.holds(out)
+    assert queue.complete(ticket, "a", {"ok": False}) is False
+    assert queue.complete(ticket, "b", {"ok": True}) is True
+    assert [(r["worker"], r["ok"]) for r in queue.results()] == [("b", True)]
+
+
+def test_liveness_uses_heartbeat_changes_not_clocks():
+    now = [0.0]
+    tracker = LivenessTracker(timeout=10, clock=lambda: now[0])
+    workers = [{"name": "a", "beat": 1}, {"name": "b", "beat": 1}]
+
+    assert tracker.dead(workers, ["a", "b"]) == set()
+    now[0] = 8
+    workers = [{"name": "a", "beat": 2}, {"name": "b", "beat": 1}]
+    assert tracker.dead(workers, ["a", "b"]) == set()
+    now[0] = 12
+    assert tracker.dead(workers, ["a", "b"]) == {"b"}
+
+
+def test_alive_ignores_clock_skew_between_hosts():
+    now = [0.0]
+    tracker = LivenessTracker(timeout=10, clock=lambda: now[0])
+    # Written by hosts whose clocks are hours apart.
+    workers = [{"name": "a", "beat": 1, "updated": 0}, {"name": "b", "beat": 1, "updated": 1e9}]
+    assert [w["name"] for w in tracker.alive(workers)] == ["a", "b"]
+    now[0] = 8
+    workers = [{"name": "a", "beat": 2, "updated": -1e9}, {"name": "b", "beat": 1, "updated": 1e9}]
+    assert [w["name"] for w in tracker.alive(workers)] == ["a", "b"]
+    now[0] = 12
+    assert [w["name"] for w in tracker.alive(workers)] == ["a"]
+
+
+def test_coordinator_with_two_workers(tmp_path):
+    source = tmp_path / "in"
+    source.mkdir()
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        (source / name).write_bytes(b"video" * 10)
+    job = make_job({"preset": "4", "source": str(source), "dest": str(tmp_path / "out")})
+    queue_dir = str(tmp_path / "queue")
+    done_by = []
+
+    def fake_process(task, *args, **kwargs):
+        done_by.append(threading.current_thread().name)
+        os.makedirs(os.path.dirname(task[1]), exist_ok=True)
+        with open(task[1], "wb") as f:
+            f.write(b"v")
+        return True
+
+    results = []
+
+    def worker(name):
+        with patch("main.worker_name", return_value=name):
+            results.append(main.run_worker(queue_dir, workers=1, poll=0.05))
+
+    with (
+        patch("core.pipeline.process_file", side_effect=fake_process),
+        patch("core.pipeline.task_cost", return_value=1.0),
+        patch("main.detect_gpu_codec", return_value=None),
+    ):
+        coordinator = threading.Thread(
+            target=lambda: results.append(main.run_coordinator([job], queue_dir, poll=0.05))
+        )
+        coordinator.start()
+        threads = [threading.Thread(target=worker, args=(n,)) for n in ("node1", "node2")]
+        for t in threads:
+            t.start()
+        for t in [coordinator, *threads]:
+            t.join(30)
+
+    summary = next(r for r in results if "jobs" in r)
+    assert summary["completed"] == 3 and summary["failed"] == 0
+    assert sum(r.get("completed", 0) for r in results if "worker" in r) == 3
+    assert sorted(os.listdir(tmp_path / "out"))[-3:] == ["a.mp4", "b.mp4", "c.mp4"]
@@ -0,0 +1,166 @@
+"""
+test_jobs.py
+Tests job file parsing and the shared-pool batch run.
+"""
+
+import json
+import os
+import threading
+from unittest.mock import patch
+
+import pytest
+
+import main
+from core.jobs import JobFileError, job_preset, load_job_file, make_job, path_selected
+from core.scheduler import ResourceScheduler
+
+
+def _tree(tmp_path):
+    for rel in ("term1/raw/a.mp4", "term2/raw/b.mp4", "term2/raw/drafts/c.mp4"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"video")
+    return tmp_path
+
+
+def test_toml_job_file(tmp_path):
+    _tree(tmp_path)
+    spec_path = tmp_path / "run.toml"
+    spec_path.write_text(
+        'workers = 3\nsummary = "out.json"\n'
+        '[defaults]\nextensions = ["MP4"]\n'
+        '[[jobs]]\npreset = "1"\nsource = "*/raw"\ndest = "out"\nexclude = ["drafts/*"]\n'
+    )
+    spec = load_job_file(str(spec_path))
+
+    assert spec["workers"] == 3
+    assert spec["summary"] == str(tmp_path / "out.json")
+    job = spec["jobs"][0]
+    assert job["sources"] == [str(tmp_path / "term1/raw"), str(tmp_path / "term2/raw")]
+    assert job["dest"] == str(tmp_path / "out")
+    assert job["extensions"] == (".mp4",)
+    assert job["name"] == "job 1"
+
+
+def test_multi_rendition_presets(tmp_path):
+    job = make_job({"preset": ["5", "4", 3], "source": ".", "dest": "o"}, tmp_path)
+    assert job["presets"] == ["5", "4", "3"]
+    assert job["preset"] == "5,4,3"
+    assert job_preset(job, "4")["name"].startswith("Editing Proxy")
+    assert make_job({"preset": "5, 4", "source": ".", "dest": "o"}, tmp_path)["presets"] == [
+        "5",
+        "4",
+    ]
+
+
+def test_json_job_file(tmp_path):
+    _tree(tmp_path)
+    spec_path = tmp_path / "run.json"
+    spec_path.write_text(json.dumps({"jobs": [{"preset": 4, "source": "term1", "dest": "o"}]}))
+    assert load_job_file(str(spec_path))["jobs"][0]["preset"] == "4"
+
+
+@pytest.mark.parametrize(
+    "entry, message",
+    [
+        ({"preset": "9", "source": ".", "dest": "o"}, "unknown preset"),
+        ({"preset": "1", "source": "missing", "dest": "o"}, "source not found"),
+        ({"preset": "1", "source": "."}, "missing 'dest'"),
+        ({"preset": "1", "source": ".", "dest": "o", "speed": 2}, "unknown keys speed"),
+        ({"preset": "5,5", "source": ".", "dest": "o"}, "same output name"),
+        ({"preset": ["5", "3"], "source": ".", "dest": "o", "quality_target": 0.9}, "single"),
+    ],
+)
+def test_invalid_jobs(tmp_path, entry, message):
+    with pytest.raises(JobFileError, match=message):
+        make_job(entry, str(tmp_path))
+
+
+def test_unparseable_file(tmp_path):
+    spec_path = tmp_path / "run.toml"
+    spec_path.write_text("jobs = [")
+    with pytest.raises(JobFileError, match="cannot parse"):
+        load_job_file(str(spec_path))
+
+
+def test_path_selected():
+    assert path_selected("a.mp4", include=["**/*.mp4"])
+    assert path_selected("x/a.mp4", include=["**/*.mp4"])
+    assert not path_selected("a.mov", include=["**/*.mp4"])
+    assert not path_selected("drafts/a.mp4", exclude=["drafts/*"])
+
+
+def test_job_preset_overrides(tmp_path):
+    job = make_job(
+        {"preset": "3", "source": ".", "dest": "o", "passthrough": False, "quality_target": 0.97},
+        str(tmp_path),
+    )
+    preset = job_preset(job)
+    assert preset["passthrough"] is None
+    assert preset["quality_search"] == {"target": 0.97, "metric": "ssim"}
+
+
+def test_run_jobs_shares_one_pool(tmp_path):
+    """Two jobs run through one pipeline; the summary counts each job separately."""
+    _tree(tmp_path)
+    jobs = [
+        make_job({"preset": "1", "source": "*/raw", "dest": "o1", "exclude": "drafts/*"}, tmp_path),
+        make_job({"preset": "4", "source": "term2", "dest": "o2", "name": "proxy"}, tmp_path),
+    ]
+
+    def fake_process(task, *args, **kwargs):
+        if "drafts" in task[0]:
+            return False
+        os.makedirs(os.path.dirname(task[1]), exist_ok=True)
+        with open(task[1], "wb") as f:
+            f.write(b"v")
+        return True
+
+    with (
+        patch("core.pipeline.process_file", side_effect=fake_process),
+        patch("core.pipeline.task_cost", return_value=1.0),
+        patch("main.detect_gpu_codec", return_value=None),
+    ):
+        summary = main.run_jobs(jobs, workers=2)
+
+    first, second = summary["jobs"]
+    assert (first["found"], first["completed"], first["failed"]) == (2, 2, 0)
+    assert (second["name"], second["completed"], second["failed"]) == ("proxy", 1, 1)
+    assert summary["completed"] == 3 and summary["failed"] == 1
+    # Several matched folders are kept apart in the output.
+    assert (tmp_path / "o1" / "term1" / "raw" / "a.mp4").exists()
+    assert (tmp_path / "o1" / "term2" / "raw" / "b.mp4").exists()
+
+
+def test_run_jobs_runs_cpu_and_gpu_jobs_side_by_side(tmp_path):
+    """The pool has room for both budgets, so a CPU job can't keep the GPU idle."""
+    for rel in ("cpu/a.mp4", "gpu/b.mp4"):
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_bytes(b"video")
+    jobs = [
+        make_job({"preset": "1", "source": "cpu", "dest": "o1"}, tmp_path),
+        make_job({"preset": "5", "source": "gpu", "dest": "o2"}, tmp_path),
+    ]
+    both_running = threading.Barrier(2)
+
+    def fake_process(task, scheduler, *args):
+        with scheduler.reserve(bool(task[4])):
+            both_running.wait(timeout=5)
+        with open(task[1], "wb") as f:
+            f.write(b"v")
+        return True
+
+    with (
+        patch("core.pipeline.process_file", side_effect=fake_process),
+        patch("core.pipeline.task_cost", return_value=1.0),
+        patch("main.detect_gpu_codec", return_value="hevc_nvenc"),
+        patch("main.detect_hw_pipeline", return_value=None),
+        patch(
+            "main.ResourceScheduler",
+            lambda: ResourceScheduler(cpu_threads=6, gpu_sessions=1, threads_per_job=4),
+        ),
+    ):
+        summary = main.run_jobs(jobs)
+
+    assert summary["workers"] == 2
+    assert (summary["completed"], summary["failed"]) == (2, 0)
@@ -0,0 +1,108 @@
+"""
+test_manifest.py
+Tests the persistent job manifest used to skip unchanged files.
+"""
+
+import os
+
+from core.manifest import MANIFEST_NAME, Manifest, fingerprint
+
+
+def _make_source(folder, name="in.mp4", data=b"video-bytes"):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _make_output(folder, name="out.mp4"):
+    path = os.path.join(folder, name)
+    with open(path, "wb") as f:
+        f.write(b"encoded")
+    return path
+
+
+def test_fingerprint_detects_content_change(tmp_path):
+    """Same size, different bytes must give a different fingerprint."""
+    a = _make_source(tmp_path, "a.mp4", b"A" * 4096)
+    b = _make_source(tmp_path, "b.mp4", b"B" * 4096)
+    assert fingerprint(a) != fingerprint(b)
+    assert fingerprint(a) == fingerprint(a)
+
+
+def test_fingerprint_reads_head_and_tail(tmp_path):
+    """Changes in the tail block of a large file are noticed."""
+    a = _make_source(tmp_path, "a.mp4", b"\0" * 100 + b"X")
+    b = _make_source(tmp_path, "b.mp4", b"\0" * 100 + b"Y")
+    assert fingerprint(a, block_size=16) != fingerprint(b, block_size=16)
+
+
+def test_unknown_output_is_not_current(tmp_path):
+    src = _make_source(tmp_path)
+    manifest = Manifest(tmp_path)
+    assert manifest.is_current(src, str(tmp_path / "out.mp4"), "1", "libx264") is False
+
+
+def test_recorded_output_is_skipped_after_reload(tmp_path):
+    """A resumed run must see entries written by the previous run."""
+    src = _make_source(tmp_path)
+    out = _make_output(tmp_path)
+
+    Manifest(tmp_path).record(src, out, "1", "libx264")
+
+    reloaded = Manifest(tmp_path)
+    assert reloaded.is_current(src, out, "1", "libx264") is True
+
+
+def test_changed_settings_are_not_current(tmp_path):
+    src = _make_source(tmp_path)
+    out = _make_output(tmp_path)
+    manifest = Manifest(tmp_path)
+    manifest.record(src, out, "1", "libx264")
+
+    assert manifest.is_current(src, out, "2", "libx264") is False
+    assert manifest.is_current(src, out, "1", "h264_nvenc") is False
+
+
+def test_modified_source_is_not_current(tmp_path):
+    src = _make_source(tmp_path)
+    out = _make_output(tmp_path)
+    manifest = Manifest(tmp_path)
+    manifest.record(src, out, "1", "libx264")
+
+    _make_source(tmp_path, data=b"new recording, longer")
+    assert manifest.is_current(src, out, "1", "libx264") is False
+
+
+def test_touched_source_falls_back_to_fingerprint(tmp_path):
+    """An mtime change with identical bytes is still considered current."""
+    src = _make_source(tmp_path)
+    out = _make_output(tmp_path)
+    manifest = Manifest(tmp_path)
+    manifest.record(src, out, "1", "libx264")
+
+    st = os.stat(src)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert manifest.is_current(src, out, "1", "libx264") is True
+
+
+def test_deleted_output_is_not_current(tmp_path):
+    src = _make_source(tmp_path)
+    out = _make_output(tmp_path)
+    manifest = Manifest(tmp_path)
+    manifest.record(src, out, "1", "libx264")
+
+    os.remove(out)
+    assert manifest.is_current(src, out, "1", "libx264") is False
+
+
+def test_torn_line_is_ignored(tmp_path):
+    """A partially written line from a crash must not break loading."""
+    src = _make_source(tmp_path)
+    out = _make_output(tmp_path)
+    Manifest(tmp_path).record(src, out, "1", "libx264")
+
+    with open(tmp_path / MANIFEST_NAME, "a", encoding="utf-8") as f:
+        f.write('{"output": "trunc')
+
+    assert Manifest(tmp_path).is_current(src, out, "1", "libx264") is True
@@ -0,0 +1,107 @@
+"""
+test_metrics.py
+Tests per-job metrics records, their JSONL/Prometheus export and the summary.
+"""
+
+import json
+import urllib.request
+
+from config.presets import PRESETS
+from core.metrics import FAILED, OK, JobMetrics, MetricsRecorder, format_summary
+
+
+def _job(name="a.mp4", preset="1", encoder="libx264", status=OK, seconds=10.0, queued_at=None):
+    job = JobMetrics(("/in/" + name, "/out/" + name, name, PRESETS[preset], None), queued_at)
+    job.set(
+        encoder=encoder,
+        mode="encode",
+        status=status,
+        exit_code=0 if status == OK else 1,
+        encode_seconds=seconds,
+        input_bytes=20_000_000,
+        output_bytes=5_000_000,
+        duration=60.0,
+    )
+    return job
+
+
+def test_job_metrics_fold_usage_and_time():
+    job = JobMetrics(("/in/a.mp4", "/out/a.mp4", "a.mp4", PRESETS["1"], None), queued_at=0.0)
+    assert job.record["queue_wait"] > 0
+    # Segments of a chunked encode each report their own child.
+    job.add_usage({"cpu_user": 2.0, "cpu_system": 0.5, "peak_rss_kb": 1000})
+    job.add_usage({"cpu_user": 1.0, "cpu_system": 0.25, "peak_rss_kb": 3000})
+    with job.timed("probe_seconds"):
+        pass
+    assert (job.record["cpu_user"], job.record["cpu_system"]) == (3.0, 0.75)
+    assert job.record["peak_rss_kb"] == 3000
+    assert job.record["probe_seconds"] >= 0
+
+
+def test_recorder_writes_jsonl_and_summarizes(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    recorder = MetricsRecorder(str(path))
+
+    recorder.record(_job("a.mp4"))
+    recorder.record(_job("b.mp4", seconds=30.0))
+    recorder.record(_job("c.mp4", preset="2", encoder="h264_nvenc", seconds=5.0))
+    recorder.record(_job("d.mp4", status=FAILED))
+    crashed = _job("e.mp4")
+    crashed.set(status=None)
+    recorder.record(crashed)
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["status"] for r in lines] == ["ok", "ok", "ok", "failed", "error"]
+    assert lines[0]["encode_seconds"] == 10.0 and lines[0]["input_bytes"] == 20_000_000
+
+    summary = recorder.summary()
+    lecture = summary["presets"][PRESETS["1"]["name"]]
+    # Failed jobs are counted in mvc_jobs_total but not in the throughput.
+    assert lecture["jobs"] == 2
+    assert lecture["mb_per_s"] == 1.0  # 40 MB in 40 s
+    assert lecture["realtime"] == 3.0  # 120 s of media in 40 s
+    assert summary["encoders"]["h264_nvenc"]["mb_per_s"] == 4.0
+    report = format_summary(summary)
+    assert any("h264_nvenc: 1 job(s), 4.00 MB/s, 12.00x realtime" in line for line in report)
+
+
+def test_prometheus_textfile(tmp_path):
+    prom = tmp_path / "mvc.prom"
+    recorder = MetricsRecorder(prometheus=str(prom))
+    job = _job()
+    job.add_usage({"cpu_user": 8.0, "cpu_system": 1.0, "peak_rss_kb": 2048})
+    recorder.record(job)
+
+    text = prom.read_text()
+    labels = '{preset="Lecture Mode (Slides + Voice)",encoder="libx264"'
+    assert f'mvc_jobs_total{labels},status="ok"}} 1' in text
+    assert f"mvc_encode_seconds_total{labels}}} 10" in text
+    assert f"mvc_cpu_user_seconds_total{labels}}} 8" in text
+    assert f"mvc_peak_rss_bytes{labels}}} {2048 * 1024}" in text
+    assert "# TYPE mvc_input_bytes_total counter" in text
+
+
+def test_prometheus_endpoint():
+    recorder = MetricsRecorder(prometheus="0")  # any free port
+    try:
+        recorder.record(_job())
+        port = recorder.server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode()
+        assert "mvc_jobs_total" in body
+        assert response.headers["Content-Type"].startswith("text/plain")
+    finally:
+        recorder.close()
+
+
+def test_prometheus_endpoint_binds_localhost_by_default():
+    recorder = MetricsRecorder(prometheus="0")
+    try:
+        assert recorder.server.server_address[0] == "127.0.0.1"
+    finally:
+        recorder.close()
+    recorder = MetricsRecorder(prometheus="0.0.0.0:0")
+    try:
+        assert recorder.server.server_address[0] == "0.0.0.0"
+    finally:
+        recorder.close()
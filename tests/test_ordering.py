@@ -0,0 +1,95 @@
+"""
+test_ordering.py
+Tests cost estimation and longest-first job ordering.
+"""
+
+import heapq
+import random
+
+from config.presets import PRESETS
+from core.ordering import ThroughputHistory, estimate_cost
+
+
+def _simulate_makespan(costs, workers):
+    """
+    Returns the finish time of the last job when `costs` are handed, in order,
+    to whichever of `workers` identical workers frees up first.
+    """
+    if not costs:
+        return 0.0
+    finish = [0.0] * max(1, workers)
+    for cost in costs:
+        heapq.heapreplace(finish, finish[0] + cost)
+    return max(finish)
+
+
+def _info(duration, width=1920, height=1080):
+    return {"duration": duration, "video": {"width": width, "height": height}}
+
+
+def test_cost_scales_with_duration_and_resolution():
+    preset = PRESETS["1"]
+    hd = estimate_cost(_info(600), 0, preset, "libx264", False)
+    uhd = estimate_cost(_info(600, 3840, 2160), 0, preset, "libx264", False)
+    long = estimate_cost(_info(1200), 0, preset, "libx264", False)
+
+    assert uhd == 4 * hd
+    assert long == 2 * hd
+
+
+def test_cost_uses_engine_speed_hint():
+    preset = PRESETS["5"]
+    gpu = estimate_cost(_info(600), 0, preset, "hevc_nvenc", True)
+    cpu = estimate_cost(_info(600), 0, preset, "libx265", False)
+    assert cpu > gpu
+
+
+def test_cost_without_probe_uses_file_size():
+    small = estimate_cost(None, 10_000_000, PRESETS["1"], "libx264", False)
+    large = estimate_cost(None, 20_000_000, PRESETS["1"], "libx264", False)
+    assert large == 2 * small
+
+
+def test_history_refines_estimate(tmp_path):
+    """Measured speed replaces the preset hint and survives a reload."""
+    preset = PRESETS["1"]
+    history = ThroughputHistory(str(tmp_path / "throughput.json"))
+    # 600s of 1080p encoded in 60s -> 10x realtime
+    history.record(preset, "libx264", _info(600), 0, wall=60)
+
+    reloaded = ThroughputHistory(str(tmp_path / "throughput.json"))
+    assert reloaded.speed(preset, "libx264") == 10
+    assert estimate_cost(_info(600), 0, preset, "libx264", False, reloaded) == 60
+
+
+def test_history_moving_average(tmp_path):
+    preset = PRESETS["1"]
+    history = ThroughputHistory(str(tmp_path / "throughput.json"))
+    history.record(preset, "libx264", _info(100), 0, wall=10)
+    history.record(preset, "libx264", _info(100), 0, wall=5)
+    assert 10 < history.speed(preset, "libx264") < 20
+
+
+def test_makespan_simulation():
+    assert _simulate_makespan([], 4) == 0
+    assert _simulate_makespan([3, 3, 3], 3) == 3
+    assert _simulate_makespan([2, 2, 4], 2) == 6
+    assert _simulate_makespan([4, 2, 2], 2) == 4
+
+
+def test_lpt_beats_listdir_order_on_synthetic_batch():
+    """
+    Synthetic nightly batch: 40 lectures of 10-60 min plus one 4-hour capture
+    that happens to be listed last. With 5 workers, listdir order leaves one
+    worker encoding the big file long after the rest are idle.
+    """
+    rng = random.Random(42)
+    costs = [rng.uniform(600, 3600) for _ in range(40)] + [14400]
+
+    fifo = _simulate_makespan(costs, workers=5)
+    lpt = _simulate_makespan(sorted(costs, reverse=True), workers=5)
+
+    lower_bound = max(max(costs), sum(costs) / 5)
+    assert lpt < fifo
+    assert lpt <= lower_bound * 4 / 3  # Graham's LPT bound
+    assert fifo > lower_bound * 1.3
@@ -0,0 +1,75 @@
+"""
+test_passthrough.py
+Tests the per-preset acceptance criteria for the stream-copy fast path.
+"""
+
+from config.presets import PRESETS
+from core.passthrough import COPY_ALL, COPY_VIDEO, channel_count, passthrough_mode
+
+
+def _info(
+    codec="h264", height=720, kbps=900, pix_fmt="yuv420p", audio="aac", akbps=96, ch="stereo"
+):
+    info = {
+        "bitrate_kbps": None,
+        "video": {
+            "codec": codec,
+            "pix_fmt": pix_fmt,
+            "width": height * 16 // 9,
+            "height": height,
+            "bitrate_kbps": kbps,
+        },
+        "audio": None,
+    }
+    if audio:
+        info["audio"] = {"codec": audio, "bitrate_kbps": akbps, "channels": ch}
+    return info
+
+
+def test_compliant_social_clip_is_remuxed():
+    """720p 1 Mbps H.264 + AAC under preset 3 needs no encoding at all."""
+    assert passthrough_mode(_info(), PRESETS["3"]) == COPY_ALL
+
+
+def test_compliant_video_with_other_audio_copies_video_only():
+    assert passthrough_mode(_info(audio="opus"), PRESETS["3"]) == COPY_VIDEO
+    assert passthrough_mode(_info(akbps=320), PRESETS["3"]) == COPY_VIDEO
+
+
+def test_non_compliant_video_is_reencoded():
+    assert passthrough_mode(_info(height=1080), PRESETS["3"]) is None
+    assert passthrough_mode(_info(kbps=5000), PRESETS["3"]) is None
+    assert passthrough_mode(_info(codec="mpeg4"), PRESETS["3"]) is None
+    assert passthrough_mode(_info(pix_fmt="yuv444p"), PRESETS["3"]) is None
+
+
+def test_unknown_bitrate_is_not_trusted():
+    assert passthrough_mode(_info(kbps=None), PRESETS["3"]) is None
+
+
+def test_bitrate_falls_back_to_container_total():
+    """Matroska only reports the overall bitrate; audio is subtracted from it."""
+    info = _info(kbps=None, akbps=100)
+    info["bitrate_kbps"] = 1100
+    assert passthrough_mode(info, PRESETS["3"]) == COPY_ALL
+
+
+def test_silent_source():
+    assert passthrough_mode(_info(audio=None), PRESETS["3"]) == COPY_ALL
+
+
+def test_archive_keeps_existing_hevc():
+    assert passthrough_mode(_info(codec="hevc", height=2160, kbps=50000), PRESETS["5"]) == COPY_ALL
+    assert passthrough_mode(_info(codec="h264"), PRESETS["5"]) is None
+
+
+def test_presets_without_criteria_always_encode():
+    assert passthrough_mode(_info(), PRESETS["4"]) is None
+    assert passthrough_mode(None, PRESETS["3"]) is None
+
+
+def test_channel_count():
+    assert channel_count("mono") == 1
+    assert channel_count("5.1(side)") == 6
+    assert channel_count("3 channels") == 3
+    assert channel_count(None) is None
@@ -0,0 +1,178 @@
+"""
+test_pipeline.py
+Tests the streaming probe -> prioritise -> encode pipeline.
+"""
+
+import concurrent.futures
+import threading
+import time
+from unittest.mock import patch
+
+from config.presets import PRESETS
+from core.failures import GPU_BUSY, GPU_UNSUPPORTED, GpuFailure
+from core.metrics import MetricsRecorder
+from core.pipeline import Pipeline
+
+
+def _task(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"x")
+    return (str(path), str(tmp_path / "out" / name), name, PRESETS["1"], None)
+
+
+@patch("core.pipeline.task_cost")
+@patch("core.pipeline.process_file")
+def test_pipeline_runs_all_and_reports(mock_process, mock_cost, tmp_path):
+    mock_cost.return_value = 1.0
+    mock_process.side_effect = lambda task, *a: task[2] != "bad.mp4"
+    done = []
+
+    with Pipeline(workers=2) as pipeline:
+        for name in ("a.mp4", "b.mp4", "bad.mp4"):
+            pipeline.submit(_task(tmp_path, name), lambda task, ok: done.append((task[2], ok)))
+
+    assert sorted(done) == [("a.mp4", True), ("b.mp4", True), ("bad.mp4", False)]
+    assert (pipeline.submitted, pipeline.completed, pipeline.failed) == (3, 2, 1)
+
+
+@patch("core.pipeline.task_cost")
+@patch("core.pipeline.process_file")
+def test_pipeline_records_metrics_per_job(mock_process, mock_cost, tmp_path):
+    mock_cost.return_value = 1.0
+
+    def fake_process(task, scheduler, progress, history, metrics, stager, claims):
+        if task[2] == "crash.mp4":
+            raise RuntimeError("boom")
+        metrics.set(status="ok", encoder="libx264", encode_seconds=1.0)
+        return True
+
+    mock_process.side_effect = fake_process
+    recorder = MetricsRecorder(str(tmp_path / "metrics.jsonl"))
+
+    with Pipeline(workers=1, metrics=recorder) as pipeline:
+        for name in ("a.mp4", "crash.mp4"):
+            pipeline.submit(_task(tmp_path, name))
+
+    assert recorder.jobs == {
+        (PRESETS["1"]["name"], "libx264", "ok"): 1,
+        (PRESETS["1"]["name"], "none", "error"): 1,
+    }
+
+
+@patch("core.pipeline.task_cost")
+@patch("core.pipeline.process_file")
+def test_pipeline_prefers_largest_pending(mock_process, mock_cost, tmp_path):
+    """While the only worker is busy, later large files jump ahead of small ones."""
+    costs = {"first.mp4": 1, "small.mp4": 1, "huge.mp4": 100, "mid.mp4": 10}
+    mock_cost.side_effect = lambda task, history: costs[task[2]]
+    gate = threading.Event()
+    order = []
+
+    def fake_process(task, *args):
+        if task[2] == "first.mp4":
+            gate.wait(5)
+        order.append(task[2])
+        return True
+
+    mock_process.side_effect = fake_process
+
+    with Pipeline(workers=1) as pipeline:
+        pipeline.submit(_task(tmp_path, "first.mp4"))
+        while not mock_process.called:
+            pass
+        for name in ("small.mp4", "huge.mp4", "mid.mp4"):
+            pipeline.submit(_task(tmp_path, name))
+        pipeline._probe_pool.shutdown(wait=True)
+        gate.set()
+
+    assert order == ["first.mp4", "huge.mp4", "mid.mp4", "small.mp4"]
+
+
+@patch("core.pipeline.task_cost")
+@patch("core.pipeline.process_file")
+def test_pipeline_survives_worker_exception(mock_process, mock_cost, tmp_path):
+    mock_cost.return_value = 1.0
+    mock_process.side_effect = RuntimeError("boom")
+
+    with Pipeline(workers=1) as pipeline:
+        pipeline.submit(_task(tmp_path, "a.mp4"))
+
+    assert pipeline.failed == 1
+
+
+@patch("core.pipeline.task_cost")
+@patch("core.pipeline.process_file")
+def test_pipeline_retries_gpu_failure_on_cpu(mock_process, mock_cost, tmp_path):
+    mock_cost.return_value = 1.0
+    seen = []
+
+    def fake_process(task, *args):
+        seen.append(task[4])
+        if task[4]:
+            raise GpuFailure(GPU_UNSUPPORTED, "10 bit encode not supported")
+        return True
+
+    mock_process.side_effect = fake_process
+    done = []
+    task = (*_task(tmp_path, "a.mp4")[:3], PRESETS["2"], "h264_nvenc")
+
+    with Pipeline(workers=1) as pipeline:
+        pipeline.submit(task, lambda task, ok: done.append((task[4], ok)))
+
+    assert seen == ["h264_nvenc", None]
+    assert done == [(None, True)]
+    assert (pipeline.submitted, pipeline.completed, pipeline.failed) == (1, 1, 0)
+
+
+@patch("core.pipeline.backoff_delay", return_value=0)
+@patch("core.pipeline.task_cost")
+@patch("core.pipeline.process_file")
+def test_pipeline_waits_for_busy_gpu_then_falls_back(mock_process, mock_cost, _delay, tmp_path):
+    mock_cost.return_value = 1.0
+    seen = []
+
+    def fake_process(task, *args):
+        seen.append(task[4])
+        if task[4]:
+            raise GpuFailure(GPU_BUSY, "OpenEncodeSessionEx failed: out of memory (10)")
+        return True
+
+    mock_process.side_effect = fake_process
+    task = (*_task(tmp_path, "a.mp4")[:3], PRESETS["2"], "h264_nvenc")
+
+    with patch("core.pipeline.GPU_RETRY_LIMIT", 2), Pipeline(workers=1) as pipeline:
+        pipeline.submit(task)
+
+    assert seen == ["h264_nvenc", "h264_nvenc", "h264_nvenc", None]
+    assert pipeline.completed == 1
+
+
+@patch("core.pipeline.task_cost")
+@patch("core.pipeline.process_file")
+def test_pipeline_finishes_staged_tasks_after_upload(mock_process, mock_cost, tmp_path):
+    mock_cost.return_value = 1.0
+    uploads = []
+
+    def fake_process(task, *args):
+        upload = concurrent.futures.Future()
+        uploads.append(upload)
+        return upload
+
+    mock_process.side_effect = fake_process
+    done = []
+    pipeline = Pipeline(workers=1)
+    pipeline.submit(_task(tmp_path, "a.mp4"), lambda task, ok: done.append(ok))
+    pipeline.submit(_task(tmp_path, "b.mp4"), lambda task, ok: done.append(ok))
+
+    # The worker moved on to the second encode while the first upload is pending.
+    for _ in range(100):
+        if len(uploads) == 2:
+            break
+        time.sleep(0.01)
+    assert len(uploads) == 2 and done == []
+
+    uploads[0].set_result(True)
+    uploads[1].set_result(False)
+    pipeline.close()
+    assert done == [True, False]
+    assert (pipeline.completed, pipeline.failed) == (1, 1)
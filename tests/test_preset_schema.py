@@ -0,0 +1,97 @@
+"""
+test_preset_schema.py
+Tests preset validation, structured fields and user preset files.
+"""
+
+import pytest
+
+from config import presets as preset_config
+from config.presets import PRESETS, load_user_presets
+from core.preset_schema import PresetError, load_preset_file, validate_preset, video_args
+from core.processor import build_command
+
+
+def _structured(**extra):
+    return {
+        "name": "Screencast",
+        "description": "Structured preset",
+        "use_gpu": True,
+        "video": {"codec": "libx264", "preset": "slow", "crf": 24, "gop": 240},
+        "gpu": {"h264_nvenc": {"rc": "constqp", "qp": 24, "preset": "p6"}},
+        "scale": {"height": 1080},
+        "audio": {"codec": "aac", "bitrate": "96k", "channels": 1},
+        **extra,
+    }
+
+
+def test_builtin_presets_are_compiled():
+    for p in PRESETS.values():
+        assert "cpu" in p["compiled"]
+        for encoder in p["gpu_quality_flags"]:
+            assert encoder in p["compiled"]
+
+
+def test_structured_fields_compile_to_argv():
+    preset = validate_preset("6", _structured())
+
+    cpu = ["-c:v", "libx264", "-preset", "slow", "-crf", "24", "-g", "240"]
+    nvenc = ["-preset", "p6", "-rc", "constqp", "-qp", "24"]
+    assert preset["cpu_fallback"] == cpu
+    assert preset["gpu_quality_flags"]["h264_nvenc"] == nvenc
+    assert preset["video_params"] == ["-vf", "scale=-2:1080"]
+    assert preset["audio_params"] == ["-c:a", "aac", "-b:a", "96k", "-ac", "1"]
+    assert video_args(preset, "h264_nvenc")[-2:] == ["-vf", "scale=-2:1080"]
+
+
+def test_build_command_uses_compiled_template():
+    preset = validate_preset("6", _structured())
+    preset["compiled"]["cpu"] = ["-c:v", "marker"]
+    assert "marker" in build_command("in.mp4", "out.mp4", preset)
+
+
+@pytest.mark.parametrize(
+    "change, message",
+    [
+        ({"use_gpu": "yes"}, "wrong type"),
+        ({"bitrate": "1M"}, "unknown keys bitrate"),
+        ({"video": {"codec": "libx264", "speed": 3}}, "unknown fields speed"),
+        ({"gpu": {"h264_nvenc": {"codec": "x"}}}, "unknown fields codec"),
+        ({"cpu_fallback": ["-crf", "20"]}, "either 'video' or 'cpu_fallback'"),
+        ({"video": {"crf": 20}}, "no CPU encoder"),
+        ({"passthrough": {"max_fps": 30}}, "passthrough accepts"),
+        ({"est_speed": {"cpu": 0}}, "est_speed"),
+    ],
+)
+def test_invalid_presets(change, message):
+    with pytest.raises(PresetError, match=message):
+        validate_preset("6", _structured(**change))
+
+
+def test_gpu_preset_cannot_pick_encoder_in_video_params():
+    raw = {**PRESETS["2"], "video_params": ["-c:v", "libx264"]}
+    with pytest.raises(PresetError, match="video_params"):
+        validate_preset("2", raw)
+
+
+def test_user_preset_file(tmp_path, monkeypatch):
+    path = tmp_path / "presets.toml"
+    path.write_text(
+        '[presets.6]\nname = "Screencast"\ndescription = "x"\nuse_gpu = false\n'
+        'video = { codec = "libx264", crf = 30 }\naudio_params = ["-c:a", "copy"]\n'
+    )
+    monkeypatch.setattr(preset_config, "PRESETS", dict(PRESETS))
+
+    assert load_user_presets(str(path)) == ["6"]
+    assert preset_config.PRESETS["6"]["compiled"]["cpu"] == ["-c:v", "libx264", "-crf", "30"]
+
+
+def test_bad_user_preset_file(tmp_path):
+    path = tmp_path / "presets.json"
+    path.write_text('{"7": {"name": "x"}}')
+    with pytest.raises(PresetError, match="preset 7"):
+        load_preset_file(str(path))
+
+
+def test_missing_default_user_file_is_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(preset_config, "USER_PRESETS_FILE", str(tmp_path / "none.toml"))
+    assert load_user_presets() == []
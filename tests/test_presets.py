@@ -46,3 +46,10 @@ def test_archive_mode_settings():
     # Must use HEVC/H.265
     assert "hevc_nvenc" in p["gpu_quality_flags"]
     assert "libx265" in p["cpu_fallback"]
+
+
+def test_presets_do_not_hardcode_threads():
+    """Encoder threads are assigned by the scheduler, not the preset."""
+    for p in PRESETS.values():
+        for key in ("video_params", "cpu_fallback"):
+            assert "-threads" not in p.get(key, [])
@@ -0,0 +1,69 @@
+"""
+test_probe.py
+Tests parsing of the `ffmpeg -i` stream banner.
+"""
+
+from unittest.mock import patch
+
+from core.probe import parse_probe_output, probe_media
+
+SAMPLE = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'lecture.mp4':
+  Metadata:
+    major_brand     : isom
+  Duration: 01:02:03.50, start: 0.000000, bitrate: 1234 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), \
+1920x1080 [SAR 1:1 DAR 16:9], 1100 kb/s, 29.97 fps, 29.97 tbr, 30k tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, stereo, fltp, \
+128 kb/s (default)
+At least one output file must be specified
+"""
+
+
+def test_parse_duration_and_bitrate():
+    info = parse_probe_output(SAMPLE)
+    assert info["duration"] == 3723.5
+    assert info["bitrate_kbps"] == 1234
+    assert info["format"] == "mov,mp4,m4a,3gp,3g2,mj2"
+
+
+def test_parse_video_stream():
+    video = parse_probe_output(SAMPLE)["video"]
+    assert video["codec"] == "h264"
+    assert video["pix_fmt"] == "yuv420p"
+    assert (video["width"], video["height"]) == (1920, 1080)
+    assert video["fps"] == 29.97
+    assert video["bitrate_kbps"] == 1100
+
+
+def test_parse_audio_stream():
+    audio = parse_probe_output(SAMPLE)["audio"]
+    assert audio["codec"] == "aac"
+    assert audio["sample_rate"] == 48000
+    assert audio["channels"] == "stereo"
+    assert audio["bitrate_kbps"] == 128
+
+
+def test_parse_unreadable_input():
+    info = parse_probe_output("broken.mp4: Invalid data found when processing input")
+    assert info["format"] is None
+    assert info["video"] is None
+
+
+@patch("subprocess.run")
+def test_probe_media_returns_none_for_invalid(mock_run, tmp_path):
+    path = tmp_path / "x.mp4"
+    path.write_bytes(b"not a video")
+    mock_run.return_value.stderr = b"x.mp4: Invalid data found when processing input"
+    assert probe_media(str(path)) is None
+
+
+@patch("subprocess.run")
+def test_probe_media_is_cached(mock_run, tmp_path):
+    """Each file is probed once, no matter how many stages ask."""
+    path = tmp_path / "lecture.mp4"
+    path.write_bytes(b"data")
+    mock_run.return_value.stderr = SAMPLE.encode()
+
+    assert probe_media(str(path))["duration"] == 3723.5
+    assert probe_media(str(path))["duration"] == 3723.5
+    assert mock_run.call_count == 1
@@ -3,8 +3,18 @@ test_processor.py
 Tests the FFmpeg command generation logic.
 """
 
+import os
+from unittest.mock import patch
+
+import pytest
+
 from config.presets import PRESETS
-from core.processor import build_command
+from core.failures import GPU_UNSUPPORTED, GpuFailure
+from core.jobqueue import Claims, JobQueue, ticket_id
+from core.passthrough import COPY_ALL, COPY_VIDEO
+from core.processor import build_command, process_file, resolve_encoder
+from core.quality import with_quality
+from core.staging import Stager
 
 
 def test_build_command_cpu():
@@ -46,3 +56,261 @@ def test_build_command_gpu_fallback():
     # Should fallback to CPU (libx264)
     assert "libx264" in cmd
     assert "h264_nvenc" not in cmd
+
+
+def test_build_command_social_cpu_keeps_encoder_settings():
+    """Preset 3 on CPU gets both its libx264 settings and the 720p scale."""
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["3"], gpu_codec=None)
+
+    assert cmd[cmd.index("-c:v") + 1] == "libx264"
+    assert cmd[cmd.index("-crf") + 1] == "28"
+    assert "scale=-2:720" in cmd
+
+
+def test_build_command_social_gpu_scales():
+    """Shared video_params (the 720p scale) also apply to GPU encodes."""
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["3"], gpu_codec="h264_nvenc")
+
+    assert "scale=-2:720" in cmd
+    assert "libx264" not in cmd
+
+
+def test_resolve_encoder():
+    """Encoder name is taken from the GPU codec or the CPU parameters."""
+    assert resolve_encoder(PRESETS["2"], "h264_nvenc") == "h264_nvenc"
+    assert resolve_encoder(PRESETS["2"], None) == "libx264"
+    assert resolve_encoder(PRESETS["1"], "h264_nvenc") == "libx264"
+    assert resolve_encoder(PRESETS["5"], None) == "libx265"
+
+
+def test_build_command_threads_from_budget():
+    """CPU encodes take their thread count from the scheduler slot."""
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["1"], gpu_codec=None, threads=6)
+    assert cmd[cmd.index("-threads") + 1] == "6"
+
+
+def test_build_command_streams_progress():
+    """ffmpeg must report machine-readable progress on stdout."""
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["1"])
+    assert cmd[cmd.index("-progress") + 1] == "pipe:1"
+    assert "-nostats" in cmd
+
+
+def test_build_command_stream_copy():
+    """Compliant inputs are remuxed without any encoder settings."""
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["3"], passthrough=COPY_ALL)
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("-c:a") + 1] == "copy"
+    assert "-vf" not in cmd
+    assert "libx264" not in cmd
+
+
+def test_build_command_copy_video_only():
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["3"], passthrough=COPY_VIDEO)
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+
+
+def _fake_encode(output_bytes, returncode=0):
+    """Stand-in for run_ffmpeg that writes `output_bytes` to the output path."""
+
+    def run(cmd, on_progress=None, should_abort=None, on_usage=None, timeout=None):
+        with open(cmd[-1], "wb") as f:
+            f.write(b"\0" * output_bytes)
+        return returncode, ""
+
+    return run
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_keeps_original_when_not_smaller(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out" / "in.mp4"
+
+    with patch("core.processor.run_ffmpeg", side_effect=_fake_encode(150)):
+        ok = process_file((str(src), str(out), "in.mp4", PRESETS["2"], None))
+
+    assert ok is True
+    assert out.read_bytes() == src.read_bytes()
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_keeps_smaller_encode(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out.mp4"
+
+    with patch("core.processor.run_ffmpeg", side_effect=_fake_encode(40)):
+        assert process_file((str(src), str(out), "in.mp4", PRESETS["2"], None)) is True
+
+    assert out.stat().st_size == 40
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_without_size_policy(mock_probe, tmp_path):
+    """Editing proxies are expected to be larger than the source."""
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out.mp4"
+
+    with patch("core.processor.run_ffmpeg", side_effect=_fake_encode(400)):
+        assert process_file((str(src), str(out), "in.mp4", PRESETS["4"], None)) is True
+
+    assert out.stat().st_size == 400
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_failed_encode_leaves_nothing_behind(mock_probe, tmp_path):
+    """ffmpeg writes a partial; a failed run must not leave it (or an output) around."""
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out.mp4"
+
+    with patch("core.processor.run_ffmpeg", side_effect=_fake_encode(40, returncode=255)):
+        assert process_file((str(src), str(out), "in.mp4", PRESETS["4"], None)) is False
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["in.mp4"]
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_does_not_publish_a_lost_claim(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out.mp4"
+    queue = JobQueue(str(tmp_path / "queue"))
+    queue.put({"id": ticket_id(str(out)), "output": str(out)})
+    queue.claim("node1")
+    encode = _fake_encode(40)
+
+    def encode_then_lose_claim(cmd, **kwargs):
+        assert os.path.basename(cmd[-1]).startswith(".mvc-partial.node1.")
+        queue.release(ticket_id(str(out)), "node1")
+        return encode(cmd, **kwargs)
+
+    with patch("core.processor.run_ffmpeg", side_effect=encode_then_lose_claim):
+        task = (str(src), str(out), "in.mp4", PRESETS["4"], None)
+        assert process_file(task, claims=Claims(queue, "node1")) is False
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["in.mp4", "queue"]
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_encodes_staged_copy_and_uploads(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out" / "in.mp4"
+    commands = []
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        return _fake_encode(40)(cmd, **kwargs)
+
+    stager = Stager(str(tmp_path / "scratch"), budget_bytes=1000)
+    try:
+        with patch("core.processor.run_ffmpeg", side_effect=run):
+            result = process_file((str(src), str(out), "in.mp4", PRESETS["2"], None), stager=stager)
+        assert result.result() is True
+    finally:
+        stager.close()
+
+    cmd = commands[0]
+    assert cmd[cmd.index("-i") + 1].startswith(stager.root)
+    assert cmd[-1].startswith(stager.root)
+    assert out.stat().st_size == 40
+    assert os.listdir(out.parent) == ["in.mp4"]
+
+
+@patch("core.processor.probe_media", return_value={"duration": 60, "video": {"fps": 30}})
+def test_quality_search_samples_without_slide_decimation(mock_probe, tmp_path):
+    """The CRF is searched on the plain preset and then applied to the decimated one."""
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out.mp4"
+    preset = {**PRESETS["1"], "quality_search": {"target": 0.95, "metric": "ssim"}}
+    analysis = {"static_seconds": 50.0, "static_ratio": 0.83, "changes": [30.0]}
+    searched = []
+    commands = []
+
+    def search(input_path, info, preset, gpu_codec, build, workers):
+        searched.append(preset)
+        return with_quality(preset, gpu_codec, 31)
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        return _fake_encode(40)(cmd, **kwargs)
+
+    with (
+        patch("core.slides.analyze", return_value=analysis),
+        patch("core.processor.tune_preset", side_effect=search),
+        patch("core.processor.run_ffmpeg", side_effect=run),
+    ):
+        assert process_file((str(src), str(out), "in.mp4", preset, None)) is True
+
+    assert "-fps_mode" not in searched[0]["video_params"]
+    cmd = commands[0]
+    assert cmd[cmd.index("-crf") + 1] == "31"
+    assert cmd[cmd.index("-fps_mode") + 1] == "vfr"
+    assert "mpdecimate" in cmd[cmd.index("-vf") + 1]
+
+
+def test_build_command_hw_pipeline():
+    """A CUDA pipeline decodes on the GPU and swaps scale for scale_cuda."""
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["3"], gpu_codec="h264_nvenc", hw="cuda")
+
+    assert cmd[cmd.index("-hwaccel") + 1] == "cuda"
+    assert cmd.index("-hwaccel") < cmd.index("-i")
+    assert "scale_cuda=-2:720" in cmd
+    assert "scale=-2:720" not in cmd
+
+
+def test_build_command_hw_ignored_on_cpu_path():
+    cmd = build_command("in.mp4", "out.mp4", PRESETS["3"], gpu_codec=None, hw="cuda")
+    assert "-hwaccel" not in cmd
+    assert "scale=-2:720" in cmd
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_falls_back_to_software_decode(mock_probe, tmp_path):
+    """If the GPU path fails (e.g. unsupported source codec), retry in software."""
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out.mp4"
+    preset = {**PRESETS["4"], "hw_backend": "cuda"}
+    commands = []
+
+    def run(cmd, on_progress=None, should_abort=None, on_usage=None, timeout=None):
+        commands.append(cmd)
+        if "-hwaccel" in cmd:
+            return 1, "Unsupported codec"
+        return _fake_encode(40)(cmd)
+
+    with patch("core.processor.run_ffmpeg", side_effect=run):
+        assert process_file((str(src), str(out), "in.mp4", preset, "h264_nvenc")) is True
+
+    assert len(commands) == 2
+    assert "scale_cuda=-2:720" in commands[0]
+    assert "scale=-2:720" in commands[1]
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_raises_retryable_gpu_failure(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    task = (str(src), str(tmp_path / "out.mp4"), "in.mp4", PRESETS["2"], "h264_nvenc")
+
+    with patch("core.processor.run_ffmpeg", return_value=(1, "10 bit encode not supported")):
+        with pytest.raises(GpuFailure) as info:
+            process_file(task)
+
+    assert info.value.kind == GPU_UNSUPPORTED
+
+
+@patch("core.processor.probe_media", return_value=None)
+def test_process_file_bad_input_is_not_retried(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    task = (str(src), str(tmp_path / "out.mp4"), "in.mp4", PRESETS["2"], "h264_nvenc")
+
+    with patch("core.processor.run_ffmpeg", return_value=(1, "moov atom not found")):
+        assert process_file(task) is False
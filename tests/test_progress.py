@@ -0,0 +1,127 @@
+"""
+test_progress.py
+Tests parsing of ffmpeg `-progress` output and the batch progress aggregation.
+"""
+
+import json
+import time
+from unittest.mock import patch
+
+from core.progress import (
+    BatchProgress,
+    ProgressParser,
+    TelemetryLog,
+    format_stats,
+    normalize_stats,
+)
+
+RAW = {
+    "frame": "300",
+    "fps": "60.5",
+    "bitrate": "950.2kbits/s",
+    "total_size": "1187500",
+    "out_time_us": "10000000",
+    "speed": "2.5x",
+    "progress": "continue",
+}
+
+
+def test_normalize_stats():
+    stats = normalize_stats(RAW, duration=60)
+    assert stats["frame"] == 300
+    assert stats["fps"] == 60.5
+    assert stats["speed"] == 2.5
+    assert stats["bitrate_kbps"] == 950.2
+    assert stats["out_time"] == 10
+    assert stats["total_size"] == 1187500
+    assert round(stats["percent"], 2) == 16.67
+    # 50s of media left at 2.5x realtime
+    assert stats["eta"] == 20
+
+
+def test_normalize_stats_handles_na():
+    """ffmpeg prints N/A before the first frame is muxed."""
+    stats = normalize_stats({"bitrate": "N/A", "speed": "N/A", "total_size": "N/A"}, duration=None)
+    assert stats["speed"] is None
+    assert stats["bitrate_kbps"] is None
+    assert stats["eta"] is None
+
+
+def test_format_stats():
+    text = format_stats(normalize_stats(RAW, duration=60))
+    assert "frame=300" in text
+    assert "2.50x" in text
+    assert "ETA" in text
+
+
+def test_progress_parser_emits_blocks():
+    lines = [b"frame=1", b"out_time_us=1000", b"progress=continue"]
+    lines += [b"frame=2", b"out_time_us=2000", b"progress=end"]
+    blocks = []
+    parser = ProgressParser(blocks.append)
+    for line in lines:
+        parser.feed(line)
+
+    assert [b["frame"] for b in blocks] == ["1", "2"]
+    assert parser.last["progress"] == "end"
+
+
+def test_batch_progress_weighted_by_bytes(tmp_path):
+    log = tmp_path / "telemetry.jsonl"
+    batch = BatchProgress(total_bytes=3000, workers=2, log_path=str(log))
+
+    big = batch.start_job("big.mp4", 2000, duration=100)
+    small = batch.start_job("small.mp4", 1000, duration=10)
+
+    big.update({"out_time_us": "50000000", "speed": "1x", "progress": "continue"})
+    assert batch.bar.n == 1000
+
+    small.finish(True)
+    assert batch.bar.n == 2000
+
+    big.finish(True)
+    assert batch.bar.n == 3000
+    batch.close()
+
+    events = [json.loads(line)["event"] for line in log.read_text().splitlines()]
+    assert events.count("started") == 2
+    assert events.count("progress") == 1
+    assert events.count("finished") == 2
+
+
+def test_batch_progress_reuses_positions():
+    batch = BatchProgress(total_bytes=10, workers=1)
+    first = batch.start_job("a.mp4", 5, duration=None)
+    assert first.position == 1
+    first.finish(False)
+    assert batch.start_job("b.mp4", 5, duration=None).position == 1
+    batch.close()
+
+
+def test_batch_progress_total_grows_with_discovery():
+    batch = BatchProgress(workers=1)
+    batch.add_total(100)
+    batch.add_total(50)
+    assert batch.bar.total == 150
+    batch.close()
+
+
+def test_telemetry_log_writes_off_the_calling_thread(tmp_path):
+    """A slow destination disk must not hold up the caller (the runner's event loop)."""
+    path = tmp_path / "telemetry.jsonl"
+    real_open = open
+
+    def slow_open(*args, **kwargs):
+        time.sleep(0.3)
+        return real_open(*args, **kwargs)
+
+    with patch("builtins.open", side_effect=slow_open):
+        log = TelemetryLog(str(path))
+        started = time.monotonic()
+        for i in range(3):
+            log.write("progress", frame=i)
+        assert time.monotonic() - started < 0.2
+        log.close()
+
+    frames = [json.loads(line)["frame"] for line in path.read_text().splitlines()]
+    assert frames == [0, 1, 2]
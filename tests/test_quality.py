@@ -0,0 +1,107 @@
+"""
+test_quality.py
+Tests the content-adaptive CRF/QP search.
+"""
+
+from unittest.mock import patch
+
+from config.presets import PRESETS
+from core import quality
+from core.quality import (
+    QualityCache,
+    parse_score,
+    pick_value,
+    quality_value,
+    sample_windows,
+    search_quality,
+    tune_preset,
+    with_quality,
+)
+
+
+def test_parse_scores():
+    ssim = "[Parsed_ssim_0 @ 0x1] SSIM Y:0.98 U:0.99 V:0.99 All:0.985 (18.2)"
+    psnr = "[Parsed_psnr_0 @ 0x1] PSNR y:40.1 u:44 v:44 average:41.25 min:38"
+    assert parse_score(ssim, "ssim") == 0.985
+    assert parse_score(psnr, "psnr") == 41.25
+    assert parse_score("[Parsed_libvmaf_0 @ 0x1] VMAF score: 94.5", "vmaf") == 94.5
+    assert parse_score("PSNR y:inf u:inf v:inf average:inf min:inf", "psnr") == float("inf")
+    assert parse_score("garbage", "ssim") is None
+
+
+def test_quality_value_follows_active_encoder():
+    preset = PRESETS["2"]
+    assert quality_value(preset, "h264_nvenc") == ("-qp", 20)
+    assert quality_value(preset, None) == ("-crf", 18)
+    # AMF has no CRF/QP style flag.
+    assert quality_value(preset, "h264_amf") is None
+
+
+def test_with_quality_copies():
+    preset = PRESETS["1"]
+    variant = with_quality(preset, None, 34)
+    assert quality_value(variant) == ("-crf", 34)
+    assert quality_value(preset) == ("-crf", 26)
+
+
+def test_sample_windows_spread():
+    windows = sample_windows(100, count=3, length=4)
+    assert [round(s) for s, _ in windows] == [18, 48, 78]
+    # Short inputs are measured once from the start.
+    assert sample_windows(5) == [(0.0, 4.0)]
+
+
+def test_pick_highest_passing_value():
+    scores = {24: [0.99, 0.99], 28: [0.98, 0.96], 32: [0.97, 0.90]}
+    assert pick_value(scores, 0.95, [24, 28, 32]) == 28
+    # Nothing passes -> best quality candidate.
+    assert pick_value(scores, 0.999, [24, 28, 32]) == 24
+    # A failed sample disqualifies a value.
+    assert pick_value({24: [0.99], 28: [None]}, 0.95, [24, 28]) == 24
+
+
+def test_search_uses_worst_window(tmp_path):
+    """Scores drop as CRF rises; one window is harder than the others."""
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"x")
+
+    def fake_measure(sample, input_path, start, length, metric):
+        crf = int(sample.rsplit("q", 1)[1].split("_")[0])
+        penalty = 0.02 if start > 40 else 0.0
+        return 1.0 - 0.01 * (crf - 20) - penalty
+
+    with (
+        patch("core.quality.run_ffmpeg", return_value=(0, "")),
+        patch("core.quality.measure", side_effect=fake_measure),
+    ):
+        value = search_quality(
+            str(src), {"duration": 100}, PRESETS["1"], None, lambda *a: ["ffmpeg", "-i", "x"], 0.9
+        )
+    # Worst window: crf 28 -> 0.92 - 0.02 = 0.90 passes, crf 30 -> 0.88 doesn't.
+    assert value == 28
+
+
+def test_cache_roundtrip(tmp_path):
+    path = tmp_path / "quality.json"
+    cache = QualityCache(str(path))
+    cache.put("k", 31)
+    assert QualityCache(str(path)).get("k") == 31
+
+
+def test_tune_preset_caches_result(tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"video")
+    preset = {**PRESETS["1"], "quality_search": {"target": 0.95, "metric": "ssim"}}
+
+    with patch("core.quality.search_quality", return_value=33) as search:
+        tuned = tune_preset(str(src), {"duration": 60}, preset, None, None)
+        again = tune_preset(str(src), {"duration": 60}, preset, None, None)
+
+    assert search.call_count == 1
+    assert quality_value(tuned) == ("-crf", 33)
+    assert quality_value(again) == ("-crf", 33)
+    assert quality._cache.path.endswith("quality.json")
+
+
+def test_tune_preset_disabled():
+    assert tune_preset("x", None, PRESETS["1"], None, None) is PRESETS["1"]
@@ -0,0 +1,134 @@
+"""
+test_renditions.py
+Tests single-decode multi-rendition commands.
+"""
+
+from unittest.mock import patch
+
+from config.presets import PRESETS
+from config.settings import THREADS_PER_JOB
+from core.passthrough import COPY_ALL
+from core.renditions import (
+    build_rendition_command,
+    group_preset,
+    process_renditions,
+    rendition_outputs,
+    split_graph,
+)
+from core.scheduler import ResourceScheduler
+
+
+def _group(*ids):
+    return group_preset([{"id": i, "preset": PRESETS[i], "gpu_codec": None} for i in ids])
+
+
+def test_rendition_names_use_preset_suffix():
+    outputs = rendition_outputs(_group("5", "4"), "out/talk.mp4")
+    assert [path for path, _ in outputs] == ["out/talk_archive.mp4", "out/talk_proxy.mp4"]
+
+
+def test_group_speed_is_slower_than_each_rendition():
+    group = _group("4", "3")
+    assert group["est_speed"]["cpu"] < min(PRESETS[i]["est_speed"]["cpu"] for i in ("4", "3"))
+    assert group["use_gpu"] is False
+
+
+def test_split_graph_shares_identical_chains():
+    graph, labels = split_graph(["", "scale=-2:720", "scale=-2:720"])
+    assert graph == "[0:v:0]split=2[d0][d1];[d1]scale=-2:720,split=2[v1][v2]"
+    assert labels == ["[d0]", "[v1]", "[v2]"]
+
+
+def test_split_graph_single_unfiltered_output():
+    assert split_graph([""]) == (None, ["0:v:0"])
+
+
+def test_build_rendition_command_one_decode():
+    outputs = [
+        ("a.mp4", PRESETS["5"], "hevc_nvenc", None),
+        ("p.mp4", PRESETS["4"], None, None),
+        ("s.mp4", PRESETS["3"], None, None),
+    ]
+    cmd = build_rendition_command("in.mp4", outputs, threads=4)
+
+    assert cmd.count("-i") == 1
+    assert cmd[cmd.index("-filter_complex") + 1].count("scale=-2:720") == 1
+    assert "-vf" not in cmd
+    assert cmd.count("-map") == 6
+    assert cmd[cmd.index("hevc_nvenc") - 1] == "-c:v"
+    # The slot's threads are split between the two CPU renditions.
+    assert cmd.count("-threads") == 2 and cmd[cmd.index("-threads") + 1] == "2"
+    assert [a for a in cmd if a.endswith(".mp4")][1:] == ["a.mp4", "p.mp4", "s.mp4"]
+
+
+def test_build_rendition_command_copies_compliant_rendition():
+    outputs = [("a.mp4", PRESETS["5"], None, COPY_ALL), ("s.mp4", PRESETS["3"], None, None)]
+    cmd = build_rendition_command("in.mp4", outputs)
+
+    first = cmd[: cmd.index("a.mp4")]
+    assert first[-4:] == ["-c:v", "copy", "-c:a", "copy"]
+    assert cmd[cmd.index("-filter_complex") + 1] == "[0:v:0]scale=-2:720[v0]"
+
+
+@patch("core.renditions.probe_media", return_value=None)
+def test_process_renditions_writes_every_output(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out" / "in.mp4"
+    commands = []
+
+    def run(cmd, on_progress=None, should_abort=None, on_usage=None, timeout=None):
+        commands.append(cmd)
+        for path in cmd:
+            if path.startswith(str(tmp_path / "out")):
+                with open(path, "wb") as f:
+                    f.write(b"\0" * 40)
+        return 0, ""
+
+    task = (str(src), str(out), "in.mp4", _group("3", "4"), None)
+    with patch("core.renditions.run_ffmpeg", side_effect=run):
+        assert process_renditions(task) is True
+
+    assert len(commands) == 1
+    assert (tmp_path / "out" / "in_social.mp4").stat().st_size == 40
+    assert (tmp_path / "out" / "in_proxy.mp4").stat().st_size == 40
+
+
+def test_every_cpu_rendition_gets_a_job_of_threads():
+    outputs = [("a.mp4", PRESETS["4"], None, None), ("b.mp4", PRESETS["3"], None, None)]
+    cmd = build_rendition_command("in.mp4", outputs)
+
+    threads = [cmd[i + 1] for i, arg in enumerate(cmd) if arg == "-threads"]
+    assert threads == [str(THREADS_PER_JOB)] * 2
+
+
+@patch("core.renditions.probe_media", return_value=None)
+def test_gpu_renditions_hold_a_session_each(mock_probe, tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"\1" * 100)
+    out = tmp_path / "out" / "in.mp4"
+    codecs = {"2": "h264_nvenc", "3": "h264_nvenc", "5": "hevc_nvenc"}
+    group = group_preset(
+        [{"id": i, "preset": PRESETS[i], "gpu_codec": codec} for i, codec in codecs.items()]
+    )
+    scheduler = ResourceScheduler(cpu_threads=16, gpu_sessions=2)
+    seen = []
+
+    def run(cmd, on_progress=None, should_abort=None, on_usage=None, timeout=None):
+        seen.append((cmd, scheduler.free_sessions))
+        for path in cmd:
+            if path.startswith(str(tmp_path / "out")):
+                with open(path, "wb") as f:
+                    f.write(b"\0" * 40)
+        return 0, ""
+
+    task = (str(src), str(out), "in.mp4", group, "h264_nvenc")
+    with patch("core.renditions.run_ffmpeg", side_effect=run):
+        assert process_renditions(task, scheduler) is True
+
+    [(cmd, free_sessions)] = seen
+    # Two hardware encoders fit the session budget; the third runs on the CPU.
+    assert sum(arg.endswith("_nvenc") for arg in cmd) == 2
+    assert cmd.count("-threads") == 1
+    assert free_sessions == 0
+    assert scheduler.free_sessions == 2
@@ -0,0 +1,173 @@
+"""
+test_runner.py
+Tests the non-blocking ffmpeg runner with a stand-in child process.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from core import runner
+from core.runner import run_ffmpeg
+
+FAKE_FFMPEG = """
+import sys
+for i in range(3):
+    print(f"frame={i}\\nout_time_us={i * 1000000}\\nprogress=continue", flush=True)
+print("progress=end", flush=True)
+for i in range(1000):
+    print(f"warning line {i}", file=sys.stderr)
+sys.exit(int(sys.argv[1]))
+"""
+
+
+def test_run_ffmpeg_streams_progress():
+    blocks = []
+    returncode, _ = run_ffmpeg([sys.executable, "-c", FAKE_FFMPEG, "0"], on_progress=blocks.append)
+    assert returncode == 0
+    assert [b.get("frame") for b in blocks] == ["0", "1", "2", None]
+    assert blocks[-1]["progress"] == "end"
+
+
+def test_run_ffmpeg_keeps_bounded_stderr_tail():
+    returncode, stderr = run_ffmpeg([sys.executable, "-c", FAKE_FFMPEG, "1"])
+    assert returncode == 1
+    lines = stderr.splitlines()
+    assert len(lines) <= 200
+    assert lines[-1] == "warning line 999"
+
+
+def test_run_ffmpeg_reports_child_usage():
+    usage = []
+    returncode, _ = run_ffmpeg([sys.executable, "-c", FAKE_FFMPEG, "3"], on_usage=usage.append)
+    assert returncode == 3
+    if hasattr(os, "wait4"):
+        assert len(usage) == 1
+        assert usage[0]["cpu_user"] > 0 and usage[0]["peak_rss_kb"] > 1024
+
+
+def test_run_ffmpeg_usage_survives_should_abort():
+    """Checking should_abort() and terminating an exited child must not reap it early."""
+    usage = []
+
+    def should_abort(block):
+        # Slow enough that the child has exited when the last block arrives.
+        time.sleep(0.2)
+        return block.get("progress") == "end"
+
+    returncode, _ = run_ffmpeg(
+        [sys.executable, "-c", FAKE_FFMPEG, "0"], should_abort=should_abort, on_usage=usage.append
+    )
+    assert returncode == 0
+    if hasattr(os, "wait4"):
+        assert len(usage) == 1
+
+
+def test_run_ffmpeg_aborts_on_request():
+    """should_abort() returning True terminates the child mid-run."""
+    slow = (
+        "import time\n"
+        "for i in range(100):\n"
+        "    print(f'frame={i}\\nprogress=continue', flush=True)\n"
+        "    time.sleep(0.05)\n"
+    )
+    seen = []
+
+    def should_abort(block):
+        seen.append(block["frame"])
+        return block["frame"] == "2"
+
+    usage = []
+    returncode, _ = run_ffmpeg(
+        [sys.executable, "-c", slow], should_abort=should_abort, on_usage=usage.append
+    )
+    assert returncode != 0
+    assert len(seen) < 10
+    # Terminating must not reap the child, or its usage would be lost.
+    if hasattr(os, "wait4"):
+        assert len(usage) == 1
+
+
+def test_cancel_stops_running_children_and_refuses_new_ones():
+    sleeper = "import time\nprint('progress=continue', flush=True)\ntime.sleep(30)\n"
+    started = threading.Event()
+    result = {}
+
+    def run():
+        result["value"] = run_ffmpeg(
+            [sys.executable, "-c", sleeper], on_progress=lambda block: started.set()
+        )
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    try:
+        assert started.wait(10)
+        runner.cancel(grace=2)
+        thread.join(10)
+        assert not thread.is_alive()
+        assert result["value"][0] != 0
+        assert runner.cancelled()
+        assert run_ffmpeg([sys.executable, "-c", "pass"]) == (1, "Cancelled")
+    finally:
+        runner._cancelled.clear()
+
+
+def test_run_ffmpeg_times_out():
+    sleeper = "import time\ntime.sleep(30)\n"
+    started = time.monotonic()
+    usage = []
+    returncode, stderr = run_ffmpeg(
+        [sys.executable, "-c", sleeper], timeout=0.5, on_usage=usage.append
+    )
+    assert returncode != 0
+    if hasattr(os, "wait4"):
+        assert len(usage) == 1
+    assert stderr.endswith("Timed out after 0.5s")
+    assert time.monotonic() - started < 10
+    assert runner.child_pids() == []
+
+
+def test_failing_callback_stops_the_child():
+    chatty = "while True:\n    print('frame=1\\nprogress=continue', flush=True)\n"
+
+    def explode(block):
+        raise RuntimeError("display broke")
+
+    with pytest.raises(RuntimeError):
+        run_ffmpeg([sys.executable, "-c", chatty], on_progress=explode)
+    assert runner.child_pids() == []
+
+
+def test_long_lines_are_split():
+    lines = []
+    blob = "import sys\nsys.stderr.write('x' * 200000)\n"
+    run_ffmpeg([sys.executable, "-c", blob], on_stderr=lines.append)
+    assert sum(len(line) for line in lines) == 200000
+    assert max(len(line) for line in lines) <= runner.MAX_LINE_BYTES + runner.READ_CHUNK_BYTES
+
+
+@pytest.mark.skipif(os.name == "nt", reason="uses /bin/sh")
+def test_hundreds_of_children_share_one_loop():
+    cmd = ["/bin/sh", "-c", "echo frame=1; echo progress=end; sleep 0.5"]
+    blocks = []
+    threads_before = threading.active_count()
+
+    async def run_all():
+        return await asyncio.gather(
+            *(runner.run_async(cmd, on_progress=blocks.append) for _ in range(200))
+        )
+
+    future = asyncio.run_coroutine_threadsafe(run_all(), runner.event_loop())
+    time.sleep(0.3)
+    threads_during = threading.active_count()
+    results = future.result(timeout=60)
+
+    assert [code for code, _ in results] == [0] * 200
+    assert len(blocks) == 200
+    if hasattr(os, "pidfd_open"):
+        # No thread per child (the loop thread itself may be new).
+        assert threads_during <= threads_before + 1
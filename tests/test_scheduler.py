@@ -0,0 +1,116 @@
+"""
+test_scheduler.py
+Tests the CPU-thread / GPU-session budgeting scheduler.
+"""
+
+import threading
+
+from core.scheduler import ResourceScheduler
+
+
+def test_cpu_job_gets_threads_per_job():
+    sched = ResourceScheduler(cpu_threads=16, gpu_sessions=2, threads_per_job=4)
+    slot = sched.acquire(gpu=False)
+    assert slot.gpu is False
+    assert slot.threads == 4
+    assert sched.free_threads == 12
+
+
+def test_cpu_job_sized_from_remaining_budget():
+    """When less than a full share is free, the job runs with what is left."""
+    sched = ResourceScheduler(cpu_threads=6, gpu_sessions=0, threads_per_job=4)
+    sched.acquire(gpu=False)
+    slot = sched.acquire(gpu=False)
+    assert slot.threads == 2
+
+
+def test_gpu_job_uses_session_and_few_threads():
+    sched = ResourceScheduler(cpu_threads=8, gpu_sessions=2, gpu_job_threads=2)
+    slot = sched.acquire(gpu=True)
+    assert slot.gpu is True
+    assert slot.threads == 2
+    assert sched.free_sessions == 1
+    assert sched.free_threads == 6
+
+
+def test_cpu_and_gpu_jobs_run_side_by_side():
+    """Exhausting GPU sessions must not block CPU jobs (and vice versa)."""
+    sched = ResourceScheduler(cpu_threads=8, gpu_sessions=1, threads_per_job=4, gpu_job_threads=2)
+    gpu_slot = sched.acquire(gpu=True)
+    cpu_slot = sched.acquire(gpu=False)
+    assert gpu_slot.gpu and not cpu_slot.gpu
+    assert sched._try_acquire(True) is None
+
+
+def test_release_returns_budget():
+    sched = ResourceScheduler(cpu_threads=8, gpu_sessions=1)
+    with sched.reserve(gpu=True):
+        assert sched.free_sessions == 0
+    assert sched.free_sessions == 1
+    assert sched.free_threads == 8
+
+
+def test_acquire_blocks_until_release():
+    sched = ResourceScheduler(cpu_threads=4, gpu_sessions=0, threads_per_job=4)
+    first = sched.acquire(gpu=False)
+    acquired = threading.Event()
+
+    def worker():
+        sched.acquire(gpu=False)
+        acquired.set()
+
+    t = threading.Thread(target=worker)
+    t.start()
+    assert not acquired.wait(0.1)
+
+    sched.release(first)
+    assert acquired.wait(2)
+    t.join()
+
+
+def test_max_jobs():
+    sched = ResourceScheduler(cpu_threads=16, gpu_sessions=3, threads_per_job=4, gpu_job_threads=2)
+    assert sched.max_jobs(gpu=False) == 4
+    assert sched.max_jobs(gpu=True) == 3
+    assert sched.max_jobs() == 7
+
+
+def test_job_limit_caps_concurrent_jobs_until_raised():
+    sched = ResourceScheduler(cpu_threads=16, gpu_sessions=0, threads_per_job=4)
+    sched.set_limits(cpu_jobs=1)
+    first = sched.acquire(gpu=False)
+    acquired = threading.Event()
+
+    def second():
+        sched.release(sched.acquire(gpu=False))
+        acquired.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not acquired.wait(0.2)
+    assert sched.waiting[False] == 1
+
+    sched.set_limits(cpu_jobs=2)
+    assert acquired.wait(2)
+    thread.join()
+    sched.release(first)
+    assert sched.running == {False: 0, True: 0}
+
+
+def test_cpu_job_reserves_threads_for_several_encoders():
+    sched = ResourceScheduler(cpu_threads=16, gpu_sessions=1, threads_per_job=4)
+    slot = sched.acquire(gpu=False, count=3)
+    assert slot.threads == 12
+    assert sched.free_threads == 4
+    # Never more than the whole budget.
+    gpu_slot = sched.acquire(gpu=True, count=3)
+    assert (gpu_slot.threads, gpu_slot.sessions) == (sched.gpu_job_threads, 1)
+
+
+def test_gpu_job_holds_a_session_per_encoder():
+    sched = ResourceScheduler(cpu_threads=16, gpu_sessions=3, gpu_job_threads=2)
+    slot = sched.acquire(gpu=True, count=2)
+    assert (slot.sessions, sched.free_sessions, sched.free_threads) == (2, 1, 14)
+    assert sched._try_acquire(True, count=2) is None
+    sched.release(slot)
+    assert sched.free_sessions == 3
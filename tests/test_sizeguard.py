@@ -0,0 +1,48 @@
+"""
+test_sizeguard.py
+Tests the early-abort projection of output size against a preset's budget.
+"""
+
+from core.sizeguard import SizeGuard
+
+
+def _block(out_time_s, written):
+    return {"out_time_us": str(int(out_time_s * 1_000_000)), "total_size": str(written)}
+
+
+def test_no_decision_during_warmup():
+    """The first seconds are dominated by headers and the first keyframe."""
+    guard = SizeGuard(input_size=1000, duration=600, max_ratio=1.0)
+    assert guard.check(_block(5, 900)) is False
+    assert guard.tripped is False
+
+
+def test_aborts_when_projected_too_large():
+    # 1000 bytes budget; 120 bytes after 60s of 600s -> 1200 projected
+    guard = SizeGuard(input_size=1000, duration=600, max_ratio=1.0)
+    assert guard.check(_block(60, 120)) is True
+    assert guard.projected == 1200
+    # Stays tripped
+    assert guard.check(_block(61, 1)) is True
+
+
+def test_tolerates_small_overshoot_early():
+    guard = SizeGuard(input_size=1000, duration=600, max_ratio=1.0)
+    assert guard.check(_block(60, 105)) is False
+
+
+def test_keeps_going_when_smaller():
+    guard = SizeGuard(input_size=1000, duration=600, max_ratio=1.0)
+    assert guard.check(_block(300, 200)) is False
+
+
+def test_aborts_when_already_over_budget():
+    guard = SizeGuard(input_size=1000, duration=600, max_ratio=0.5)
+    assert guard.check(_block(590, 501)) is True
+
+
+def test_unknown_duration_never_aborts_early():
+    guard = SizeGuard(input_size=1000, duration=None, max_ratio=1.0)
+    assert guard.check(_block(60, 5000)) is False
+    assert guard.exceeds(1001) is True
+    assert guard.exceeds(1000) is False
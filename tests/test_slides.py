@@ -0,0 +1,106 @@
+"""
+test_slides.py
+Tests static-slide detection and the decimated Lecture Mode encode.
+"""
+
+import os
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from config.presets import PRESETS
+from config.settings import FFMPEG_EXE
+from core import slides
+from core.probe import probe_media
+from core.slides import analyze, decimated_preset, parse_change, summarize, tune_preset
+
+
+def test_parse_change():
+    line = "[Parsed_showinfo_3 @ 0x1] n:   2 pts:  40 pts_time:10.25 duration:1 fmt:yuv420p"
+    assert parse_change(line) == 10.25
+    assert parse_change("[Parsed_mpdecimate_2 @ 0x1] keep pts_time:3") is None
+    assert parse_change("frame=  10 fps=0.0") is None
+
+
+def test_summarize_finds_static_spans():
+    # A frozen slide 0-10s, a 2s animation of changing frames, then a slide to the end.
+    changed = [0.0, 10.0, 10.25, 10.5, 11.0, 11.5, 12.0]
+    result = summarize(changed, 30.0)
+    assert result["changes"] == [10.0]
+    assert result["static_seconds"] == 28.0
+    assert result["static_ratio"] == pytest.approx(28 / 30, abs=1e-3)
+    assert summarize([], 30.0)["static_ratio"] == 0.0
+    assert summarize([0.0], None)["changes"] == []
+
+
+def test_decimated_preset_drops_frames_before_existing_filters():
+    scaled = PRESETS["1"]["video_params"] + ["-vf", "scale=-2:720"]
+    preset = {**PRESETS["1"], "video_params": scaled}
+    analysis = {"static_seconds": 28.0, "static_ratio": 0.93, "changes": [10.0, 20.5]}
+
+    variant = decimated_preset(preset, analysis, fps=30)
+
+    params = variant["video_params"]
+    assert params[params.index("-vf") + 1] == "mpdecimate=max=60,scale=-2:720"
+    assert params[params.index("-fps_mode") + 1] == "vfr"
+    assert params[params.index("-force_key_frames") + 1] == "10,20.5"
+    assert variant["chunk_threshold"] == 0
+    assert variant["slides"] is analysis
+    # The original preset is untouched.
+    assert "-fps_mode" not in preset["video_params"]
+
+
+def test_decimated_preset_adds_a_filter():
+    analysis = {"static_seconds": 5.0, "static_ratio": 1.0, "changes": []}
+    params = decimated_preset(PRESETS["1"], analysis, fps=25)["video_params"]
+    assert params[:2] == ["-vf", "mpdecimate=max=50"]
+    assert "-force_key_frames" not in params
+
+
+def test_tune_preset_caches_analysis(tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"video")
+    info = {"duration": 60, "video": {"fps": 30}}
+    analysis = {"static_seconds": 50.0, "static_ratio": 0.83, "changes": [30.0]}
+
+    with patch("core.slides.analyze", return_value=analysis) as run:
+        tuned = tune_preset(str(src), info, PRESETS["1"])
+        again = tune_preset(str(src), info, PRESETS["1"])
+
+    assert run.call_count == 1
+    assert tuned["slides"] == again["slides"] == analysis
+    assert slides._cache.path.endswith("slides.json")
+
+
+def test_tune_preset_keeps_moving_or_disabled_sources(tmp_path):
+    src = tmp_path / "in.mp4"
+    src.write_bytes(b"video")
+    info = {"duration": 60, "video": {"fps": 30}}
+    moving = {"static_seconds": 4.0, "static_ratio": 0.07, "changes": [12.0]}
+
+    with patch("core.slides.analyze", return_value=moving):
+        assert tune_preset(str(src), info, PRESETS["1"]) is PRESETS["1"]
+    assert tune_preset(str(src), info, PRESETS["4"]) is PRESETS["4"]
+    assert tune_preset(str(src), None, PRESETS["1"]) is PRESETS["1"]
+
+
+@pytest.mark.skipif(not os.path.exists(FFMPEG_EXE), reason="ffmpeg binary not available")
+def test_analyze_real_slides(tmp_path):
+    """Two 4s 'slides' (a still frame, then a different one) give one change at 4s."""
+    src = str(tmp_path / "slides.mp4")
+    subprocess.run(
+        [
+            FFMPEG_EXE, "-v", "error", "-y",
+            "-f", "lavfi", "-i", "testsrc=s=160x120:r=25:d=8",
+            "-vf", "select='eq(n\\,0)+eq(n\\,100)',fps=25,setpts=N/25/TB",
+            "-c:v", "libx264", "-pix_fmt", "yuv420p", src,
+        ],
+        check=True,
+    )  # fmt: skip
+    info = probe_media(src)
+
+    result = analyze(src, info["duration"])
+
+    assert result["changes"] == [pytest.approx(4.0, abs=0.3)]
+    assert result["static_ratio"] > 0.9
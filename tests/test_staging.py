@@ -0,0 +1,147 @@
+"""
+test_staging.py
+Tests the local scratch cache for inputs and outputs on network shares.
+"""
+
+import os
+
+from core import staging
+from core.atomic import partial_path
+from core.staging import STAGE_PREFIX, RateLimiter, Stager, clean_stale, copy_file
+
+
+def _source(tmp_path, name, size):
+    path = tmp_path / "share" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"v" * size)
+    return str(path)
+
+
+def test_rate_limiter_paces_copies():
+    now = [0.0]
+    waits = []
+
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(100, clock=lambda: now[0], sleep=sleep)
+    limiter.consume(100)  # one second of burst is available up front
+    limiter.consume(50)
+    limiter.consume(100)
+
+    assert waits == [0.5, 1.0]
+    RateLimiter(None, sleep=sleep).consume(10**9)
+    assert len(waits) == 2
+
+
+def test_copy_file_in_chunks(tmp_path):
+    src = _source(tmp_path, "a.mp4", 1000)
+    dst = str(tmp_path / "a.copy")
+
+    assert copy_file(src, dst, chunk=64)
+    assert open(dst, "rb").read() == b"v" * 1000
+
+
+def test_prefetch_and_acquire_use_the_local_copy(tmp_path):
+    src = _source(tmp_path, "a.mp4", 100)
+    stager = Stager(str(tmp_path / "scratch"), budget_bytes=1000)
+    try:
+        stager.prefetch(src)
+        with stager.acquire(src) as local:
+            assert local != src
+            assert local.startswith(stager.root)
+            assert open(local, "rb").read() == b"v" * 100
+        assert stager.used_bytes() == 100
+    finally:
+        stager.close()
+    assert not os.path.exists(stager.root)
+
+
+def test_lru_eviction_skips_pinned_and_prefetched_inputs(tmp_path):
+    a, b, c = (_source(tmp_path, name, 100) for name in ("a.mp4", "b.mp4", "c.mp4"))
+    stager = Stager(str(tmp_path / "scratch"), budget_bytes=250)
+    try:
+        with stager.acquire(a) as local_a:
+            stager.prefetch(b)
+            # Both are still needed: c doesn't fit and is read from the share.
+            with stager.acquire(c) as local_c:
+                assert local_c == c
+        with stager.acquire(b):
+            pass
+        # a and b are idle now, so the least recently used one (a) makes room.
+        with stager.acquire(c) as local_c:
+            assert local_c != c
+        assert not os.path.exists(local_a)
+        assert list(stager.entries) == [b, c]
+    finally:
+        stager.close()
+
+
+def test_prefetched_input_never_acquired_is_evicted(tmp_path):
+    a, b, c = (_source(tmp_path, name, 100) for name in ("a.mp4", "b.mp4", "c.mp4"))
+    now = [0.0]
+    stager = Stager(
+        str(tmp_path / "scratch"), budget_bytes=150, prefetch_ttl=60, clock=lambda: now[0]
+    )
+    try:
+        stager.prefetch(a)
+        stager.entries[a].ready.wait()
+        # a's task was dropped: its copy makes room once released.
+        stager.release(a)
+        with stager.acquire(b) as local_b:
+            assert local_b != b
+        assert list(stager.entries) == [b]
+
+        # b is prefetched again for a task that never comes; the claim expires.
+        stager.prefetch(b)
+        with stager.acquire(c) as local_c:
+            assert local_c == c
+        now[0] = 61.0
+        with stager.acquire(c) as local_c:
+            assert local_c != c
+        assert list(stager.entries) == [c]
+    finally:
+        stager.close()
+
+
+def test_changed_source_is_staged_again(tmp_path):
+    src = _source(tmp_path, "a.mp4", 100)
+    stager = Stager(str(tmp_path / "scratch"), budget_bytes=1000)
+    try:
+        with stager.acquire(src):
+            pass
+        with open(src, "wb") as f:
+            f.write(b"w" * 120)
+        with stager.acquire(src) as local:
+            assert open(local, "rb").read() == b"w" * 120
+    finally:
+        stager.close()
+
+
+def test_upload_publishes_the_output(tmp_path):
+    output = str(tmp_path / "share" / "out" / "a.mp4")
+    os.makedirs(os.path.dirname(output))
+    stager = Stager(str(tmp_path / "scratch"), budget_bytes=1000)
+    try:
+        local = stager.output_path(output)
+        with open(local, "wb") as f:
+            f.write(b"encoded")
+
+        result = stager.upload(local, output, then=lambda ok, err: (ok, err, "then")).result()
+
+        assert result == (True, None, "then")
+        assert open(output, "rb").read() == b"encoded"
+        assert not os.path.exists(local)
+        assert not os.path.exists(partial_path(output))
+    finally:
+        stager.close()
+
+
+def test_clean_stale_removes_folders_of_dead_runs(tmp_path, monkeypatch):
+    for name in (f"{STAGE_PREFIX}111-x", f"{STAGE_PREFIX}222-y", "unrelated"):
+        (tmp_path / name).mkdir()
+    monkeypatch.setattr(staging, "_alive", lambda pid: pid == 222)
+
+    assert clean_stale(str(tmp_path)) == 1
+    assert sorted(os.listdir(tmp_path)) == [f"{STAGE_PREFIX}222-y", "unrelated"]
@@ -0,0 +1,118 @@
+"""
+test_watch.py
+Tests watch-folder mode: settle detection, rescans and the daemon loop.
+"""
+
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+import main
+from core.jobs import make_job
+from core.watch import FolderWatcher, InotifyWaker, StabilityTracker, _load_libc
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_waits_until_file_stops_growing():
+    clock = FakeClock()
+    tracker = StabilityTracker(settle=10, clock=clock)
+
+    assert tracker.observe("a.mp4", 100, 1) is False
+    clock.now = 5
+    assert tracker.observe("a.mp4", 200, 2) is False  # still growing, timer restarts
+    clock.now = 14
+    assert tracker.observe("a.mp4", 200, 2) is False
+    clock.now = 15
+    assert tracker.observe("a.mp4", 200, 2) is True
+    # Reported once...
+    clock.now = 30
+    assert tracker.observe("a.mp4", 200, 2) is False
+    # ...until it is rewritten.
+    assert tracker.observe("a.mp4", 300, 3) is False
+    clock.now = 40
+    assert tracker.observe("a.mp4", 300, 3) is True
+
+
+def test_forgets_removed_files():
+    tracker = StabilityTracker(settle=0)
+    assert tracker.observe("a.mp4", 1, 1) is True
+    tracker.forget_missing(set())
+    assert tracker.observe("a.mp4", 1, 1) is True
+
+
+def test_scan_reports_each_settled_file_once(tmp_path):
+    (tmp_path / "a.mp4").write_bytes(b"video")
+    (tmp_path / "notes.txt").write_bytes(b"text")
+    watcher = FolderWatcher([str(tmp_path)], settle=0, use_inotify=False)
+    found = []
+
+    watcher.scan(lambda index, path, rel: found.append((index, rel)))
+    watcher.scan(lambda index, path, rel: found.append((index, rel)))
+
+    assert found == [(0, "a.mp4")]
+
+
+def test_same_folder_in_two_jobs(tmp_path):
+    (tmp_path / "a.mp4").write_bytes(b"video")
+    watcher = FolderWatcher([str(tmp_path), str(tmp_path)], settle=0, use_inotify=False)
+    found = []
+    watcher.scan(lambda index, path, rel: found.append(index))
+    assert sorted(found) == [0, 1]
+
+
+@pytest.mark.skipif(_load_libc() is None, reason="inotify not available")
+def test_inotify_wakes_on_new_file(tmp_path):
+    waker = InotifyWaker(threading.Event())
+    try:
+        waker.watch(str(tmp_path))
+        assert waker.wait(0.05) is False
+        (tmp_path / "a.mp4").write_bytes(b"video")
+        assert waker.wait(2) is True
+    finally:
+        waker.close()
+
+
+def test_watch_jobs_processes_new_files(tmp_path):
+    source = tmp_path / "hot"
+    source.mkdir()
+    job = make_job({"preset": "4", "source": str(source), "dest": str(tmp_path / "out")})
+    stop = threading.Event()
+    done = threading.Event()
+
+    def fake_process(task, *args, **kwargs):
+        os.makedirs(os.path.dirname(task[1]), exist_ok=True)
+        with open(task[1], "wb") as f:
+            f.write(b"v")
+        done.set()
+        return True
+
+    result = {}
+    with (
+        patch("core.pipeline.process_file", side_effect=fake_process),
+        patch("core.pipeline.task_cost", return_value=1.0),
+        patch("main.detect_gpu_codec", return_value=None),
+    ):
+        thread = threading.Thread(
+            target=lambda: result.update(
+                main.watch_jobs([job], workers=1, settle=0, stop_event=stop)
+            )
+        )
+        thread.start()
+        time.sleep(0.1)
+        (source / "clip.mp4").write_bytes(b"video")
+        assert done.wait(5)
+        stop.set()
+        thread.join(5)
+
+    assert result["completed"] == 1
+    assert (tmp_path / "out" / "clip.mp4").exists()